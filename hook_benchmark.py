@@ -0,0 +1,116 @@
+"""Measures the per-layer cost of WrappedModel's hooks in "full" and "fast" hook modes.
+
+Usage: python hook_benchmark.py [model_name ...] (defaults to alexnet and yolov8s)
+
+Hook overhead is a few microseconds per layer, far below the run-to-run noise of the layers
+themselves, so each hooked layer's forward is replaced by a stub returning the output it produced
+for the benchmark input. What is left to time is module dispatch, the hooks, and WrappedModel's
+per-pass bookkeeping. Every case is compared against the stubbed model with all hooks detached,
+and the difference is divided by the number of hooked layers.
+"""
+
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import torch
+
+from src.tracr.experiment_design.models.model_hooked import WrappedModel
+from src.tracr.experiment_design.records.master_dict import MasterDict
+
+logging.basicConfig(level=logging.WARNING)
+
+PASSES = 500
+base_config = os.path.join(str(Path(__file__).resolve().parents[0]), "model_test.yaml")
+
+
+def time_pass(fn, passes=PASSES):
+    """Fastest wall time of `fn()` in microseconds; the minimum is the least noisy estimate."""
+    best = float("inf")
+    with torch.no_grad():
+        for _ in range(passes):
+            start = time.perf_counter_ns()
+            fn()
+            best = min(best, time.perf_counter_ns() - start)
+    return best / 1e3
+
+
+def stub_layers(m, x):
+    """Makes every hooked layer return its cached output for `x` instead of computing it."""
+    outputs = {}
+    with hooks_detached(m), torch.no_grad():
+        handles = [
+            layer.register_forward_hook(
+                lambda module, args, out, i=i: outputs.__setitem__(i, out)
+            )
+            for i, layer in enumerate(m.layers)
+        ]
+        m.model(x)
+        for handle in handles:
+            handle.remove()
+    for i, layer in enumerate(m.layers):
+        layer.forward = lambda *args, out=outputs[i], **kwargs: out
+
+
+@contextmanager
+def hooks_detached(m):
+    """Temporarily removes every hook from the wrapped model's layers."""
+    saved = [(layer._forward_pre_hooks, layer._forward_hooks) for layer in m.layers]
+    for layer in m.layers:
+        layer._forward_pre_hooks, layer._forward_hooks = (
+            type(saved[0][0])(),
+            type(saved[0][1])(),
+        )
+    try:
+        yield
+    finally:
+        for layer, (pre_hooks, hooks) in zip(m.layers, saved):
+            layer._forward_pre_hooks, layer._forward_hooks = pre_hooks, hooks
+
+
+def build_model(model_name, hooks):
+    # large flush buffer so the MasterDict handoff stays out of the measurement
+    m = WrappedModel(
+        config_path=base_config,
+        master_dict=MasterDict(),
+        flush_buffer_size=100000,
+        config_overrides={"model_name": model_name, "hooks": hooks},
+    )
+    m.node_name = "benchmark"
+    return m
+
+
+def benchmark(model_name):
+    torch.manual_seed(0)
+    rows = []
+    for hooks in ("full", "fast"):
+        m = build_model(model_name, hooks)
+        x = torch.randn(1, *m.input_size)
+        stub_layers(m, x)
+        with hooks_detached(m):
+            bare = time_pass(lambda: m.model(x))
+        split = m.layer_count // 2
+        cases = {
+            "unlogged": lambda: m(x, log=False),
+            "logged": lambda: m(x, inference_id="bench"),
+            "split": lambda: m(x, inference_id="bench", end=split),
+        }
+        for case, fn in cases.items():
+            fn()
+            elapsed = time_pass(fn)
+            rows.append((hooks, case, bare, elapsed, (elapsed - bare) / m.layer_count))
+    print(f"\n{model_name}: {m.layer_count} layers, best of {PASSES} passes")
+    print(
+        f"{'mode':<6}{'case':<10}{'bare (us)':>11}{'pass (us)':>11}{'per layer (us)':>16}"
+    )
+    for hooks, case, bare, elapsed, per_layer in rows:
+        print(f"{hooks:<6}{case:<10}{bare:>11.0f}{elapsed:>11.0f}{per_layer:>16.1f}")
+
+
+if __name__ == "__main__":
+    torch.set_num_threads(1)
+    for name in sys.argv[1:] or ["alexnet", "yolov8s"]:
+        benchmark(name)
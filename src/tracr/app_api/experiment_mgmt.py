@@ -9,7 +9,6 @@ import rpyc.core.protocol
 import pandas as pd
 from rpyc.utils.server import ThreadedServer
 from rpyc.utils.registry import UDPRegistryServer
-from rpyc.utils.classic import obtain
 from time import sleep
 from typing import Union
 from datetime import datetime
@@ -18,6 +17,7 @@ from src.tracr.app_api import utils
 from src.tracr.app_api import device_mgmt as dm
 from src.tracr.app_api.deploy import ZeroDeployedServer
 from src.tracr.experiment_design.tasks import tasks
+from src.tracr.experiment_design.records.master_dict import MasterDict
 from src.tracr.experiment_design.services.base import ObserverService
 
 # overwrite default rpyc configs to allow pickling and public attribute access
@@ -94,6 +94,18 @@ class ExperimentManifest:
 
         self.playbook = new_playbook
 
+    def get_source_node(self) -> Union[str, None]:
+        """
+        The instance the inputs originate on: the one told to infer over a dataset, if there is
+        exactly one. Sending them to whichever node completes the first layer counts as a hop.
+        """
+        sources = [
+            instance_name.upper()
+            for instance_name, tasklist in self.playbook.items()
+            if any(isinstance(task, tasks.InferOverDatasetTask) for task in tasklist)
+        ]
+        return sources[0] if len(sources) == 1 else None
+
     def get_participant_instance_names(self) -> list[str]:
         return [
             participant["instance_name"].upper()
@@ -142,16 +154,30 @@ class Experiment:
     registry_server: UDPRegistryServer = UDPRegistryServer(allow_listing=True)
     observer_node: ThreadedServer
     observer_conn: ObserverService
+    observer_serving_thread: rpyc.BgServingThread
     participant_nodes: list[ZeroDeployedServer] = []
     threads: dict[str, threading.Thread]
     events: dict[str, threading.Event]
     report_dataframe: pd.DataFrame
 
+    # how long the observer has to get every participant ready
+    READY_TIMEOUT_S: float = 120.0
+    # the observer pushes its status changes, but is still polled if nothing has been heard
+    # for this long, in case a notification was lost
+    STATUS_POLL_INTERVAL_S: float = 15.0
+
     def __init__(
         self, manifest: ExperimentManifest, available_devices: list[dm.Device]
     ):
         self.available_devices = available_devices
         self.manifest = manifest
+        # the observer streams results into this file as participants flush them
+        self.results_path = (
+            utils.get_repo_root()
+            / "UserData"
+            / "TestResults"
+            / f"{manifest.name}__{datetime.now().strftime('%Y-%m-%dT%H%M%S')}.sqlite"
+        )
         self.threads = {
             "registry_svr": threading.Thread(target=self.start_registry, daemon=True),
             "observer_svr": threading.Thread(
@@ -161,6 +187,9 @@ class Experiment:
         self.events = {
             "registry_ready": threading.Event(),
             "observer_up": threading.Event(),
+            # set as the observer pushes its status changes (see on_observer_status)
+            "observer_ready": threading.Event(),
+            "observer_finished": threading.Event(),
         }
 
     def run(self) -> None:
@@ -215,7 +244,12 @@ class Experiment:
         all_node_names = self.manifest.get_participant_instance_names()
         playbook = self.manifest.playbook
 
-        observer_service = ObserverService(all_node_names, playbook)
+        observer_service = ObserverService(
+            all_node_names,
+            playbook,
+            results_path=self.results_path,
+            source_node=self.manifest.get_source_node(),
+        )
         self.observer_node = ThreadedServer(
             observer_service,
             auto_register=True,
@@ -264,35 +298,46 @@ class Experiment:
         )
 
     def start_handshake(self):
-        self.observer_conn = rpyc.connect_by_service("OBSERVER").root
+        conn = rpyc.connect_by_service("OBSERVER")
+        # the observer calls on_observer_status back over this connection; the callback ends
+        # the thread quietly if the connection drops or is closed with the observer
+        self.observer_serving_thread = rpyc.BgServingThread(
+            conn, callback=lambda: logger.debug("stopped serving the observer")
+        )
+        self.observer_conn = conn.root
+        self.observer_conn.watch_status(self.on_observer_status)
         self.observer_conn.get_ready()
 
+    def on_observer_status(self, node_name: str, status: str) -> None:
+        logger.debug(f"{node_name} is now '{status}'")
+        if status == "ready":
+            self.events["observer_ready"].set()
+        elif status == "finished":
+            self.events["observer_finished"].set()
+
     def wait_for_ready(self) -> None:
-        n_attempts = 15
-        while n_attempts > 0:
-            if self.observer_conn.get_status() == "ready":
-                return
-            n_attempts -= 1
-            sleep(8)
-        raise TimeoutError(
-            "experiment object waited too long for observer to be ready."
-        )
+        if not self.events["observer_ready"].wait(self.READY_TIMEOUT_S):
+            # ask once before giving up, in case the notification was lost
+            self.on_observer_status("OBSERVER", self.observer_conn.get_status())
+        if not self.events["observer_ready"].is_set():
+            raise TimeoutError(
+                "experiment object waited too long for observer to be ready."
+            )
 
     def send_start_signal_to_observer(self) -> None:
         self.observer_conn.run()
 
-    def cleanup_after_finished(self, check_status_interval: int = 10) -> None:
-        while True:
-            if self.observer_conn.get_status() == "finished":
-                break
-            sleep(check_status_interval)
+    def cleanup_after_finished(self) -> None:
+        # participants flush their results to the observer before reporting they're finished
+        while not self.events["observer_finished"].wait(self.STATUS_POLL_INTERVAL_S):
+            self.on_observer_status("OBSERVER", self.observer_conn.get_status())
 
-        sleep(5)
-        logger.info("consolidating results from master_dict")
-        async_md = rpyc.async_(self.observer_conn.get_master_dict)
-        master_dict_result = async_md(as_dataframe=True)
-        master_dict_result.wait()
-        self.report_dataframe = obtain(master_dict_result.value)
+        logger.info(f"consolidating results from {self.results_path}")
+        # the observer runs in this process, so read its results file directly instead of
+        # pulling the whole DataFrame back over rpyc
+        self.report_dataframe = MasterDict(
+            self.results_path, source_node=self.manifest.get_source_node()
+        ).to_dataframe()
 
         self.observer_node.close()
         self.registry_server.close()
@@ -318,14 +363,10 @@ class Experiment:
 
         if summary:
             logger.info("summarizing report")
-            summary_cols = [
-                "inference_id",
-                "split_layer",
-                "total_time_ns",
-                "inf_time_client",
-                "inf_time_edge",
-                "transmission_latency_ns",
-            ]
+            # everything before the layer columns is per-inference; which inf_time_<node>
+            # columns there are depends on the participants
+            columns = list(self.report_dataframe.columns)
+            summary_cols = columns[: columns.index("layer_id")]
             self.report_dataframe = (
                 self.report_dataframe[summary_cols]
                 .drop_duplicates()
@@ -0,0 +1,101 @@
+"""
+Glue between the codecs and the rest of the experiment. The chain is selected per experiment in
+the manifest's model section, e.g. `codec: int8+zstd` (codecs are applied left to right and
+undone right to left); leaving it out, or using `none`, sends activations untouched.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Union
+
+import torch
+from torch.utils import _pytree as pytree
+
+from .codec import Codec, EncodedTensor
+
+# imported so their Codec subclasses register themselves
+from . import compression, quantization  # noqa: F401
+
+
+class CodecChain:
+    """
+    An ordered list of codecs applied to every floating point activation a node sends.
+    """
+
+    def __init__(self, codecs: list[Codec]) -> None:
+        self.codecs = codecs
+
+    @classmethod
+    def from_spec(cls, spec: Union[str, list[str], None]) -> Union[CodecChain, None]:
+        if spec is None:
+            return None
+        names = spec.split("+") if isinstance(spec, str) else list(spec)
+        names = [name.strip().lower() for name in names]
+        names = [name for name in names if name and name != "none"]
+        if not names:
+            return None
+        return cls([Codec.create(name) for name in names])
+
+    @property
+    def spec(self) -> str:
+        return "+".join(codec._TYPE for codec in self.codecs)
+
+    def encode(self, tensor: torch.Tensor) -> EncodedTensor:
+        stages = []
+        payload = tensor
+        for codec in self.codecs:
+            payload, info = codec.encode(payload)
+            stages.append((codec._TYPE, info))
+        return EncodedTensor(payload, stages)
+
+    def encode_activations(self, activations: dict) -> tuple[dict, int]:
+        """
+        Encodes every floating point tensor in a banked activation dict, including those in
+        tuples and lists (the replay path banks layer inputs as tuples). Returns the new dict
+        and the number of bytes its tensors will occupy on the wire.
+        """
+        nbytes = 0
+
+        def encode_leaf(value: Any) -> Any:
+            nonlocal nbytes
+            if isinstance(value, torch.Tensor) and value.is_floating_point():
+                value = self.encode(value)
+                nbytes += value.nbytes
+            elif isinstance(value, torch.Tensor):
+                nbytes += value.element_size() * value.nelement()
+            return value
+
+        return pytree.tree_map(encode_leaf, activations), nbytes
+
+
+_decoders: dict[str, Codec] = {}
+
+
+def decode(encoded: EncodedTensor) -> torch.Tensor:
+    """
+    Undoes every stage of an `EncodedTensor`. Encoded tensors describe themselves, so the
+    receiving node doesn't need to know which chain the sender was configured with.
+    """
+    payload = encoded.payload
+    for stage_type, info in reversed(encoded.stages):
+        if stage_type not in _decoders:
+            _decoders[stage_type] = Codec.create(stage_type)
+        payload = _decoders[stage_type].decode(payload, info)
+    return payload
+
+
+def decode_activations(activations: dict) -> tuple[dict, Union[str, None]]:
+    """
+    Decodes any `EncodedTensor` in a banked activation dict. Returns the decoded dict and
+    the spec of the chain that produced it (None if nothing was encoded).
+    """
+    spec = None
+
+    def decode_leaf(value: Any) -> Any:
+        nonlocal spec
+        if isinstance(value, EncodedTensor):
+            spec = value.spec
+            value = decode(value)
+        return value
+
+    return pytree.tree_map(decode_leaf, activations), spec
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import abc
+from typing import Any
+
+import torch
+
+
+class EncodedTensor:
+    """
+    What a tensor looks like after passing through one or more codecs. The `payload` is always a
+    tensor (compressed bytes are kept as a uint8 tensor) so it travels as an out-of-band buffer,
+    and `stages` records each codec applied along with whatever it needs to undo its work.
+    """
+
+    def __init__(self, payload: torch.Tensor, stages: list[tuple[str, Any]]) -> None:
+        self.payload = payload
+        self.stages = stages
+
+    @property
+    def spec(self) -> str:
+        return "+".join(stage_type for stage_type, _ in self.stages)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Bytes that will actually be transmitted for this tensor, side information included.
+        """
+        total = self.payload.element_size() * self.payload.nelement()
+        for _, info in self.stages:
+            for item in info if isinstance(info, tuple) else (info,):
+                if isinstance(item, torch.Tensor):
+                    total += item.element_size() * item.nelement()
+        return total
+
+
+class Codec:
+    """
+    Factory class for the transformations applied to intermediate activations before they are
+    sent to the next node. Each codec turns a tensor into a (possibly smaller) payload tensor plus
+    the side information needed to reverse it; codecs are chained by `CodecChain`. Custom codecs
+    can be written in their own module as long as it is imported by `codecs.chain`.
+    """
+
+    _TYPE: str = "base"
+
+    subclasses = {}
+
+    # @classmethod implicit
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls._TYPE in cls.subclasses:
+            raise ValueError("_TYPE alias already reserved.")
+        cls.subclasses[cls._TYPE] = cls
+
+    @classmethod
+    def create(cls, class_type, *args, **kwargs):
+        if class_type not in cls.subclasses:
+            raise ValueError(
+                "Bad or unknown type {}. Does the subclass specify _TYPE ?".format(
+                    class_type
+                )
+            )
+        return cls.subclasses[class_type](*args, **kwargs)
+
+    @abc.abstractmethod
+    def encode(self, tensor: torch.Tensor) -> tuple[torch.Tensor, Any]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def decode(self, payload: torch.Tensor, info: Any) -> torch.Tensor:
+        raise NotImplementedError
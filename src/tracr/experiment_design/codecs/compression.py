@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import blosc2
+import torch
+
+from .codec import Codec
+
+
+class _BloscCodec(Codec):
+    """
+    Lossless compression of the raw tensor buffer through blosc2. The byte-shuffle filter
+    groups the bytes of each element together, which is what makes float activations (and
+    especially ReLU outputs full of zeros) compress well.
+    """
+
+    _TYPE: str = "blosc"
+    BLOSC_CODEC: blosc2.Codec = blosc2.Codec.BLOSCLZ
+
+    def __init__(self, clevel: int = 5) -> None:
+        self.clevel = clevel
+
+    def encode(
+        self, tensor: torch.Tensor
+    ) -> tuple[torch.Tensor, tuple[str, tuple[int, ...]]]:
+        array = tensor.detach().cpu().contiguous().numpy()
+        compressed = blosc2.compress(
+            array,
+            typesize=array.itemsize,
+            clevel=self.clevel,
+            filter=blosc2.Filter.SHUFFLE,
+            codec=self.BLOSC_CODEC,
+        )
+        payload = torch.frombuffer(bytearray(compressed), dtype=torch.uint8)
+        return payload, (str(tensor.dtype), tuple(tensor.shape))
+
+    def decode(
+        self, payload: torch.Tensor, info: tuple[str, tuple[int, ...]]
+    ) -> torch.Tensor:
+        dtype, shape = info
+        restored = torch.empty(shape, dtype=getattr(torch, dtype.split(".")[-1]))
+        blosc2.decompress(payload.numpy(), dst=restored.numpy())
+        return restored
+
+
+class Lz4Codec(_BloscCodec):
+    _TYPE: str = "lz4"
+    BLOSC_CODEC: blosc2.Codec = blosc2.Codec.LZ4
+
+
+class ZstdCodec(_BloscCodec):
+    _TYPE: str = "zstd"
+    BLOSC_CODEC: blosc2.Codec = blosc2.Codec.ZSTD
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import torch
+
+from .codec import Codec
+
+
+class Float16Codec(Codec):
+    """
+    Halves the size of float32 activations by sending them as float16.
+    """
+
+    _TYPE: str = "fp16"
+
+    def encode(self, tensor: torch.Tensor) -> tuple[torch.Tensor, str]:
+        return tensor.to(torch.float16), str(tensor.dtype)
+
+    def decode(self, payload: torch.Tensor, info: str) -> torch.Tensor:
+        return payload.to(getattr(torch, info.split(".")[-1]))
+
+
+class Int8PerChannelCodec(Codec):
+    """
+    Asymmetric 8-bit quantization with one scale and offset per channel (dim 1, which is the
+    channel dimension for both conv feature maps and linear activations). Tensors with fewer
+    than two dimensions are quantized with a single scale.
+    """
+
+    _TYPE: str = "int8"
+
+    def encode(
+        self, tensor: torch.Tensor
+    ) -> tuple[torch.Tensor, tuple[torch.Tensor, torch.Tensor, str]]:
+        if tensor.dim() >= 2:
+            reduce_dims = [d for d in range(tensor.dim()) if d != 1]
+            low = tensor.amin(dim=reduce_dims, keepdim=True)
+            high = tensor.amax(dim=reduce_dims, keepdim=True)
+        else:
+            low, high = tensor.min(), tensor.max()
+        scale = (high - low).clamp_min(torch.finfo(torch.float32).eps) / 255
+        quantized = ((tensor - low) / scale).round_().clamp_(0, 255).to(torch.uint8)
+        return quantized, (
+            scale.to(torch.float32),
+            low.to(torch.float32),
+            str(tensor.dtype),
+        )
+
+    def decode(
+        self, payload: torch.Tensor, info: tuple[torch.Tensor, torch.Tensor, str]
+    ) -> torch.Tensor:
+        scale, low, dtype = info
+        restored = payload.to(torch.float32).mul_(scale).add_(low)
+        return restored.to(getattr(torch, dtype.split(".")[-1]))
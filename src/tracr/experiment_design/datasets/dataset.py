@@ -1,8 +1,13 @@
+import os
 from pathlib import Path
+from typing import TYPE_CHECKING, Any
 from torch.utils.data import Dataset
 
 from src.tracr.app_api.utils import get_repo_root
 
+if TYPE_CHECKING:
+    from src.tracr.experiment_design.datasets.preprocessed import PreprocessedDataset
+
 
 class BaseDataset(Dataset):
     """
@@ -10,6 +15,11 @@ class BaseDataset(Dataset):
     """
 
     DATA_SOURCE_DIRECTORY: Path = get_repo_root() / "UserData" / "Dataset_Data"
+    # derived data (directory indexes, preprocessed copies) that can be rebuilt at any time
+    CACHE_DIRECTORY: Path = (
+        Path(os.environ.get("TRACR_CACHE_DIR", Path.home() / ".cache" / "tracr"))
+        / "datasets"
+    )
 
     length: int
 
@@ -24,3 +34,28 @@ class BaseDataset(Dataset):
         Either set the value for self.length during construction or override this method.
         """
         return self.length
+
+    def load_raw(self, index) -> tuple[Any, Any]:
+        """
+        Returns the decoded image (a PIL image or HWC uint8 array) and label of an element
+        before any transforms. Only needed by datasets that support `preprocessed`.
+        """
+        raise NotImplementedError(f"{type(self).__name__} can't be preprocessed")
+
+    def cache_key(self) -> str:
+        """
+        Names this dataset's preprocessed cache. It should change whenever the elements
+        `load_raw` returns would.
+        """
+        raise NotImplementedError(f"{type(self).__name__} can't be preprocessed")
+
+    def preprocessed(self, target_transform=None) -> "PreprocessedDataset":
+        """
+        A copy of this dataset served from a memory-mapped cache of its decoded pixels, built
+        on first use. See datasets.preprocessed.
+        """
+        from src.tracr.experiment_design.datasets.preprocessed import (
+            PreprocessedDataset,
+        )
+
+        return PreprocessedDataset(self, target_transform=target_transform)
@@ -1,5 +1,10 @@
+import bisect
+import hashlib
+import json
+import os
 import pathlib
 import logging
+from typing import Callable, Union
 from PIL import Image
 
 from src.tracr.experiment_design.datasets.dataset import BaseDataset
@@ -37,25 +42,85 @@ class ImagenetDataset(BaseDataset):
         self.target_transform = target_transform
         self.img_map = {}
 
-        for i in range(len(self.img_labels), 0, -1):
-            i -= 1
-            img_name = self.img_labels[i]
-            try:
-                self.img_map[img_name] = next(self.img_dir.glob(f"*{img_name}*"))
-            except StopIteration:
+        index = self._load_index()
+        for img_name in self.img_labels:
+            if index.get(img_name) is None:
                 logger.warning(
                     f"Couldn't find image with name {img_name} in directory. Skipping."
                 )
-                self.img_labels.pop(i)
+            else:
+                self.img_map[img_name] = self.img_dir / index[img_name]
+        self.img_labels = [label for label in self.img_labels if label in self.img_map]
+
+    def _load_index(self) -> dict[str, Union[str, None]]:
+        """
+        Maps each label in the class file to the first image whose name contains it (what
+        `img_dir.glob(f"*{label}*")` would find), reading the directory once. The index is
+        cached on disk and rebuilt when the directory or class file changes.
+        """
+        fingerprint = [
+            str(self.img_dir),
+            self.img_dir.stat().st_mtime_ns,
+            self.CLASS_TEXTFILE.stat().st_mtime_ns,
+        ]
+        digest = hashlib.blake2b(str(self.img_dir).encode(), digest_size=16).hexdigest()
+        cache_fp = self.CACHE_DIRECTORY / "imagenet_index" / f"{digest}.json"
+        try:
+            with open(cache_fp, encoding="utf8") as file:
+                cached = json.load(file)
+            if cached["fingerprint"] == fingerprint:
+                return cached["index"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+        with open(self.CLASS_TEXTFILE) as file:
+            labels = [label.replace(" ", "_") for label in file.read().split("\n")]
+        # glob skips hidden files and lists in directory order
+        names = [name for name in os.listdir(self.img_dir) if not name.startswith(".")]
+        # one string to search, with each name's starting offset to map a hit back to it
+        haystack = "\n".join(names)
+        offsets, offset = [], 0
+        for name in names:
+            offsets.append(offset)
+            offset += len(name) + 1
+        index = {}
+        for label in labels:
+            hit = haystack.find(label) if names else -1
+            # a hit can't span two names unless the label has a newline, which it can't
+            index[label] = (
+                None if hit < 0 else names[bisect.bisect_right(offsets, hit) - 1]
+            )
+
+        try:
+            cache_fp.parent.mkdir(parents=True, exist_ok=True)
+            tmp_fp = cache_fp.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_fp, "w", encoding="utf8") as file:
+                json.dump({"fingerprint": fingerprint, "index": index}, file)
+            os.replace(tmp_fp, cache_fp)
+        except OSError as e:
+            logger.warning(f"Could not write dataset index cache {cache_fp}: {e}")
+        return index
 
     def __len__(self):
         return len(self.img_labels)
 
-    def __getitem__(self, idx):
+    def load_raw(self, idx):
         label = self.img_labels[idx]
         img_fp = self.img_map[label]
         image = Image.open(img_fp).convert("RGB")
         image = image.resize((224, 224))
+        return image, label
+
+    def cache_key(self) -> str:
+        files = [str(self.img_map[label]) for label in self.img_labels]
+        stamps = [self.img_map[label].stat().st_mtime_ns for label in self.img_labels]
+        digest = hashlib.blake2b(
+            json.dumps([self.img_labels, files, stamps, 224]).encode(), digest_size=16
+        ).hexdigest()
+        return f"imagenet-{len(self)}-{digest}"
+
+    def __getitem__(self, idx):
+        image, label = self.load_raw(idx)
 
         if self.transform:
             image = self.transform(image)
@@ -66,25 +131,41 @@ class ImagenetDataset(BaseDataset):
         return image, label
 
 
-# Here are the dataset instances the observer can offer to the participants
-
-# All 999 images as PIL objects converted to RGB
-imagenet999_rgb = ImagenetDataset()
-# Same, but just the first 10
-imagenet10_rgb = ImagenetDataset(max_iter=10)
-
-# This gives all 999 images as torch Tensors
-imagenet999_tr = ImagenetDataset(transform=transforms.Compose([transforms.ToTensor()]))
-# And this gives the same, but only the first 10
-imagenet10_tr = ImagenetDataset(
-    transform=transforms.Compose([transforms.ToTensor()]), max_iter=10
-)
-
-# And here's the sad little dataset I've been using for tests
-imagenet2_tr = ImagenetDataset(
-    transform=transforms.Compose([transforms.ToTensor()]), max_iter=2
-)
+# Here are the dataset instances the observer can offer to the participants. Each one is only
+# built the first time it's accessed (e.g. `imagenet.imagenet10_tr`), so importing this module
+# costs nothing.
+DATASET_INSTANCES: dict[str, Callable[[], BaseDataset]] = {
+    # All 999 images as PIL objects converted to RGB
+    "imagenet999_rgb": lambda: ImagenetDataset(),
+    # Same, but just the first 10
+    "imagenet10_rgb": lambda: ImagenetDataset(max_iter=10),
+    # This gives all 999 images as torch Tensors
+    "imagenet999_tr": lambda: ImagenetDataset(
+        transform=transforms.Compose([transforms.ToTensor()])
+    ),
+    # And this gives the same, but only the first 10
+    "imagenet10_tr": lambda: ImagenetDataset(
+        transform=transforms.Compose([transforms.ToTensor()]), max_iter=10
+    ),
+    # The same 999 and 10 images as uint8 tensors, decoded once into a memory-mapped cache
+    "imagenet999_u8": lambda: ImagenetDataset().preprocessed(),
+    "imagenet10_u8": lambda: ImagenetDataset(max_iter=10).preprocessed(),
+    # And here's the sad little dataset I've been using for tests
+    "imagenet2_tr": lambda: ImagenetDataset(
+        transform=transforms.Compose([transforms.ToTensor()]), max_iter=2
+    ),
+}
+
+
+def __getattr__(name: str):
+    if name in DATASET_INSTANCES:
+        dataset = DATASET_INSTANCES[name]()
+        globals()[name] = dataset  # later lookups find it without coming back here
+        return dataset
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 if __name__ == "__main__":
+    # module-level __getattr__ only covers attribute access from outside the module
+    imagenet2_tr = __getattr__("imagenet2_tr")
     print(f"Output size: {imagenet2_tr[0][0].element_size() * imagenet2_tr[0][0].nelement()}")  # type: ignore
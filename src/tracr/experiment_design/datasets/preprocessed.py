@@ -0,0 +1,111 @@
+"""
+A preprocessed, memory-mapped copy of a dataset.
+
+Decoding a JPEG, converting it to RGB and resizing it costs far more than running the first few
+layers of a network on a Raspberry Pi, and a sweep decodes every image again on every pass. A
+`PreprocessedDataset` does that work once: the decoded pixels of every element go into a single
+`(elements, channels, height, width)` uint8 array saved as `.npy` under
+`BaseDataset.CACHE_DIRECTORY`, next to a small JSON index with the labels. Later runs map the
+array into memory, and each element is served as a uint8 tensor viewing the mapped pages, so
+nothing is decoded or copied until the model scales it to floats (see `WrappedModel.forward`).
+
+The uint8 pixels are exactly what `ToTensor` would scale, so a cached dataset gives the same
+model input as one built with `transform=ToTensor()`; other transforms are not applied.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from typing import Any
+
+import numpy as np
+import torch
+from PIL import Image
+
+from src.tracr.experiment_design.datasets.dataset import BaseDataset
+
+
+logger = logging.getLogger("tracr_logger")
+
+
+def pixels_chw(image: Any) -> np.ndarray:
+    """A decoded image (PIL image or HWC uint8 array) as a CHW uint8 array."""
+    if isinstance(image, Image.Image):
+        image = np.asarray(image.convert("RGB"))
+    image = np.asarray(image, dtype=np.uint8)
+    if image.ndim == 2:
+        image = image[:, :, None]
+    return image.transpose(2, 0, 1)
+
+
+class PreprocessedDataset(BaseDataset):
+    """
+    Serves the elements of `source` from a memory-mapped cache of its decoded pixels, building
+    the cache first if it is missing or `source.cache_key()` has changed. `source` must
+    implement `load_raw` and `cache_key`.
+    """
+
+    def __init__(self, source: BaseDataset, target_transform=None):
+        self.source_name = type(source).__name__
+        self.target_transform = target_transform
+        key = source.cache_key()
+        cache_dir = self.CACHE_DIRECTORY / "preprocessed"
+        self.array_fp = cache_dir / f"{key}.npy"
+        self.index_fp = cache_dir / f"{key}.json"
+        try:
+            self._open()
+        except (OSError, ValueError, KeyError):
+            self._build(source)
+            self._open()
+
+    def _open(self):
+        with open(self.index_fp, encoding="utf8") as file:
+            index = json.load(file)
+        # copy-on-write keeps the pages shared while letting torch wrap them as writable
+        self.pixels = np.load(self.array_fp, mmap_mode="c")
+        self.labels = index["labels"]
+        if len(self.pixels) != len(self.labels):
+            raise ValueError(f"{self.array_fp} doesn't match its index")
+        self.length = len(self.labels)
+
+    def _build(self, source: BaseDataset):
+        length = len(source)
+        logger.info(f"preprocessing {length} elements of {self.source_name}")
+        self.array_fp.parent.mkdir(parents=True, exist_ok=True)
+        # written under temporary names and renamed, so a crash never leaves a partial cache
+        array_tmp = self.array_fp.with_suffix(f".{os.getpid()}.tmp.npy")
+        index_tmp = self.index_fp.with_suffix(f".{os.getpid()}.tmp")
+        pixels, labels = None, []
+        for idx in range(length):
+            image, label = source.load_raw(idx)
+            image = pixels_chw(image)
+            if pixels is None:
+                pixels = np.lib.format.open_memmap(
+                    array_tmp, mode="w+", dtype=np.uint8, shape=(length, *image.shape)
+                )
+            if image.shape != pixels.shape[1:]:
+                raise ValueError(
+                    f"Element {idx} of {self.source_name} has shape {image.shape}, "
+                    f"expected {pixels.shape[1:]}; only same-sized images can be cached"
+                )
+            pixels[idx] = image
+            labels.append(label)
+        if pixels is None:
+            np.save(array_tmp, np.zeros((0, 0, 0, 0), dtype=np.uint8))
+        else:
+            pixels.flush()
+            del pixels
+        with open(index_tmp, "w", encoding="utf8") as file:
+            json.dump({"source": self.source_name, "labels": labels}, file)
+        os.replace(array_tmp, self.array_fp)
+        os.replace(index_tmp, self.index_fp)
+        logger.info(f"cached {self.source_name} in {self.array_fp}")
+
+    def __getitem__(self, idx):
+        image = torch.from_numpy(self.pixels[idx]).unsqueeze(0)
+        label = self.labels[idx]
+        if self.target_transform:
+            label = self.target_transform(label)
+        return image, label
@@ -0,0 +1,119 @@
+"""
+Streams a dataset to a participant ahead of the model.
+
+Fetching one element at a time through a netref costs an rpyc round trip per input, with the
+image decoded on the observer while the participant's model waits. A `DatasetStream` instead
+keeps up to `prefetch` chunks of `chunk_size` elements in flight on background threads and hands
+them out in order, so decoding and transfer overlap with inference.
+
+Where the elements come from depends on what the participant has:
+
+    LocalSource   the dataset module imports and finds its data on this machine (a mirrored
+                  copy of the data directory), so elements are decoded locally
+    RemoteSource  otherwise; each chunk is one call to the observer's `get_dataset_chunk`,
+                  serialized with the same out-of-band tensor transport as tasks
+"""
+
+from __future__ import annotations
+
+import logging
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from importlib import import_module
+from typing import Any, Iterator
+
+import src.tracr.experiment_design.tasks.transport as transport
+
+
+logger = logging.getLogger("tracr_logger")
+
+
+class LocalSource:
+    def __init__(self, dataset: Any) -> None:
+        self.dataset = dataset
+
+    def __len__(self) -> int:
+        return len(self.dataset)
+
+    def fetch(self, start: int, stop: int) -> list:
+        return [self.dataset[idx] for idx in range(start, stop)]
+
+
+class RemoteSource:
+    def __init__(
+        self, observer_svc: Any, dataset_module: str, dataset_instance: str
+    ) -> None:
+        self.observer_svc = observer_svc
+        self.dataset_module = dataset_module
+        self.dataset_instance = dataset_instance
+        self.length = int(
+            observer_svc.get_dataset_length(dataset_module, dataset_instance)
+        )
+
+    def __len__(self) -> int:
+        return self.length
+
+    def fetch(self, start: int, stop: int) -> list:
+        header, buffers = self.observer_svc.get_dataset_chunk(
+            self.dataset_module, self.dataset_instance, start, stop
+        )
+        return transport.loads(header, buffers)
+
+
+def open_source(
+    observer_svc: Any, dataset_module: str, dataset_instance: str
+) -> LocalSource | RemoteSource:
+    """Reads the dataset locally if this node has a usable copy, through the observer if not."""
+    try:
+        module = import_module(f"src.tracr.experiment_design.datasets.{dataset_module}")
+        dataset = getattr(module, dataset_instance)
+        if len(dataset):
+            logger.info(f"reading {dataset_instance} from a local mirror")
+            return LocalSource(dataset)
+    except (ImportError, AttributeError, OSError) as e:
+        logger.debug(f"no local copy of {dataset_instance}: {e}")
+    logger.info(f"streaming {dataset_instance} from the observer")
+    return RemoteSource(observer_svc, dataset_module, dataset_instance)
+
+
+class DatasetStream:
+    """
+    Iterates over the elements of `source` in order while background workers fetch the next
+    `prefetch` chunks.
+    """
+
+    def __init__(
+        self,
+        source: LocalSource | RemoteSource,
+        chunk_size: int = 8,
+        prefetch: int = 4,
+        workers: int = 2,
+    ) -> None:
+        self.source = source
+        self.chunk_size = max(1, chunk_size)
+        self.prefetch = max(1, prefetch)
+        self.workers = max(1, workers)
+
+    def __len__(self) -> int:
+        return len(self.source)
+
+    def __iter__(self) -> Iterator:
+        length = len(self.source)
+        starts = iter(range(0, length, self.chunk_size))
+        pending: deque[Future] = deque()
+        with ThreadPoolExecutor(
+            self.workers, thread_name_prefix="dataset_prefetch"
+        ) as pool:
+
+            def submit_next() -> None:
+                start = next(starts, None)
+                if start is not None:
+                    stop = min(start + self.chunk_size, length)
+                    pending.append(pool.submit(self.source.fetch, start, stop))
+
+            for _ in range(self.prefetch):
+                submit_next()
+            while pending:
+                chunk = pending.popleft().result()
+                submit_next()
+                yield from chunk
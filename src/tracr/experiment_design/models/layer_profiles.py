@@ -0,0 +1,95 @@
+"""
+On-disk cache for WrappedModel's layer table.
+
+Building the table means running `torchinfo.summary`, a full forward pass with size bookkeeping
+that takes a noticeable share of participant startup on small devices. The table only depends on
+the model and how it is walked, so it is stored as JSON under `TRACR_CACHE_DIR` (default
+`~/.cache/tracr`) and reused whenever the model name, weights, hook depth, input size and device
+all match.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Union
+
+import torch
+
+
+logger = logging.getLogger("tracr_logger")
+
+CACHE_VERSION = 1
+
+
+def cache_dir() -> Path:
+    root = os.environ.get("TRACR_CACHE_DIR", Path.home() / ".cache" / "tracr")
+    return Path(root) / "layer_profiles"
+
+
+def weights_digest(model: torch.nn.Module, samples: int = 256) -> str:
+    """
+    Fingerprints the model's weights from the names, shapes and dtypes of every parameter and
+    buffer plus `samples` evenly spaced values of each. The table itself doesn't depend on the
+    values, so this only has to tell checkpoints apart, and hashing a sample keeps it cheap on
+    devices where reading every weight would cost more than the profile it replaces.
+    """
+    digest = hashlib.sha256()
+    for name, tensor in model.state_dict().items():
+        if not isinstance(tensor, torch.Tensor):
+            continue
+        digest.update(f"{name}:{tensor.dtype}:{tuple(tensor.shape)};".encode())
+        flat = tensor.detach().reshape(-1)
+        step = max(1, flat.numel() // samples)
+        sample = flat[::step][:samples].cpu().contiguous()
+        digest.update(memoryview(sample.view(torch.uint8).numpy()))
+    return digest.hexdigest()
+
+
+def profile_key(
+    model: torch.nn.Module,
+    model_name: str,
+    depth: Any,
+    input_size: Any,
+    device: str,
+) -> str:
+    fields = {
+        "version": CACHE_VERSION,
+        "model_name": model_name,
+        "weights": weights_digest(model),
+        "depth": str(depth),
+        "input_size": list(input_size),
+        "device": str(device),
+    }
+    return hashlib.blake2b(
+        json.dumps(fields, sort_keys=True).encode(), digest_size=16
+    ).hexdigest()
+
+
+def load(key: str) -> Union[list[dict[str, Any]], None]:
+    """Returns the cached layer table for `key`, or None if there is no usable entry."""
+    path = cache_dir() / f"{key}.json"
+    try:
+        with open(path, encoding="utf8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable layer profile cache {path}: {e}")
+        return None
+
+
+def save(key: str, layer_table: list[dict[str, Any]]) -> None:
+    path = cache_dir() / f"{key}.json"
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write then rename, so a participant starting up alongside never reads half a file
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf8") as file:
+            json.dump(layer_table, file)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write layer profile cache {path}: {e}")
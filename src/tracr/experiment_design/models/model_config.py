@@ -7,8 +7,11 @@ import yaml
 logger = logging.getLogger("tracr_logger")
 
 
-def read_model_config(path=None, participant_key="client"):
+def read_model_config(path=None, participant_key="client", overrides=None):
+    """Reads a participant's model settings from `path`, with any `overrides` applied before the
+    fixed details of the chosen model are added."""
     config_details = __read_yaml_data(path, participant_key)
+    config_details.update(overrides or {})
     model_fixed_details = {}
     with open(
         os.path.join(os.path.dirname(__file__), "model_configs.yaml"),
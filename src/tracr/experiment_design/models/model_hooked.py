@@ -1,10 +1,10 @@
 """model_hooked module"""
 
 import atexit
-import copy
 import logging
-import time
-from typing import Any, Union
+import threading
+from contextvars import ContextVar
+from typing import Any, Sequence, Union
 
 import numpy as np
 import torch
@@ -12,9 +12,18 @@ from PIL import Image
 from torchinfo import summary
 from torchvision.transforms import ToTensor
 
+from src.tracr.experiment_design.codecs.chain import CodecChain, decode_activations
 from src.tracr.experiment_design.records.master_dict import MasterDict
+from src.tracr.experiment_design.records.record_store import (
+    STATIC_FIELDS,
+    LayerRecordStore,
+    RecordBlock,
+)
+from . import layer_profiles
 from .model_config import read_model_config
 from .model_selector import model_selector
+from .split_plan import SplitPlanner
+from .timers import LayerTimer
 
 atexit.register(torch.cuda.empty_cache)
 logger = logging.getLogger("tracr_logger")
@@ -30,6 +39,56 @@ class NotDict:
         return self.inner_dict
 
 
+def collate_inputs(inputs: Sequence[Any]) -> Any:
+    """Joins the inputs of several inferences along the batch dimension so they can share one
+    forward pass. Inputs are either tensors (initiating passes) or NotDicts of banked tensors
+    (completing passes), and must all start at the same layer."""
+    first = inputs[0]
+    if isinstance(first, NotDict):
+        banks = [x() for x in inputs]
+        return NotDict(
+            {
+                key: (
+                    torch.cat([bank[key] for bank in banks])
+                    if isinstance(value, torch.Tensor)
+                    else value
+                )
+                for key, value in banks[0].items()
+            }
+        )
+    return torch.cat(list(inputs))
+
+
+def split_output(out: Any, sizes: Sequence[int]) -> list:
+    """Inverse of `collate_inputs`: splits the result of a batched forward pass back into one
+    result per inference, where `sizes` gives the batch size each inference contributed.
+    """
+    if isinstance(out, torch.Tensor):
+        return list(torch.split(out, list(sizes)))
+    if isinstance(out, NotDict):
+        parts = {key: split_output(value, sizes) for key, value in out().items()}
+        return [
+            NotDict({key: value[i] for key, value in parts.items()})
+            for i in range(len(sizes))
+        ]
+    if isinstance(out, (list, tuple)):
+        parts = [split_output(item, sizes) for item in out]
+        return [type(out)(part[i] for part in parts) for i in range(len(sizes))]
+    # anything without a batch dimension is shared by every inference
+    return [out for _ in sizes]
+
+
+def batch_size_of(x: Any) -> int:
+    """Returns the batch dimension of a model input, whether it is a tensor or banked."""
+    if isinstance(x, NotDict):
+        x = x()
+    if isinstance(x, dict):
+        x = next((v for v in x.values() if isinstance(v, torch.Tensor)), None)
+    if isinstance(x, (list, tuple)):
+        x = next((v for v in x if isinstance(v, torch.Tensor)), None)
+    return x.shape[0] if isinstance(x, torch.Tensor) and x.dim() > 0 else 1
+
+
 class HookExitException(Exception):
     """Exception to early exit from inference in naive running."""
 
@@ -38,64 +97,91 @@ class HookExitException(Exception):
         self.result = out
 
 
+class PassContext:
+    """
+    The state of one forward pass, which the hooks read and write between layers: the layers it
+    runs, the activations it banks, and the record row it fills. Values noted for a caller's
+    next pass (decode time, send and cache stats) wait in the caller's context until `forward`
+    takes them.
+    """
+
+    def __init__(
+        self, start: int = 0, stop: Union[int, float] = 0, log: bool = False
+    ) -> None:
+        self.start = start
+        self.stop = stop
+        self.log = log
+        self.batch_size = 1
+        self.split_sizes: Union[Sequence[int], None] = None
+        self.banked_input: Any = None
+        self.replaying = False
+        self.debug_hooks = False
+        self.records: Union[RecordBlock, None] = None
+        self.record_row: Union[int, None] = None
+        self.pending_decode: tuple[Union[str, None], int] = (None, 0)
+        self.pending_send: Union[tuple[int, int, int], None] = None
+        self.pending_cache: Union[tuple[bool, int], None] = None
+
+    def take_notes(self, other: "PassContext") -> None:
+        """Moves the values noted in `other` over to this context."""
+        self.pending_decode, other.pending_decode = other.pending_decode, (None, 0)
+        self.pending_send, other.pending_send = other.pending_send, None
+        self.pending_cache, other.pending_cache = other.pending_cache, None
+
+
 class WrappedModel(torch.nn.Module):
     """Wraps a pretrained model with the features necesarry to perform edge computing tests.
     Uses pytorch hooks to perform benchmarkings, grab intermediate layers, and slice the
     Sequential to provide input to intermediate layers or exit early.
     """
 
-    layer_template_dict = {
-        "layer_id": None,  # this one may prove unneeded
-        "completed_by_node": None,
-        "class": None,
-        "inference_time": 0,
-        "parameters": None,
-        "parameter_bytes": None,
-        # "precision": None, precision is not technically per layer, disabled for now
-        "cpu_cycles_used": None,
-        "watts_used": None,
-    }
-
     def __init__(
         self,
         *args,
         config_path=None,
         master_dict: Union[MasterDict, None] = None,
         flush_buffer_size: int = 100,
+        config_overrides: Union[dict, None] = None,
         **kwargs,
     ):
         logger.debug(f"{args=}")
         super().__init__(*args)
-        self.timer = time.perf_counter_ns
         self.master_dict = master_dict  # this should be the externally accessible dict
-        self.io_buf_dict = {}
-        self.inference_dict = (
-            {}
-        )  # collation dict for the current partition of a given inference
-        self.forward_dict = {}  # dict for the results from the current forward pass
-        # assigns config vars to the wrapper
-        self.__dict__.update(read_model_config(config_path))
+        # static per-layer info from torchinfo; per-inference values go in self.records
+        self.layer_table = []
+        # assigns config vars to the wrapper; config_overrides replace values read from the file
+        self.__dict__.update(read_model_config(config_path, overrides=config_overrides))
         self.training = True if self.mode in ["train", "training"] else False
         self.model = model_selector(self.model_name)
         self.drop_save_dict = self._find_save_layers()
+        self.codec_chain = CodecChain.from_spec(getattr(self, "codec", None))
         self.flush_buffer_size = flush_buffer_size
         # self.selected_out = OrderedDict()  # could be useful for skips
-        self.f_hooks = []
-        self.f_pre_hooks = []
-        # run torchinfo here to get parameters/flops/mac for entry into dict
-        """ INFO: YOLO() model wrapper appears to map .eval() that torchinfo calls to .train()
-        I don't have a fix tonight outside of popping the model out of the wrapper after setup."""
-        self.torchinfo = summary(self.model, (1, *self.input_size), verbose=0)
+        # "full" keeps hooks on every layer; "fast" only installs the ones a pass needs
+        self.hooks = getattr(self, "hooks", "full")
+        self.hook_fns = []  # (prehook, posthook) per layer_id
+        self.hook_handles = {}  # layer_id -> installed hook handles
+        self.hooked_for = None  # what the installed fast-mode hooks were chosen for
+        # the state of each pass lives in a PassContext of the thread running it, which the
+        # hooks look up, so several threads can run passes through the same weights at once
+        self._context: ContextVar[Union[PassContext, None]] = ContextVar(
+            f"pass_context_{id(self)}", default=None
+        )
+        self.hook_lock = threading.Lock()
+        self.passes_running = 0
+        self.layers = []  # hooked modules, indexed by layer_id
         self.layer_count = self._walk_modules(
             self.model.children(), 1, 0
         )  # depth starts at 1 to match torchinfo depths
-        del self.torchinfo
-        self.forward_dict_empty = copy.deepcopy(self.forward_dict)
-        # ---- class scope values that the hooks and forward pass use ----
-        self.model_start_i = None
-        self.model_stop_i = None
-        self.banked_input = None
-        self.log = False
+        # profile before hooking, as torchinfo runs a forward pass of its own
+        self._profile_layers()
+        if self.hooks != "fast":
+            for layer_i in range(self.layer_count):
+                self._install_hooks(layer_i)
+        self.records = LayerRecordStore(self.layer_table, flush_buffer_size)
+        self.split_planner = self._build_split_planner()
+        # called with each filled RecordBlock just before it is handed to the MasterDict
+        self.flush_listeners = []
 
         if self.mode == "eval":
             self.model.eval()
@@ -106,15 +192,43 @@ class WrappedModel(torch.nn.Module):
                 logger.info("Loading Model to CPU. CUDA not available.")
                 self.device = "cpu"
         self.model.to(self.device)
+        self.layer_timer = self._build_layer_timer()
+        self.timer = self.layer_timer.now
         self.warmup(iterations=2)
 
     def _find_save_layers(self):
         """Interrogate the model to find skip connections.
         Requires the model to have knowledge of its structure (for now)."""
         drop_save_dict = {}
-        drop_save_dict = self.model.save if self.model.save else {}
+        drop_save_dict = getattr(self.model, "save", None) or {}
         return drop_save_dict
 
+    def _build_split_planner(self) -> Union[SplitPlanner, None]:
+        """Traces the model so split inferences only execute the layers they own. Set
+        `execution: replay` in the model config (or use a model torch.fx can't trace) to fall
+        back to replaying a dummy input through the hooks."""
+        if getattr(self, "execution", "plan") != "plan":
+            return None
+        try:
+            return SplitPlanner(self.model, self.layers)
+        except Exception as e:
+            logger.warning(
+                f"Could not trace {self.model_name} into split plans ({e}); "
+                "falling back to hook replay."
+            )
+            return None
+
+    def _build_layer_timer(self) -> LayerTimer:
+        """Selects how layers are timed with the `timer_backend` key of the model config (host,
+        sync, or cuda_event). CUDA events fall back to a synchronized host clock without a GPU.
+        """
+        timer_type = getattr(self, "timer_backend", "host")
+        try:
+            return LayerTimer.create(timer_type, self.device)
+        except RuntimeError as e:
+            logger.warning(f"{e}; timing layers with the sync timer instead.")
+            return LayerTimer.create("sync", self.device)
+
     def _walk_modules(self, module_generator, depth, walk_i):
         """Recursively walks and marks Modules for hooks in a DFS. Most NN have an
         intended or intuitive depth to split at, but it is not obvious to the naive program.
@@ -131,102 +245,161 @@ class WrappedModel(torch.nn.Module):
                 logger.debug(f"{'-'*depth}End of Module {childname}'s children.")
             elif isinstance(child, torch.nn.Module):
                 # if not iterable/too deep, we have found a layer to hook
-                for layer in self.torchinfo.summary_list:
-                    if layer.layer_id == id(child):
-                        self.forward_dict[walk_i] = copy.deepcopy(
-                            WrappedModel.layer_template_dict
-                        )
-                        self.forward_dict[walk_i].update(
-                            {
-                                "depth": depth,
-                                "layer_id": walk_i,
-                                "class": layer.class_name,
-                                # "precision": None,
-                                "parameters": layer.num_params,
-                                "parameter_bytes": layer.param_bytes,
-                                "input_size": layer.input_size,
-                                "output_size": layer.output_size,
-                                "output_bytes": layer.output_bytes,
-                            }
-                        )
-
-                self.f_hooks.append(
-                    child.register_forward_pre_hook(
-                        self.forward_prehook(
-                            walk_i,
-                            childname,
-                            (0, 0),
-                        ),
-                        with_kwargs=False,
+                self.layers.append(child)
+                static = dict.fromkeys(STATIC_FIELDS)
+                static["depth"] = depth
+                self.layer_table.append(static)  # filled in by _profile_layers
+
+                self.hook_fns.append(
+                    (
+                        self.forward_prehook(walk_i, childname, (0, 0)),
+                        self.forward_posthook(walk_i, childname, (0, 0)),
                     )
                 )
-                self.f_pre_hooks.append(
-                    child.register_forward_hook(
-                        self.forward_posthook(
-                            walk_i,
-                            childname,
-                            (0, 0),
-                        ),
-                        with_kwargs=False,
-                    )
-                )
-                logger.debug(
-                    f"{'-'*depth}Layer {walk_i}: {childname} had hooks applied."
-                )
+                logger.debug(f"{'-'*depth}Layer {walk_i}: {childname} found.")
                 # back hooks left out for now
                 walk_i += 1
         return walk_i
 
+    def _profile_layers(self):
+        """Fills the layer table with torchinfo's per-layer stats, or with the cached ones if
+        this model, weights, depth and input size have been profiled before."""
+        key = layer_profiles.profile_key(
+            self.model, self.model_name, self.depth, self.input_size, self.device
+        )
+        cached = layer_profiles.load(key)
+        if cached is not None and [entry["depth"] for entry in cached] == [
+            static["depth"] for static in self.layer_table
+        ]:
+            logger.info("Loaded layer profile from cache.")
+            for static, entry in zip(self.layer_table, cached):
+                static.update(entry)
+            return
+        # run torchinfo here to get parameters/flops/mac for entry into dict
+        """ INFO: YOLO() model wrapper appears to map .eval() that torchinfo calls to .train()
+        I don't have a fix tonight outside of popping the model out of the wrapper after setup."""
+        torchinfo = summary(self.model, (1, *self.input_size), verbose=0)
+        # index by module id once instead of scanning summary_list for every layer
+        summary_by_id = {layer.layer_id: layer for layer in torchinfo.summary_list}
+        for static, child in zip(self.layer_table, self.layers):
+            layer = summary_by_id.get(id(child))
+            if layer is not None:
+                static.update(
+                    {
+                        "class": layer.class_name,
+                        # "precision": None,
+                        "parameters": layer.num_params,
+                        "parameter_bytes": layer.param_bytes,
+                        "input_size": layer.input_size,
+                        "output_size": layer.output_size,
+                        "output_bytes": layer.output_bytes,
+                    }
+                )
+        layer_profiles.save(key, self.layer_table)
+
+    def _install_hooks(self, layer_i: int):
+        pre_hook, post_hook = self.hook_fns[layer_i]
+        layer = self.layers[layer_i]
+        self.hook_handles[layer_i] = (
+            layer.register_forward_pre_hook(pre_hook, with_kwargs=False),
+            layer.register_forward_hook(post_hook, with_kwargs=False),
+        )
+
+    def _remove_hooks(self, layer_i: int):
+        for handle in self.hook_handles.pop(layer_i):
+            handle.remove()
+
+    def context(self) -> PassContext:
+        """The pass context of the calling thread: the pass it is running, or the values noted
+        for its next one."""
+        ctx = self._context.get()
+        if ctx is None:
+            ctx = PassContext()
+            self._context.set(ctx)
+        return ctx
+
+    def _sync_hooks(self, ctx: PassContext, exclusive: bool = True):
+        """In fast mode, hooks only the layers the coming pass needs: the timed layers when
+        recording, plus the layers the replay path banks, overwrites, or exits at. While other
+        passes are running, hooks are only added, since those passes may need the rest.
+        """
+        if self.hooks != "fast":
+            return
+        start, end = ctx.start, min(ctx.stop, self.layer_count)
+        timed = ctx.record_row is not None
+        key = (start, end, timed, ctx.replaying)
+        if key == self.hooked_for:
+            return
+        needed = set(range(start, end)) if timed else set()
+        if ctx.replaying:
+            needed.update((0, start, end))
+            needed.update(self.drop_save_dict)
+        needed = {i for i in needed if 0 <= i < self.layer_count}
+        if exclusive:
+            for layer_i in set(self.hook_handles) - needed:
+                self._remove_hooks(layer_i)
+        for layer_i in needed - set(self.hook_handles):
+            self._install_hooks(layer_i)
+        self.hooked_for = key if exclusive else None
+
     def forward_prehook(self, fixed_layer_i, layer_name, input_shape):
         """Prehook a layer for benchmarking."""
 
         def pre_hook(module, layer_input):  # hook signature format is required
-            logger.debug(f"start prehook {fixed_layer_i}")
+            ctx = self.context()
+            if ctx.debug_hooks:
+                logger.debug(f"start prehook {fixed_layer_i}")
             hook_output = layer_input
-            # previous layer exit
-            if (
-                self.model_stop_i <= fixed_layer_i < self.layer_count
-                and self.hook_style == "pre"
-            ):
-                logger.info(f"exit signal: during prehook {fixed_layer_i}")
-                # wait to allow non torch.nn.Modules to modify input as needed (ex flatten)
-                self.banked_input[fixed_layer_i - 1] = layer_input[0]
-                raise HookExitException(self.banked_input)
-            if fixed_layer_i == 0:
-                # if at first layer, prepare self.banked_input
-                if self.model_start_i == 0:
-                    logger.debug("reseting input bank")
-                    # initiating pass: reset bank
-                    self.banked_input = {}
-                else:
-                    logger.debug("importing input bank from initiating network")
-                    # completing pass: store input dict until the correct layer arrives
-                    self.banked_input = layer_input[
-                        0
-                    ]()  # wrapped dict expected, deepcopy may help
-                    hook_output = torch.randn(1, *self.input_size)
-            elif (
-                fixed_layer_i in self.drop_save_dict
-                or self.model_start_i == fixed_layer_i
-            ):
-                # if not at first layer, not exiting, at a marked layer
-                if self.model_start_i == 0 and self.hook_style == "pre":
-                    logger.debug(f"storing layer {fixed_layer_i} into input bank")
-                    # initiating pass case: store inputs into dict
-                    self.banked_input[fixed_layer_i] = layer_input
-                if 0 < self.model_start_i > fixed_layer_i and self.hook_style == "pre":
-                    logger.debug(
-                        f"overwriting layer {fixed_layer_i} with input from bank"
-                    )
-                    # completing pass: overwrite dummy pass with stored input
-                    hook_output = self.banked_input[
-                        fixed_layer_i - (1 if self.hook_style == "pre" else 0)
-                    ]
+            # the hook-replay path banks activations and exits early from here
+            if ctx.replaying:
+                # previous layer exit
+                if (
+                    ctx.stop <= fixed_layer_i < self.layer_count
+                    and self.hook_style == "pre"
+                ):
+                    logger.info(f"exit signal: during prehook {fixed_layer_i}")
+                    # wait to allow non torch.nn.Modules to modify input as needed (ex flatten)
+                    ctx.banked_input[fixed_layer_i - 1] = layer_input[0]
+                    raise HookExitException(ctx.banked_input)
+                if fixed_layer_i == 0:
+                    # if at first layer, prepare ctx.banked_input
+                    if ctx.start == 0:
+                        if ctx.debug_hooks:
+                            logger.debug("reseting input bank")
+                        # initiating pass: reset bank
+                        ctx.banked_input = {}
+                    else:
+                        if ctx.debug_hooks:
+                            logger.debug("importing input bank from initiating network")
+                        # completing pass: store input dict until the correct layer arrives
+                        ctx.banked_input = layer_input[
+                            0
+                        ]()  # wrapped dict expected, deepcopy may help
+                        hook_output = torch.randn(ctx.batch_size, *self.input_size)
+                elif fixed_layer_i in self.drop_save_dict or ctx.start == fixed_layer_i:
+                    # if not at first layer, not exiting, at a marked layer
+                    if ctx.start == 0 and self.hook_style == "pre":
+                        if ctx.debug_hooks:
+                            logger.debug(
+                                f"storing layer {fixed_layer_i} into input bank"
+                            )
+                        # initiating pass case: store inputs into dict
+                        ctx.banked_input[fixed_layer_i] = layer_input
+                    if 0 < ctx.start >= fixed_layer_i and self.hook_style == "pre":
+                        if ctx.debug_hooks:
+                            logger.debug(
+                                f"overwriting layer {fixed_layer_i} with input from bank"
+                            )
+                        # completing pass: overwrite dummy pass with stored input
+                        hook_output = ctx.banked_input[
+                            fixed_layer_i - (1 if self.hook_style == "pre" else 0)
+                        ]
             # lastly, prepare timestamps for current layer
-            if self.log and (fixed_layer_i >= self.model_start_i):
-                self.forward_dict[fixed_layer_i]["completed_by_node"] = self.node_name
-                self.forward_dict[fixed_layer_i]["inference_time"] = -self.timer()
-            logger.debug(f"end prehook {fixed_layer_i}")
+            if ctx.record_row is not None and fixed_layer_i >= ctx.start:
+                ctx.records.completed[ctx.record_row, fixed_layer_i] = True
+                self.layer_timer.begin(ctx.records, ctx.record_row, fixed_layer_i)
+            if ctx.debug_hooks:
+                logger.debug(f"end prehook {fixed_layer_i}")
             return hook_output
 
         return pre_hook
@@ -235,109 +408,294 @@ class WrappedModel(torch.nn.Module):
         """Posthook a layer for output capture and benchmarking."""
 
         def hook(module, layer_input, output):
-            logger.debug(f"start posthook {fixed_layer_i}")
-            if self.log and fixed_layer_i >= self.model_start_i:
-                self.forward_dict[fixed_layer_i]["inference_time"] += self.timer()
-            if (
-                fixed_layer_i in self.drop_save_dict
-                or (0 < self.model_start_i == fixed_layer_i)
-                and self.hook_style == "post"
-            ):
-                # if not at first layer, not exiting, at a marked layer
-                if self.model_start_i == 0:
-                    logger.debug(f"storing layer {fixed_layer_i} into input bank")
-                    # initiating pass case: store inputs into dict
-                    self.banked_input[fixed_layer_i] = output
-                elif self.hook_style == "post" and self.model_start_i >= fixed_layer_i:
-                    logger.debug(
-                        f"overwriting layer {fixed_layer_i} with input from bank"
-                    )
-                    # completing pass: overwrite dummy pass with stored input
-                    output = self.banked_input[fixed_layer_i]
-            if (
-                self.model_stop_i <= fixed_layer_i < self.layer_count
-                and self.hook_style == "post"
-            ):
-                logger.info(f"exit signal: during posthook {fixed_layer_i}")
-                self.banked_input[fixed_layer_i] = output
-                raise HookExitException(self.banked_input)
-            logger.debug(f"end posthook {fixed_layer_i}")
+            ctx = self.context()
+            if ctx.debug_hooks:
+                logger.debug(f"start posthook {fixed_layer_i}")
+            if ctx.record_row is not None and fixed_layer_i >= ctx.start:
+                self.layer_timer.end(ctx.records, ctx.record_row, fixed_layer_i)
+            if ctx.replaying:
+                if (
+                    fixed_layer_i in self.drop_save_dict
+                    or (0 < ctx.start == fixed_layer_i)
+                    and self.hook_style == "post"
+                ):
+                    # if not at first layer, not exiting, at a marked layer
+                    if ctx.start == 0:
+                        if ctx.debug_hooks:
+                            logger.debug(
+                                f"storing layer {fixed_layer_i} into input bank"
+                            )
+                        # initiating pass case: store inputs into dict
+                        ctx.banked_input[fixed_layer_i] = output
+                    elif self.hook_style == "post" and ctx.start >= fixed_layer_i:
+                        if ctx.debug_hooks:
+                            logger.debug(
+                                f"overwriting layer {fixed_layer_i} with input from bank"
+                            )
+                        # completing pass: overwrite dummy pass with stored input
+                        output = ctx.banked_input[fixed_layer_i]
+                if (
+                    ctx.stop <= fixed_layer_i < self.layer_count
+                    and self.hook_style == "post"
+                ):
+                    logger.info(f"exit signal: during posthook {fixed_layer_i}")
+                    ctx.banked_input[fixed_layer_i] = output
+                    raise HookExitException(ctx.banked_input)
+            if ctx.debug_hooks:
+                logger.debug(f"end posthook {fixed_layer_i}")
             return output
 
         return hook
 
+    @staticmethod
+    def _next_inference_id(inference_id: str) -> str:
+        """Each node that works on an inference appends its own suffix: id.0, id.1, ..."""
+        if len(str(inference_id).split(".")) > 1:
+            suffix = int(str(inference_id).rsplit(".", maxsplit=1)[-1]) + 1
+        else:
+            suffix = 0
+        return str(str(inference_id).split(".", maxsplit=1)[0]) + f".{suffix}"
+
     def forward(
         self,
         x,
-        inference_id: Union[str, None] = None,
+        inference_id: Union[str, list[str], None] = None,
         start: int = 0,
         end: Union[int, float] = np.inf,
         log: bool = True,
+        split_sizes: Union[Sequence[int], None] = None,
     ):
-        """Wraps the model forward pass to utilize our slicing."""
+        """Wraps the model forward pass to utilize our slicing. `x` may hold a batch of inputs
+        (or banked activations) on its first dimension; pass one inference_id per sample to get
+        a separate record for each of them, or a single id to record the batch as one inference.
+        Given `split_sizes`, the result is split back up as `split_output` would and a list is
+        returned, with the codec chain applied to each share on its own.
+        Any number of threads may call this at once; each pass keeps its state in a context of
+        its own.
+        """
         end = self.layer_count if end == np.inf else end
 
-        # set values for the hooks to see
-        self.log = log
-        self.model_stop_i = end
-        self.model_start_i = start
+        # the values for the hooks to see, along with whatever was noted for this pass
+        ctx = PassContext(start, end, log and inference_id is not None)
+        ctx.split_sizes = split_sizes
+        ctx.take_notes(self.context())
+        token = self._context.set(ctx)
+        try:
+            return self._forward(ctx, x, inference_id)
+        finally:
+            self._context.reset(token)
 
-        # prepare inference_id for storing results
-        if inference_id is None:
-            _inference_id = "unlogged"
-            self.log = False
-        else:
-            _inference_id = inference_id
-        if len(str(_inference_id).split(".")) > 1:
-            suffix = int(str(_inference_id).rsplit(".", maxsplit=1)[-1]) + 1
-        else:
-            suffix = 0
-        _inference_id = str(str(_inference_id).split(".", maxsplit=1)[0]) + f".{suffix}"
-        self.inference_dict["inference_id"] = _inference_id
+    def _forward(self, ctx: PassContext, x, inference_id):
+        _inference_ids = self._record_ids(inference_id)
+        _inference_id = _inference_ids[0]
         logger.info(f"{_inference_id} id beginning.")
+        if isinstance(x, NotDict):
+            x = self.decode_input(x)
+        elif isinstance(x, torch.Tensor) and x.dtype == torch.uint8:
+            # pixels from a preprocessed dataset, scaled the way ToTensor would
+            x = x.to(self.device).float().div_(255)
+        ctx.batch_size = batch_size_of(x)
+        if len(_inference_ids) > 1 and len(_inference_ids) != ctx.batch_size:
+            raise ValueError(
+                f"Got {len(_inference_ids)} inference ids for a batch of {ctx.batch_size}"
+            )
+        if ctx.log and self.master_dict is not None:
+            self._begin_record(ctx, _inference_ids)
+        # checked once per pass rather than on every hook call
+        ctx.debug_hooks = logger.isEnabledFor(logging.DEBUG)
         # actually run the forward pass
+        ctx.replaying = self.split_planner is None
+        with self.hook_lock:
+            self.passes_running += 1
+            self._sync_hooks(ctx, exclusive=self.passes_running == 1)
         try:
-            if self.mode != "train":
-                with torch.no_grad():
-                    out = self.model(x)
-            else:
-                out = self.model(x)
-        except HookExitException as e:
-            logger.debug("Exited early from forward pass due to stop index.")
-            out = NotDict(e.result)
-            for i in range(self.model_stop_i, self.layer_count):
-                del self.forward_dict[i]
-
-        # process and clean dicts before leaving forward
-        self.inference_dict["layer_information"] = self.forward_dict
-        if log and self.master_dict:
-            self.io_buf_dict[str(_inference_id).split(".", maxsplit=1)[0]] = (
-                copy.deepcopy(self.inference_dict)
-            )  # only one deepcopy needed
-            if len(self.io_buf_dict) >= self.flush_buffer_size:
-                self.update_master_dict()
-        self.inference_dict = {}
-        self.forward_dict = copy.deepcopy(self.forward_dict_empty)
-        self.banked_input = None
+            try:
+                if self.mode != "train":
+                    with torch.no_grad():
+                        out = self._run(ctx, x)
+                else:
+                    out = self._run(ctx, x)
+            except HookExitException as e:
+                logger.debug("Exited early from forward pass due to stop index.")
+                out = self._exit_early(ctx, e.result)
+            finally:
+                with self.hook_lock:
+                    self.passes_running -= 1
+            out = self._package_output(ctx, out)
+        finally:
+            # the record row was filled in place; hand full blocks over to the MasterDict
+            self._end_record(ctx)
         logger.info(f"{_inference_id} end.")
         return out
 
+    def _begin_record(self, ctx: PassContext, inference_ids: list[str]):
+        """Claims a row of the record store for the pass, writing in what was noted for it."""
+        ctx.records, ctx.record_row = self.records.claim(
+            inference_ids, self.node_name, ctx.batch_size, self.layer_timer._TYPE
+        )
+        records, row, first = ctx.records, ctx.record_row, ctx.start
+        if first >= self.layer_count:
+            return
+        spec, decode_time = ctx.pending_decode
+        if spec is not None:
+            records.codecs[row] = spec
+            records.decode_time[row, first] = decode_time
+        if ctx.pending_send is not None:
+            depth, blocked, queued = ctx.pending_send
+            records.send_queue_depth[row, first] = depth
+            records.send_blocked_time[row, first] = blocked
+            records.send_queue_time[row, first] = queued
+        if ctx.pending_cache is not None:
+            hit, lookup_time = ctx.pending_cache
+            records.cache_hit[row, first] = hit
+            records.cache_lookup_time[row, first] = lookup_time
+
+    def _end_record(self, ctx: PassContext):
+        """Releases the pass's row, flushing any block it was the last to finish."""
+        if ctx.records is None:
+            return
+        records, ctx.records, ctx.record_row = ctx.records, None, None
+        for block in self.records.release(records):
+            self._flush(block)
+
+    def _record_ids(self, inference_id: Union[str, list[str], None]) -> list[str]:
+        if inference_id is None:
+            inference_ids = ["unlogged"]
+        elif isinstance(inference_id, (list, tuple)):
+            inference_ids = list(inference_id)
+        else:
+            inference_ids = [inference_id]
+        return [self._next_inference_id(i) for i in inference_ids]
+
+    def record_cached_pass(
+        self,
+        inference_id: Union[str, list[str]],
+        start: int,
+        end: Union[int, float],
+        batch_size: int,
+        lookup_time: int,
+        send_stats: Union[tuple[int, int, int], None] = None,
+    ):
+        """Records a pass whose output came from a completion cache rather than the model. Its
+        layers count as completed by this node in no time, with the hit on the first one. Values
+        noted for the next real pass are left alone."""
+        if self.master_dict is None:
+            return
+        end = self.layer_count if end == np.inf else min(int(end), self.layer_count)
+        ctx = PassContext(start, end, True)
+        ctx.batch_size = batch_size
+        ctx.pending_send = send_stats
+        ctx.pending_cache = (True, lookup_time)
+        self._begin_record(ctx, self._record_ids(inference_id))
+        ctx.records.completed[ctx.record_row, start:end] = True  # type: ignore
+        self._end_record(ctx)
+
+    def note_cache_lookup(self, hit: bool, lookup_time: int):
+        """Records a completion cache lookup made for the input of the next pass."""
+        ctx = self.context()
+        if ctx.pending_cache is not None:
+            lookup_time += ctx.pending_cache[1]
+        ctx.pending_cache = (hit, lookup_time)
+
+    def _run(self, ctx: PassContext, x):
+        """Executes the layers between the start and stop indices, either with a precompiled
+        split plan or by replaying the whole network through the hooks."""
+        if ctx.replaying:
+            return self.model(x)
+        start, end = ctx.start, min(ctx.stop, self.layer_count)
+        out = self.split_planner(x() if isinstance(x, NotDict) else x, start, end)
+        if end < self.layer_count:
+            out = self._exit_early(ctx, out)
+        return out
+
+    def _exit_early(self, ctx: PassContext, banked: dict) -> NotDict:
+        """Packages the activations needed downstream once the stop index is reached."""
+        out = NotDict(banked)
+        if ctx.record_row is not None:
+            # the replay path may have started timing the layer it exited in
+            ctx.records.completed[ctx.record_row, ctx.stop :] = False  # type: ignore
+        return out
+
+    def _package_output(self, ctx: PassContext, out):
+        """Splits the output into the shares asked for and encodes the banked activations of
+        an early exit. Each share is encoded on its own, since an encoded batch can't be split.
+        """
+        shares = (
+            [out] if ctx.split_sizes is None else split_output(out, ctx.split_sizes)
+        )
+        if self.codec_chain is not None and isinstance(out, NotDict):
+            shares = [self._encode_output(ctx, share) for share in shares]
+        return shares[0] if ctx.split_sizes is None else shares
+
+    def _encode_output(self, ctx: PassContext, out: NotDict) -> NotDict:
+        """Runs the banked activations through the configured codec chain before they leave
+        this node, recording the cost on the last layer this node completed. The shares of a
+        batched pass add up their costs on the pass's row."""
+        encode_start = self.timer()
+        encoded, nbytes = self.codec_chain.encode_activations(out())
+        encode_time = self.timer() - encode_start
+        if ctx.record_row is not None and ctx.stop > 0:
+            records, row, layer = ctx.records, ctx.record_row, ctx.stop - 1
+            records.codecs[row] = self.codec_chain.spec  # type: ignore
+            records.encode_time[row, layer] = (  # type: ignore
+                max(records.encode_time[row, layer], 0) + encode_time  # type: ignore
+            )
+            records.encoded_bytes[row, layer] = (  # type: ignore
+                max(records.encoded_bytes[row, layer], 0) + nbytes  # type: ignore
+            )
+        return NotDict(encoded)
+
+    def decode_input(self, x: NotDict) -> NotDict:
+        """Reverses whatever codec the sending node applied, recording the cost on the first
+        layer this node completes. Decoding several inputs before one batched pass adds up
+        their costs; inputs that were never encoded are passed through."""
+        decode_start = self.timer()
+        decoded, spec = decode_activations(x())
+        decode_time = self.timer() - decode_start
+        if spec is not None:
+            # applied to the record once the forward pass claims its row
+            ctx = self.context()
+            ctx.pending_decode = (spec, ctx.pending_decode[1] + decode_time)
+        return NotDict(decoded)
+
+    def note_send_stats(self, send_stats: Union[tuple[int, int, int], None]):
+        """Records how the sending node's SendQueue held up the input of the next pass. Inputs
+        batched into one pass keep the worst of each value."""
+        if send_stats is None:
+            return
+        ctx = self.context()
+        if ctx.pending_send is not None:
+            send_stats = tuple(map(max, ctx.pending_send, send_stats))
+        ctx.pending_send = send_stats
+
     def update_master_dict(self):
-        """Updates the linked MasterDict object with recent data, and clears buffer"""
+        """Updates the linked MasterDict object with recent data, and clears buffer. Rows of
+        passes still running are flushed as soon as those passes end."""
         logger.debug("WrappedModel.update_master_dict called")
-        if self.master_dict is not None and self.io_buf_dict:
-            logger.info("flushing IO buffer dict to MasterDict")
-            self.master_dict.update(self.io_buf_dict)
-            self.io_buf_dict = {}
+        if self.master_dict is not None and self.records.active.rows:
+            for block in self.records.seal_active():
+                self._flush(block)
             return
         logger.info(
             "MasterDict not updated; either buffer is empty or MasterDict is None"
         )
 
+    def _flush(self, block: RecordBlock):
+        logger.info("flushing record store to MasterDict")
+        self.layer_timer.resolve(block)
+        for listener in self.flush_listeners:
+            listener(block)
+        self.master_dict.update(self.records.to_dict(block))  # type: ignore
+        # the block is only read until here, so it can take new rows again
+        self.records.recycle(block)
+
     def parse_input(self, _input):
         """Checks if the input is appropriate at the given stage of the network.
         Does not yet check Tensor shapes for intermediate layers."""
-        if isinstance(_input, Image.Image):
+        if isinstance(_input, (list, tuple)):
+            # several inputs become one batch
+            input_tensor = torch.cat([self.parse_input(item) for item in _input])
+        elif isinstance(_input, Image.Image):
             if _input.size != self.base_input_size:
                 _input = _input.resize(self.base_input_size)
             transform = ToTensor()
@@ -355,7 +713,7 @@ class WrappedModel(torch.nn.Module):
             input_tensor = input_tensor.to(self.mode)
         return input_tensor
 
-    def warmup(self, iterations=50, force=False):
+    def warmup(self, iterations=50, force=False, batch_size=1):
         """runs specified passes on the nn to warm up gpu if enabled"""
         if self.device != "cuda" and force is not False:
             logger.info("Warmup not required.")
@@ -363,7 +721,7 @@ class WrappedModel(torch.nn.Module):
             logger.info("Starting warmup.")
             with torch.no_grad():
                 for _ in range(iterations):
-                    self(torch.randn(1, *self.input_size), log=False)
+                    self(torch.randn(batch_size, *self.input_size), log=False)
             logger.info("Warmup complete.")
 
     def prune_layers(self, newlow, newhigh):
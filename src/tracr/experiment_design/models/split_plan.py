@@ -0,0 +1,170 @@
+"""
+Sliced execution plans for split inference.
+
+Replaying a dummy input through the whole network and swapping in banked activations with hooks
+makes the completing node recompute every layer before the split point. Instead, the network is
+traced once with torch.fx, treating every hooked layer as a leaf, and each traced node is
+assigned to the hooked layer it belongs to. For any `(start, end)` pair a `GraphModule` is then
+built that executes only the layers in `[start, end)`: it takes the values crossing the `start`
+boundary as inputs and returns the values crossing the `end` boundary. Because the boundary is
+read off the data flow of the graph, skip connections (such as the ones YOLO keeps in
+`drop_save_dict`) are carried across splits automatically, and nothing else is.
+
+The plans call the original submodules, so weights are shared with the wrapped model and the
+per-layer hooks still fire for timing.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Any
+
+import torch
+import torch.fx
+
+
+logger = logging.getLogger("tracr_logger")
+
+
+class _Entry(torch.nn.Module):
+    """Gives the traced graph a single positional input regardless of the model's signature."""
+
+    def __init__(self, model: torch.nn.Module) -> None:
+        super().__init__()
+        self.model = model
+
+    def forward(self, x):
+        return self.model(x)
+
+
+class _LayerTracer(torch.fx.Tracer):
+    """Stops tracing at the layers WrappedModel hooks, so each becomes one graph node."""
+
+    def __init__(self, layer_ids: set[int]) -> None:
+        super().__init__()
+        self.layer_ids = layer_ids
+
+    def is_leaf_module(self, m: torch.nn.Module, module_qualified_name: str) -> bool:
+        return id(m) in self.layer_ids or super().is_leaf_module(
+            m, module_qualified_name
+        )
+
+
+class SplitPlanner:
+    """
+    Traces `model` once and builds (and caches) a GraphModule for each `(start, end)` pair.
+    `layers` lists the hooked modules in layer_id order.
+    """
+
+    def __init__(self, model: torch.nn.Module, layers: list[torch.nn.Module]) -> None:
+        self.layer_count = len(layers)
+        self.root = _Entry(model)
+        layer_of_module = {id(layer): i for i, layer in enumerate(layers)}
+        self.graph = _LayerTracer(set(layer_of_module)).trace(self.root)
+
+        # each node belongs to the first hooked layer that runs at or after it; anything after
+        # the last hooked layer (e.g. postprocessing) belongs to the last one
+        self.layer_of: dict[str, int] = {}
+        pending: list[torch.fx.Node] = []
+        seen_layers = set()
+        for node in self.graph.nodes:
+            if node.op == "placeholder":
+                self.layer_of[node.name] = -1
+            elif node.op == "output":
+                self.output_node = node
+            elif node.op == "get_attr":
+                # parameters and buffers are available everywhere; never sent
+                continue
+            else:
+                pending.append(node)
+                if node.op == "call_module":
+                    layer = layer_of_module.get(
+                        id(self.root.get_submodule(node.target))
+                    )
+                    if layer is not None:
+                        seen_layers.add(layer)
+                        for waiting in pending:
+                            self.layer_of[waiting.name] = layer
+                        pending = []
+        for waiting in pending:
+            self.layer_of[waiting.name] = self.layer_count - 1
+        if len(seen_layers) != self.layer_count:
+            raise ValueError(
+                f"traced graph reaches {len(seen_layers)} of {self.layer_count} hooked layers"
+            )
+
+        self._boundaries: dict[int, list[str]] = {}
+        self._plans: dict[tuple[int, int], torch.fx.GraphModule] = {}
+        self._lock = threading.Lock()
+
+    def boundary(self, cut: int) -> list[str]:
+        """
+        Names of the values that have to be handed over when splitting before layer `cut`:
+        everything produced before it that is still needed at or after it.
+        """
+        if cut not in self._boundaries:
+            crossing = []
+            for node in self.graph.nodes:
+                if self.layer_of.get(node.name, cut) >= cut:
+                    continue
+                if any(
+                    user.op == "output" or self.layer_of.get(user.name, -1) >= cut
+                    for user in node.users
+                ):
+                    crossing.append(node.name)
+            self._boundaries[cut] = crossing
+        return self._boundaries[cut]
+
+    def plan(self, start: int, end: int) -> torch.fx.GraphModule:
+        """
+        Returns a module that runs layers `[start, end)`. Its positional inputs are the values
+        named by `boundary(start)`; it returns the model's output if `end` is past the last
+        layer, or else a dict of the values named by `boundary(end)`.
+        """
+        key = (start, end)
+        plan = self._plans.get(key)
+        if plan is None:
+            with self._lock:
+                if key not in self._plans:
+                    self._plans[key] = self._build(start, end)
+                    logger.debug(
+                        f"built execution plan for layers {start} through {end}"
+                    )
+                plan = self._plans[key]
+        return plan
+
+    def _build(self, start: int, end: int) -> torch.fx.GraphModule:
+        graph = torch.fx.Graph()
+        env: dict[str, torch.fx.Node] = {}
+        by_name = {node.name: node for node in self.graph.nodes}
+
+        def lookup(node: torch.fx.Node) -> torch.fx.Node:
+            if node.name not in env and node.op == "get_attr":
+                env[node.name] = graph.node_copy(node, lookup)
+            return env[node.name]
+
+        for name in self.boundary(start):
+            env[name] = graph.placeholder(name)
+        for node in self.graph.nodes:
+            if node.op in ("placeholder", "output", "get_attr"):
+                continue
+            if start <= self.layer_of[node.name] < end:
+                env[node.name] = graph.node_copy(node, lookup)
+
+        if end >= self.layer_count:
+            result: Any = torch.fx.map_arg(self.output_node.args[0], lookup)
+        else:
+            result = {name: lookup(by_name[name]) for name in self.boundary(end)}
+        graph.output(result)
+        return torch.fx.GraphModule(self.root, graph)
+
+    def __call__(self, x: Any, start: int, end: int) -> Any:
+        """
+        Runs layers `[start, end)` on `x`, which is the model input when `start` is 0 and a dict
+        of the values crossing `start` otherwise.
+        """
+        plan = self.plan(start, end)
+        if isinstance(x, dict):
+            return plan(*[x[name] for name in self.boundary(start)])
+        return plan(x)
@@ -0,0 +1,138 @@
+"""
+Timing backends for WrappedModel's per-layer measurements.
+
+The hooks bracket every layer with `begin` and `end`. On the CPU a host clock around the call
+is the layer's execution time, but CUDA kernels are launched asynchronously, so on a GPU the same
+clock only measures how long it took to queue the work. The backend is chosen with the
+`timer_backend` key of the model config:
+
+    host        time.perf_counter_ns around the call (the original behavior)
+    sync        the same clock, but the device is synchronized before every reading
+    cuda_event  CUDA events recorded in the stream, resolved only when records are flushed
+
+`sync` and `cuda_event` both measure execution on CUDA devices; `sync` serializes the host with
+the device at every layer boundary, while `cuda_event` leaves the stream alone until the flush.
+On the CPU `sync` behaves exactly like `host`.
+"""
+
+from __future__ import annotations
+
+import time
+
+import torch
+
+from src.tracr.experiment_design.records.record_store import RecordBlock
+
+
+class LayerTimer:
+    """
+    Factory class for timing backends. `begin`/`end` write a layer's time into a `RecordBlock`
+    (or arrange for it to be written by `resolve`, which runs before a block is flushed).
+    """
+
+    _TYPE: str = "base"
+
+    subclasses = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls._TYPE in cls.subclasses:
+            raise ValueError("_TYPE alias already reserved.")
+        cls.subclasses[cls._TYPE] = cls
+
+    @classmethod
+    def create(cls, class_type, *args, **kwargs):
+        if class_type not in cls.subclasses:
+            raise ValueError(
+                "Bad or unknown type {}. Does the subclass specify _TYPE ?".format(
+                    class_type
+                )
+            )
+        return cls.subclasses[class_type](*args, **kwargs)
+
+    def __init__(self, device: str = "cpu") -> None:
+        self.device = torch.device(device)
+
+    def now(self) -> int:
+        """Host timestamp in nanoseconds, for measuring work outside the layers."""
+        return time.perf_counter_ns()
+
+    def begin(self, records: RecordBlock, row: int, layer: int) -> None:
+        records.inference_time[row, layer] = -self.now()
+
+    def end(self, records: RecordBlock, row: int, layer: int) -> None:
+        records.inference_time[row, layer] += self.now()
+
+    def resolve(self, records: RecordBlock) -> None:
+        """Fills in any measurements that were deferred until the block is flushed."""
+
+
+class HostTimer(LayerTimer):
+    _TYPE: str = "host"
+
+
+class SyncHostTimer(LayerTimer):
+    """Waits for queued device work before every reading, so layer times include execution."""
+
+    _TYPE: str = "sync"
+
+    def __init__(self, device: str = "cpu") -> None:
+        super().__init__(device)
+        self.synchronize = self.device.type == "cuda" and torch.cuda.is_available()
+
+    def now(self) -> int:
+        if self.synchronize:
+            torch.cuda.synchronize(self.device)
+        return time.perf_counter_ns()
+
+
+class CudaEventTimer(LayerTimer):
+    """
+    Records a pair of CUDA events around each layer. Reading an event's elapsed time blocks until
+    the event has completed, so that only happens in `resolve`. Events are pooled, since a flush
+    interval can cover thousands of layer executions.
+    """
+
+    _TYPE: str = "cuda_event"
+
+    def __init__(self, device: str = "cuda") -> None:
+        super().__init__(device)
+        if self.device.type != "cuda" or not torch.cuda.is_available():
+            raise RuntimeError("the cuda_event timer needs a CUDA device")
+        self.free_events: list[torch.cuda.Event] = []
+        # (row, layer) -> [start event, end event or None] for each block awaiting a flush
+        self.pending: dict[int, dict[tuple[int, int], list]] = {}
+        # codec work is host-side; time it with a synchronized host clock
+        self.host = SyncHostTimer(device)
+
+    def _event(self) -> torch.cuda.Event:
+        # passes may run on several threads; pop() is atomic where a check-then-pop is not
+        try:
+            return self.free_events.pop()
+        except IndexError:
+            return torch.cuda.Event(enable_timing=True)
+
+    def now(self) -> int:
+        return self.host.now()
+
+    def begin(self, records: RecordBlock, row: int, layer: int) -> None:
+        start = self._event()
+        start.record()
+        self.pending.setdefault(id(records), {})[(row, layer)] = [start, None]
+        records.inference_time[row, layer] = 0
+
+    def end(self, records: RecordBlock, row: int, layer: int) -> None:
+        end = self._event()
+        end.record()
+        self.pending[id(records)][(row, layer)][1] = end
+
+    def resolve(self, records: RecordBlock) -> None:
+        for (row, layer), (start, end) in self.pending.pop(id(records), {}).items():
+            if end is not None:
+                end.synchronize()
+                if row < records.rows and records.completed[row, layer]:
+                    records.inference_time[row, layer] = int(
+                        start.elapsed_time(end) * 1e6
+                    )
+                self.free_events.append(end)
+            self.free_events.append(start)
@@ -1,56 +1,102 @@
 from .partitioner import Partitioner
 from typing import Any
+import numpy as np
 import torch
 import os
-import csv
 import pickle
 
 # import matplotlib.pyplot as plt
 
 
+def fit_line(x: np.ndarray, y: np.ndarray, robust: bool = False) -> tuple[float, float]:
+    """
+    Least-squares fit of `y = w * x + b`, solved in closed form. With `robust`, the fit is
+    refined by a few rounds of iteratively reweighted least squares with Huber weights, so a
+    handful of outlying latencies (a GC pause, a context switch) don't drag the line. If every
+    x is the same there's no slope to fit; w is 0 and b the median of y.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if x.size == 0:
+        return 0.0, 0.0
+    if np.ptp(x) == 0:
+        return 0.0, float(np.median(y))
+    weights = np.ones_like(x)
+    for _ in range(8 if robust else 1):
+        sw = weights.sum()
+        x_mean = (weights * x).sum() / sw
+        y_mean = (weights * y).sum() / sw
+        dx = x - x_mean
+        w = (weights * dx * (y - y_mean)).sum() / (weights * dx * dx).sum()
+        b = y_mean - w * x_mean
+        if robust:
+            residuals = np.abs(y - (w * x + b))
+            # 1.345 * MAD-based sigma is the usual Huber threshold
+            scale = 1.345 * 1.4826 * np.median(residuals)
+            if scale == 0:
+                break
+            weights = np.minimum(1.0, scale / np.maximum(residuals, 1e-12))
+    return float(w), float(b)
+
+
+class CoefficientTable:
+    """
+    The fitted latency model of every layer class, `ns = w * x + b`, as one `(classes, 2)`
+    array so that predictions for a whole sequence of layers are a single vectorized lookup.
+    Classes that were never fitted predict 0.
+    """
+
+    def __init__(self) -> None:
+        self.index: dict[str, int] = {}
+        self.coef = np.zeros((0, 2))
+
+    def __contains__(self, layer_class: str) -> bool:
+        return layer_class in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def set(self, layer_class: str, w: float, b: float) -> None:
+        if layer_class not in self.index:
+            self.index[layer_class] = len(self.index)
+            self.coef = np.vstack([self.coef, np.zeros((1, 2))])
+        self.coef[self.index[layer_class]] = (w, b)
+
+    def fit(
+        self,
+        classes: np.ndarray,
+        x: np.ndarray,
+        y: np.ndarray,
+        robust: bool = False,
+    ) -> None:
+        """(Re)fits every class present in `classes` from the matching x and y values."""
+        classes = np.asarray(classes)
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        for layer_class in np.unique(classes):
+            mask = classes == layer_class
+            self.set(str(layer_class), *fit_line(x[mask], y[mask], robust))
+
+    def lookup(self, classes: list[str]) -> np.ndarray:
+        """Row of `coef` for each class, or -1 for classes that were never fitted."""
+        return np.array([self.index.get(c, -1) for c in classes], dtype=np.int64)
+
+    def predict(self, rows: np.ndarray, x: np.ndarray) -> np.ndarray:
+        coef = np.vstack([self.coef, np.zeros((1, 2))])  # row -1 predicts 0
+        return coef[rows, 0] * x + coef[rows, 1]
+
+
 class RegressionPartitioner(Partitioner):
     _TYPE = "regression"
 
-    class linreg:
-
-        def __init__(self, *args) -> None:
-            self.model = torch.nn.Linear(1, 1)
-            self.criterion = torch.nn.MSELoss()
-            self.optim = torch.optim.SGD(self.model.parameters(), lr=1e-2)
-            self.training_iter = 20
-            self.loss_list = []
-
-        def forward(self, x):
-            return self.model(torch.unsqueeze(x, 0))
-
-        def train_pass(self, y, pred):
-            loss = self.criterion(pred, torch.as_tensor([y]))
-            # storing the calculated loss in a list
-            self.loss_list.append(loss.data)
-            # backward pass for computing the gradients of the loss w.r.t to learnable parameters
-            self.optim.zero_grad()
-            loss.backward()
-            self.optim.step()
-
-        def manually_set_weights(self, w, b):
-            self.model.weight.requires_grad = False
-            self.model.bias.requires_grad = False
-            self.model.weight.fill_(w)
-            self.model.bias.fill_(b)
-
-        def manually_scale_bias(self, scale_factor):
-            self.model.weight.requires_grad = False
-            self.model.bias.requires_grad = False
-            temp = scale_factor * self.model.bias
-            self.model.bias.data = temp
-
     def __init__(self, num_breakpoints, clip_min_max=True) -> None:
         super().__init__()
         self.start = 0  # needed if we start dropping modules from the Model class
         self.breakpoints = num_breakpoints
         self.clip = clip_min_max
-        self.regression = {}
+        self.regression = CoefficientTable()
         self.module_sequence = []
+        self._sequence_arrays = None  # module_sequence as arrays, built on first use
         self.num_modules = None
         self._dir = "TestCases/AlexnetSplit/partitioner_datapoints/local/"
         self.server_regression = None
@@ -63,29 +109,40 @@ class RegressionPartitioner(Partitioner):
 
     def estimate_split_point(self, starting_layer):
         """returns the index of the active model to split before. To mandate layer 0 is run on edge, provide starting_layer = 1"""
-        for module, param_bytes, output_bytes in self.module_sequence:
-            local_time_est_s = (
-                int(
-                    self.regression[module].forward(torch.as_tensor(float(param_bytes)))
-                )
+        classes, param_bytes, output_bytes = self._module_arrays()
+        local_time_est_s = (
+            self.regression.predict(
+                self.regression.lookup(classes), param_bytes
+            ).astype(np.int64)
+            * 1e-9
+        )
+        if self.server_regression is None:
+            server_time_est_s = 0
+        else:
+            server_time_est_s = (
+                self.server_regression.predict(
+                    self.server_regression.lookup(classes), param_bytes
+                ).astype(np.int64)
                 * 1e-9
+            )  # get server_regression from grpc
+        output_transfer_time = output_bytes / self._get_network_speed_bytes()
+        # keep layers local up to the first one that is cheaper to hand off
+        hand_off = np.flatnonzero(
+            local_time_est_s >= output_transfer_time + server_time_est_s
+        )
+        return starting_layer + (hand_off[0] if hand_off.size else len(classes))
+
+    def _module_arrays(self) -> tuple[list[str], np.ndarray, np.ndarray]:
+        if self._sequence_arrays is None:
+            classes = [module for module, _, _ in self.module_sequence]
+            param_bytes = np.array(
+                [p for _, p, _ in self.module_sequence], dtype=np.float64
             )
-            if self.server_regression is None:
-                server_time_est_s = 0
-            else:
-                server_time_est_s = (
-                    int(
-                        self.server_regression[module].forward(
-                            torch.as_tensor(float(param_bytes))
-                        )
-                    )
-                    * 1e-9
-                )  # get server_regression from grpc
-            output_transfer_time = output_bytes / self._get_network_speed_bytes()
-            if local_time_est_s < output_transfer_time + server_time_est_s:
-                starting_layer += 1
-            else:
-                return starting_layer
+            output_bytes = np.array(
+                [o for _, _, o in self.module_sequence], dtype=np.float64
+            )
+            self._sequence_arrays = (classes, param_bytes, output_bytes)
+        return self._sequence_arrays
 
     def create_data(self, model, iterations=10):
         for f in os.listdir(self._dir):
@@ -96,6 +153,7 @@ class RegressionPartitioner(Partitioner):
             from_model = model.master_dict.pop("profile")["layer_information"].values()
             temp_data.extend(from_model)
             # build a simple sequence from the first row of data
+        self._sequence_arrays = None
         for i in range(self.breakpoints):
             self.module_sequence.append(
                 (
@@ -115,38 +173,32 @@ class RegressionPartitioner(Partitioner):
                 f.write(f"{selected_value}, {datapoint['inference_time']}\n")
             output_bytes = datapoint["output_bytes"]
 
-    def update_regression(self):
+    def update_regression(self, robust: bool = False):
+        """
+        Fits every layer class's latency model from the datapoints `create_data` collected,
+        replacing the previous fit. Pass `robust=True` to downweight outliers.
+        """
         for layer_type in os.listdir(self._dir):
-            x, y = [], []
-            self.regression[layer_type.split(".")[0]] = RegressionPartitioner.linreg()
-            current_linreg = self.regression[layer_type.split(".")[0]]
-            with open(os.path.join(self._dir, layer_type)) as f:
-                reader = csv.reader(f)
-                for line in reader:
-                    x.append(float(line[0]))
-                    y.append(float(line[1]))
-                # normalize to avoid explosion
-                x = torch.as_tensor(x)
-                y = torch.as_tensor(y)
-                if max(x) == min(x):
-                    print(
-                        f"Insufficient data for linreg, setting w=0 b=middle quantile {layer_type.split('.')[0]}"
-                    )
-                    current_linreg.manually_set_weights(
-                        torch.as_tensor(0), torch.quantile(y, q=0.5)
-                    )
-                else:
-                    # normalize to avoid explosion
-                    mmax = max(max(x), max(y))  # pyright: ignore
-                    x = x / mmax
-                    y = y / mmax
-                    for i in range(current_linreg.training_iter):
-                        # variable dataset so batchsize of 1
-                        for v, z in zip(x, y):
-                            pred = current_linreg.forward(v)
-                            current_linreg.train_pass(z, pred)
-                    # then scale b by mmax, our data is not normalized to the same range
-                    current_linreg.manually_scale_bias(mmax)
+            data = np.genfromtxt(
+                os.path.join(self._dir, layer_type), delimiter=",", ndmin=2
+            )
+            if data.shape[-1] < 2:
+                # an empty or header-only file
+                data = np.empty((0, 2))
+            data = data[~np.isnan(data).any(axis=1)]  # a first layer without a size
+            layer_class = layer_type.split(".")[0]
+            if data.shape[0] == 0 or np.ptp(data[:, 0]) == 0:
+                print(
+                    f"Insufficient data for linreg, setting w=0 b=middle quantile {layer_class}"
+                )
+            self.regression.set(layer_class, *fit_line(data[:, 0], data[:, 1], robust))
+
+    def update_regression_online(self, classes, x, y, robust: bool = False) -> None:
+        """
+        Refits the classes present in `classes` from fresh measurements (e.g. layer records
+        from the MasterDict) without going through the CSV files.
+        """
+        self.regression.fit(classes, x, y, robust)
 
     def _get_network_speed_bytes(self, artificial_value=4 * 1024**2):
         # needs work, ideal methodology to have a thread checking this continuously.
@@ -0,0 +1,195 @@
+"""
+A partitioner that learns where to split while the experiment runs.
+
+It keeps exponentially weighted moving averages of how long every layer takes on the local and
+the remote node, fed by the `inference_time` the hooks already record, and a model of the link
+between them, `time = rtt + bytes / bandwidth`, fitted to the timings of real `send_task` calls.
+Each decision picks the split that minimizes the predicted time to result,
+
+    sum(local layers before the split) + transfer(bytes at the split) + sum(remote layers after)
+
+so it moves the split towards whichever side gets faster as load or link quality change. The
+link is fitted to the bytes that actually went over the wire, so if a codec shrinks what is sent,
+the bytes at each split are scaled by the compression measured there (or, for splits not yet
+measured, by the mean over the splits that were). Layers
+that haven't been timed on one node borrow the other node's estimate, and a small fraction of
+decisions pick a random split so that estimates for rarely used splits don't go stale.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Any, Union
+
+import numpy as np
+
+from .partitioner import Partitioner
+
+
+def split_bytes_from_layer_table(layer_table: list[dict[str, Any]]) -> np.ndarray:
+    """
+    Bytes sent for each split point `0..len(layer_table)`: the input of the network for split 0,
+    the output of layer `s - 1` for split `s`, and nothing once every layer ran locally.
+    """
+    output_bytes = np.array(
+        [layer.get("output_bytes") or 0 for layer in layer_table], dtype=np.float64
+    )
+    first = layer_table[0]
+    input_size = first.get("input_size") or []
+    if input_size and isinstance(input_size[0], (list, tuple)):
+        input_size = input_size[0]
+    output_elements = np.prod(first.get("output_size") or [1])
+    element_bytes = output_bytes[0] / output_elements if output_elements else 4.0
+    input_bytes = float(np.prod(input_size)) * element_bytes if input_size else 0.0
+    return np.concatenate([[input_bytes], output_bytes[:-1], [0.0]])
+
+
+class LinkEstimate:
+    """
+    Fits `ns = rtt_ns + bytes * ns_per_byte` to recent transfers by least squares over
+    exponentially decayed sums, so old measurements fade out at a rate set by `alpha`.
+    """
+
+    def __init__(self, mb_per_s: float = 4.0, rtt_ns: float = 0.0, alpha: float = 0.1):
+        self.alpha = alpha
+        self.prior_ns_per_byte = 1e9 / (mb_per_s * 1e6)
+        self.prior_rtt_ns = rtt_ns
+        # decayed sums of 1, x, y, x*x and x*y
+        self.sums = np.zeros(5)
+
+    def observe(self, nbytes: int, elapsed_ns: int) -> None:
+        x, y = float(nbytes), float(elapsed_ns)
+        self.sums *= 1 - self.alpha
+        self.sums += (1.0, x, y, x * x, x * y)
+
+    @property
+    def ns_per_byte(self) -> float:
+        n, sx, sy, sxx, sxy = self.sums
+        if n == 0:
+            return self.prior_ns_per_byte
+        variance = sxx * n - sx * sx
+        if variance <= 1e-9 * sxx * n:
+            # every transfer had about the same size; attribute it all to bandwidth
+            return max(0.0, (sy - self.prior_rtt_ns * n) / sx) if sx else 0.0
+        return max(0.0, (sxy * n - sx * sy) / variance)
+
+    @property
+    def rtt_ns(self) -> float:
+        n, sx, sy, _, _ = self.sums
+        if n == 0:
+            return self.prior_rtt_ns
+        return max(0.0, (sy - self.ns_per_byte * sx) / n)
+
+    @property
+    def mb_per_s(self) -> float:
+        ns_per_byte = self.ns_per_byte
+        return np.inf if ns_per_byte == 0 else 1e3 / ns_per_byte
+
+    def predict_ns(self, nbytes: np.ndarray) -> np.ndarray:
+        return np.where(nbytes > 0, self.rtt_ns + nbytes * self.ns_per_byte, 0.0)
+
+
+class OnlinePartitioner(Partitioner):
+    """
+    Picks the split point between a local and a remote node from live measurements. Feed it
+    layer times with `observe_layers` (both nodes), encoded activation sizes with
+    `observe_encoding` and transfers with `observe_send`; calling it returns the split (the
+    first layer the remote node runs) with the lowest predicted time.
+    """
+
+    _TYPE = "online"
+
+    def __init__(
+        self,
+        split_bytes: np.ndarray,
+        alpha: float = 0.2,
+        explore: float = 0.05,
+        link: Union[LinkEstimate, None] = None,
+        seed: Union[int, None] = None,
+    ) -> None:
+        super().__init__()
+        self.split_bytes = np.asarray(split_bytes, dtype=np.float64)
+        self.layer_count = len(self.split_bytes) - 1
+        self.alpha = alpha
+        self.explore = explore
+        self.link = link or LinkEstimate()
+        # NaN until a layer has been timed on that node
+        self.local_ns = np.full(self.layer_count, np.nan)
+        self.remote_ns = np.full(self.layer_count, np.nan)
+        # wire bytes per raw byte at each split, NaN until measured; codecs only encode banked
+        # activations, so the network's input (split 0) is always sent as is
+        self.wire_ratio = np.full(self.layer_count + 1, np.nan)
+        self.wire_ratio[0] = 1.0
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.Lock()
+
+    def observe_layers(
+        self, times_ns: np.ndarray, completed: np.ndarray, remote: bool = False
+    ) -> None:
+        """
+        Folds per-layer times into the moving averages. `times_ns` and `completed` are
+        `(inferences, layers)` arrays, oldest first; layers that weren't completed are skipped.
+        """
+        times_ns = np.atleast_2d(times_ns)
+        completed = np.atleast_2d(completed).astype(bool)
+        with self.lock:
+            estimate = self.remote_ns if remote else self.local_ns
+            for times, done in zip(times_ns, completed):
+                first = done & np.isnan(estimate)
+                estimate[first] = times[first]
+                update = done & ~first
+                estimate[update] += self.alpha * (times[update] - estimate[update])
+
+    def observe_encoding(self, encoded_bytes: np.ndarray) -> None:
+        """
+        Folds the `encoded_bytes` the hooks record (an `(inferences, layers)` array, negative
+        where nothing was encoded) into the compression estimates. Bytes encoded after layer
+        `s - 1` were sent at split `s`.
+        """
+        encoded_bytes = np.atleast_2d(encoded_bytes)
+        with self.lock:
+            for row in encoded_bytes:
+                for layer in np.flatnonzero(row >= 0):
+                    split = layer + 1
+                    if split > self.layer_count or self.split_bytes[split] <= 0:
+                        continue
+                    ratio = row[layer] / self.split_bytes[split]
+                    if np.isnan(self.wire_ratio[split]):
+                        self.wire_ratio[split] = ratio
+                    else:
+                        self.wire_ratio[split] += self.alpha * (
+                            ratio - self.wire_ratio[split]
+                        )
+
+    def wire_bytes(self) -> np.ndarray:
+        """Predicted bytes on the wire for every split point, after any codec."""
+        with self.lock:
+            ratio = self.wire_ratio.copy()
+        measured = ratio[1:][~np.isnan(ratio[1:])]
+        fallback = measured.mean() if measured.size else 1.0
+        return self.split_bytes * np.where(np.isnan(ratio), fallback, ratio)
+
+    def observe_send(self, nbytes: int, elapsed_ns: int) -> None:
+        with self.lock:
+            self.link.observe(nbytes, elapsed_ns)
+
+    def predicted_ns(self) -> np.ndarray:
+        """Predicted time to result for every split point `0..layer_count`."""
+        wire_bytes = self.wire_bytes()
+        with self.lock:
+            # untimed layers borrow the other node's estimate, then count as free
+            local = np.nan_to_num(
+                np.where(np.isnan(self.local_ns), self.remote_ns, self.local_ns)
+            )
+            remote = np.nan_to_num(
+                np.where(np.isnan(self.remote_ns), self.local_ns, self.remote_ns)
+            )
+            transfer = self.link.predict_ns(wire_bytes)
+        local_before = np.concatenate([[0.0], np.cumsum(local)])
+        remote_after = np.concatenate([np.cumsum(remote[::-1])[::-1], [0.0]])
+        return local_before + transfer + remote_after
+
+    def __call__(self, *args: Any, **kwargs: Any) -> int:
+        if self.explore and self.rng.random() < self.explore:
+            return int(self.rng.integers(0, self.layer_count + 1))
+        return int(np.argmin(self.predicted_ns()))
@@ -0,0 +1,203 @@
+"""
+Per-hop metrics for inferences split across any number of nodes.
+
+An inference's layer records say which node completed each layer. Walking the layers in order,
+every change of node is a hop: the node that completed the previous layer sent that layer's
+output (or its codec-encoded form) to the node that completes the next one. Nothing here knows
+about particular node names or model sizes; the bytes of each hop come from the recorded
+`output_bytes`/`encoded_bytes`, and its latency from a `LinkModel`.
+
+If the inputs originate on a known `source_node` and the first layer was completed somewhere
+else, the input itself counts as a hop into layer 0. Its size is taken from the first layer's
+recorded input shape and element size.
+
+All functions work on the frame produced by `ResultsStore.layer_frame`: one row per layer, sorted
+by `inference_id` and then `layer_id`.
+"""
+
+from __future__ import annotations
+
+from typing import Union
+
+import numpy as np
+import pandas as pd
+
+
+HOP_COLUMNS = [
+    "inference_id",
+    "hop",
+    "from_node",
+    "to_node",
+    "split_layer",
+    "hop_bytes",
+    "latency_ns",
+]
+
+
+class LinkModel:
+    """
+    Models the time to move `n` bytes over a hop as `setup_ns + n / bandwidth`. The bandwidth is
+    `mb_per_s` unless `links` gives one for the specific `(from_node, to_node)` pair.
+    """
+
+    def __init__(
+        self,
+        mb_per_s: float = 4.0,
+        links: Union[dict[tuple[str, str], float], None] = None,
+        setup_ns: int = 0,
+    ) -> None:
+        self.mb_per_s = mb_per_s
+        self.links = links or {}
+        self.setup_ns = setup_ns
+
+    def latency_ns(
+        self, from_nodes: pd.Series, to_nodes: pd.Series, nbytes: pd.Series
+    ) -> np.ndarray:
+        mb_per_s = np.full(len(nbytes), self.mb_per_s, dtype="float64")
+        for (from_node, to_node), link_mb_per_s in self.links.items():
+            mb_per_s[
+                (from_nodes.to_numpy() == from_node) & (to_nodes.to_numpy() == to_node)
+            ] = link_mb_per_s
+        seconds = nbytes.to_numpy(dtype="float64") / (mb_per_s * 1e6)
+        return (seconds * 1e9).astype("int64") + self.setup_ns
+
+
+def _shape_elements(shapes: pd.Series) -> np.ndarray:
+    """Number of elements described by each recorded shape (NaN where there is none)."""
+    counts = np.full(len(shapes), np.nan)
+    for i, shape in enumerate(shapes):
+        if isinstance(shape, (list, tuple)) and shape:
+            if isinstance(shape[0], (list, tuple)):
+                shape = shape[0]  # layers with several inputs; the first is the tensor
+            counts[i] = float(np.prod(shape))
+    return counts
+
+
+def hop_frame(
+    layers: pd.DataFrame,
+    link: Union[LinkModel, None] = None,
+    source_node: Union[str, None] = None,
+) -> pd.DataFrame:
+    """Returns one row per hop of every inference, in order."""
+    link = link or LinkModel()
+    if layers.empty:
+        return pd.DataFrame(columns=HOP_COLUMNS)
+    keys = layers["inference_id"]
+    nodes = layers["completed_by_node"].astype(object)
+    sent_bytes = layers["output_bytes"].astype("float64")
+    if "encoded_bytes" in layers:
+        # a codec changes what actually goes over the wire
+        sent_bytes = layers["encoded_bytes"].astype("float64").fillna(sent_bytes)
+
+    same_inference = keys.eq(keys.shift(1))
+    changed = same_inference & nodes.ne(nodes.shift(1)) & nodes.notna()
+    hops = pd.DataFrame(
+        {
+            "inference_id": keys[changed],
+            "from_node": nodes.shift(1)[changed],
+            "to_node": nodes[changed],
+            "split_layer": layers["layer_id"][changed],
+            "hop_bytes": sent_bytes.shift(1)[changed],
+        }
+    )
+
+    if source_node is not None:
+        first = ~same_inference & nodes.ne(source_node) & nodes.notna()
+        first_layers = layers[first]
+        # element size from the layer's own output, applied to its input shape
+        element_bytes = first_layers["output_bytes"].to_numpy(
+            dtype="float64"
+        ) / _shape_elements(first_layers["output_size"])
+        inputs = pd.DataFrame(
+            {
+                "inference_id": keys[first],
+                "from_node": source_node,
+                "to_node": nodes[first],
+                "split_layer": first_layers["layer_id"],
+                "hop_bytes": _shape_elements(first_layers["input_size"])
+                * element_bytes,
+            }
+        )
+        hops = pd.concat([inputs, hops]).sort_index(kind="stable")
+
+    hops["hop_bytes"] = hops["hop_bytes"].fillna(0).astype("int64")
+    hops["latency_ns"] = link.latency_ns(
+        hops["from_node"], hops["to_node"], hops["hop_bytes"]
+    )
+    hops["hop"] = hops.groupby("inference_id", sort=False).cumcount()
+    return hops[HOP_COLUMNS].reset_index(drop=True)
+
+
+def inference_frame(layers: pd.DataFrame, hops: pd.DataFrame) -> pd.DataFrame:
+    """
+    Summarizes each inference: where it was first split, the route it took, per-node compute
+    time (one `inf_time_<node>` column per node), the bytes and modeled latency of all its hops,
+    codec overhead, and the resulting time to result.
+    """
+    if layers.empty:
+        return pd.DataFrame(
+            columns=[
+                "split_layer",
+                "route",
+                "total_time_ns",
+                "transmission_latency_ns",
+                "codec_time_ns",
+                "hop_count",
+                "hop_bytes",
+            ]
+        )
+    keys = layers["inference_id"]
+    index = pd.Index(keys.unique(), name="inference_id")
+    nodes = layers["completed_by_node"].astype(object).fillna("")
+
+    times = layers["inference_time"].fillna(0).astype("int64")
+    node_times = (
+        times.groupby([keys, nodes], sort=False).sum().unstack(fill_value=0)
+    ).reindex(index, fill_value=0)
+    node_times = node_times.drop(columns="", errors="ignore")
+    node_times.columns = [f"inf_time_{node}" for node in node_times.columns]
+
+    codec_time = pd.Series(0, index=layers.index)
+    for column in ("encode_time", "decode_time"):
+        if column in layers:
+            codec_time = codec_time + layers[column].fillna(0).astype("int64")
+
+    hop_groups = hops.groupby("inference_id", sort=False)
+    # an inference that never changed nodes ran entirely before its "split"
+    split_layer = (
+        hop_groups["split_layer"]
+        .first()
+        .reindex(index)
+        .fillna(layers["layer_id"].groupby(keys, sort=False).max() + 1)
+        .astype("int64")
+    )
+    first_nodes = nodes.groupby(keys, sort=False).first()
+    route = first_nodes.where(
+        ~first_nodes.index.isin(hops["inference_id"]),
+        hops["from_node"].groupby(hops["inference_id"], sort=False).first(),
+    ).reindex(index)
+    hop_route = hops["to_node"].groupby(hops["inference_id"], sort=False).agg(">".join)
+    route = route.str.cat(hop_route.reindex(index), sep=">", na_rep="").str.rstrip(">")
+
+    metrics = pd.DataFrame(
+        {
+            "split_layer": split_layer,
+            "route": route,
+            "transmission_latency_ns": hop_groups["latency_ns"].sum(),
+            "codec_time_ns": codec_time.groupby(keys, sort=False).sum(),
+            "hop_count": hop_groups.size(),
+            "hop_bytes": hop_groups["hop_bytes"].sum(),
+        },
+        index=index,
+    )
+    for column in ("transmission_latency_ns", "hop_count", "hop_bytes"):
+        metrics[column] = metrics[column].fillna(0).astype("int64")
+    metrics = metrics.join(node_times)
+    metrics.insert(
+        2,
+        "total_time_ns",
+        node_times.sum(axis=1)
+        + metrics["transmission_latency_ns"]
+        + metrics["codec_time_ns"],
+    )
+    return metrics
@@ -1,165 +1,157 @@
 import pickle
 import threading
+from pathlib import Path
+from typing import Any, Union
+
 import pandas as pd
 from rpyc.utils.classic import obtain
 
-
-# TODO: fix all the hardcoding for edge1 and client1 - make it a generic initiator and receiver or something
+from . import hop_metrics, split_sweep
+from .hop_metrics import LinkModel
+from .results_store import ResultsStore
 
 
 class MasterDict:
-
-    def __init__(self):
+    """
+    Collects the per-layer records of every inference in the experiment. Entries are written
+    through to a `ResultsStore`; give a `store_path` to keep them in a SQLite file on disk
+    rather than in memory.
+
+    The supermetrics treat every change of node between consecutive layers as a hop, so they
+    work for any number of participants. `link` models the latency of each hop from the bytes
+    sent over it; if the inputs start out on a known `source_node`, sending them to the node
+    that completed the first layer counts as a hop too.
+    """
+
+    def __init__(
+        self,
+        store_path: Union[str, Path, None] = None,
+        link: Union[LinkModel, None] = None,
+        source_node: Union[str, None] = None,
+    ):
         self.lock = threading.RLock()
-        self.inner_dict = {}
+        self.store = ResultsStore(store_path)
+        self.link = link or LinkModel()
+        self.source_node = source_node
+
+    def _write(self, key: str, value: dict):
+        if key in self.store:
+            if value.get("layer_information"):
+                # merge in the layers the other node(s) actually completed
+                self.store.write(key, value, merge=True)
+            else:
+                raise ValueError(
+                    "Cannot integrate inference_dict without 'layer_information' field"
+                )
+            return
+        self.store.write(key, value)
 
     def set(self, key: str, value: dict):
         with self.lock:
-            if key in self.inner_dict:
-                if value.get("layer_information"):
-                    layer_info = value["layer_information"]
-                    layer_info = {
-                        k: v
-                        for k, v in layer_info.items()
-                        if v["inference_time"] is not None
-                    }
-                else:
-                    raise ValueError(
-                        "Cannot integrate inference_dict without 'layer_information' field"
-                    )
-                return
-            self.inner_dict[key] = value
+            self._write(key, value)
+            self.store.commit()
 
     def get(self, key: str):
         with self.lock:
-            return self.inner_dict.get(key)
+            return self.store.get(key)
+
+    def keys(self) -> list[str]:
+        with self.lock:
+            return self.store.keys()
 
     def update(self, new_info: dict, by_value=True):
         if by_value:
             new_info = obtain(new_info)
         with self.lock:
+            # one transaction per flushed buffer
             for inference_id, layer_data in new_info.items():
-                self.set(inference_id, layer_data)
-
-    def get_transmission_latency(
-        self, inference_id: str, split_layer: str, mb_per_s: float = 4.0
-    ) -> int:
-        inf_data = self.inner_dict[inference_id]
-        split_layer = split_layer
-        # TODO: fix hardcoding
-        if split_layer == 20:
-            return 0
-        send_layer = int(split_layer - 1)  # type: ignore
-        if split_layer == 0:
-            sent_output_size_bytes = 602112
-        else:
-            sent_output_size_bytes = inf_data["layer_information"][send_layer][
-                "output_bytes"
-            ]
-        bytes_per_second = mb_per_s * 1e6
-        latency_s = sent_output_size_bytes / bytes_per_second
-        latency_ns = int(latency_s * 1e9)
-        return latency_ns
-
-    def get_total_inference_time(self, inference_id: str) -> tuple[int, int]:
-        inf_data = self.inner_dict[inference_id]
-
-        # layer_times = [
-        #     layer["inference_time"]
-        #     for layer in inf_data["layer_information"].values()
-        #     if layer["inference_time"]
-        # ]
-
-        elayer_times = [
-            int(layer["inference_time"])
-            for layer in inf_data["layer_information"].values()
-            if layer["inference_time"] and layer["completed_by_node"] == "EDGE1"
-        ]
-        clayer_times = [
-            int(layer["inference_time"])
-            for layer in inf_data["layer_information"].values()
-            if layer["inference_time"] and layer["completed_by_node"] == "CLIENT1"
-        ]
-        return int(sum(clayer_times)), int(sum(elayer_times))
-
-    def get_split_layer(self, inference_id: str) -> int:
-        inf_data = self.inner_dict[inference_id]
-        layer_ids = sorted(list(inf_data["layer_information"].keys()))
-        start_node = inf_data["layer_information"][0]["completed_by_node"]
-        for layer_id in layer_ids:
-            if (
-                inf_data["layer_information"][layer_id]["completed_by_node"]
-                != start_node
-            ):
-                return layer_id  # type: ignore
-        # TODO: fix hardcoding
-        if start_node == "CLIENT1":
-            return 0
-        else:
-            return 20
-
-    def calculate_supermetrics(
-        self, inference_id: str
-    ) -> tuple[int, int, int, int, int]:
-        split_layer = self.get_split_layer(inference_id)
-        transmission_latency = self.get_transmission_latency(inference_id, split_layer)  # type: ignore
-        inf_time_client, inf_time_edge = self.get_total_inference_time(inference_id)
-        time_to_result = inf_time_client + inf_time_edge + transmission_latency
-        return (
-            split_layer,
-            transmission_latency,
-            inf_time_client,
-            inf_time_edge,
-            time_to_result,
-        )
-
-    def to_dataframe(self) -> pd.DataFrame:
-        flattened_data = []
-        layer_attrs = []
-
-        for superfields in self.inner_dict.values():
-            inf_id = superfields["inference_id"]
-            (
-                split_layer,
-                trans_latency,
-                inf_time_client,
-                inf_time_edge,
-                total_time_to_result,
-            ) = self.calculate_supermetrics(inf_id)
-            for subdict in superfields["layer_information"].values():
-                layer_id = subdict.pop("layer_id")
-                if not layer_attrs:
-                    layer_attrs = [key for key in subdict.keys()]
-                row = (
-                    inf_id,
-                    split_layer,
-                    total_time_to_result,
-                    inf_time_client,
-                    inf_time_edge,
-                    trans_latency,
-                    layer_id,
-                    *[subdict[k] for k in layer_attrs],
+                self._write(inference_id, layer_data)
+            self.store.commit()
+
+    def expand_split_sweeps(self) -> int:
+        """
+        Adds the derived split points of every sweep whose two baselines have both been stored
+        (see split_sweep) and hasn't been expanded yet. Returns the number of entries added.
+        """
+        added = 0
+        with self.lock:
+            for sweep_id in split_sweep.sweep_ids(self.store.keys()):
+                if split_sweep.split_key(sweep_id, 1) in self.store:
+                    continue
+                entries = split_sweep.derive_split_entries(
+                    sweep_id,
+                    self.store.get(split_sweep.local_key(sweep_id)),
+                    self.store.get(split_sweep.remote_key(sweep_id)),
                 )
-                flattened_data.append(row)
-
-        flattened_data.sort(key=lambda tup: (tup[0], tup[1]))
+                for key, entry in entries.items():
+                    self.store.write(key, entry)
+                added += len(entries)
+            self.store.commit()
+        return added
+
+    def layer_times(
+        self, node_name: str, after: int = 0
+    ) -> tuple[int, list[int], list[float]]:
+        """
+        Mean per-layer times of `node_name` since `after`, for partitioners that follow another
+        node's load (see ResultsStore.layer_times).
+        """
+        with self.lock:
+            return self.store.layer_times(node_name, after)
 
-        columns = [
-            "inference_id",
-            "split_layer",
-            "total_time_ns",
-            "inf_time_client",
-            "inf_time_edge",
-            "transmission_latency_ns",
-            "layer_id",
-            *layer_attrs,
-        ]
-        df = pd.DataFrame(flattened_data, columns=columns)
+    def hop_dataframe(self) -> pd.DataFrame:
+        """
+        One row per hop of every stored inference: which nodes it went between, the layer it
+        entered the next node at, how many bytes were sent and the modeled latency of sending them.
+        """
+        with self.lock:
+            layers = self.store.layer_frame()
+        return hop_metrics.hop_frame(layers, self.link, self.source_node)
+
+    def _supermetrics(self, layers: pd.DataFrame) -> pd.DataFrame:
+        hops = hop_metrics.hop_frame(layers, self.link, self.source_node)
+        return hop_metrics.inference_frame(layers, hops)
+
+    def calculate_supermetrics(self, inference_id: str) -> dict[str, Any]:
+        """
+        The per-inference report columns for one inference: split_layer, route, total_time_ns,
+        transmission_latency_ns, codec_time_ns, hop_count, hop_bytes and an `inf_time_<node>`
+        for every node that completed some of its layers.
+        """
+        with self.lock:
+            layers = self.store.layer_frame(inference_id)
+        if layers.empty:
+            raise KeyError(inference_id)
+        row = self._supermetrics(layers).iloc[0]
+        return {
+            name: value.item() if hasattr(value, "item") else value
+            for name, value in row.items()
+        }
 
-        return df
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        One row per stored layer, prefixed with the supermetrics of the inference it belongs to.
+        Layers are read in a single query and the supermetrics are computed per group, so this
+        scales to hundreds of thousands of layer rows. Every column before `layer_id` is
+        per-inference.
+        """
+        with self.lock:
+            layers = self.store.layer_frame()
+        metrics = self._supermetrics(layers)
+        # entries are keyed by the bare inference_id; the stored one carries a per-node suffix
+        df = pd.concat(
+            [
+                layers[["inference_id"]],
+                metrics.reindex(layers["inference_id"]).reset_index(drop=True),
+                layers.drop(columns="inference_id"),
+            ],
+            axis=1,
+        )
+        return df.sort_values("inference_id", kind="stable").reset_index(drop=True)
 
     def to_pickle(self):
-        return pickle.dumps(self.inner_dict)
+        with self.lock:
+            return pickle.dumps(dict(self.store.entries()))
 
     def __getitem__(self, key: str):
         return self.get(key)
@@ -0,0 +1,243 @@
+"""
+Per-layer bookkeeping for WrappedModel.
+
+The fixed description of each layer (class, parameter counts, sizes) is kept once in a layer
+table. The values that change with every inference live in a preallocated NumPy structured
+array with one row per inference and one column per layer, which the hooks write into directly.
+Starting an inference claims and resets one row in place; once a block is full another
+preallocated block takes its place instead of anything being copied. The nested dicts MasterDict
+expects are only built when a block is flushed.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Any, Union
+
+import numpy as np
+
+
+# layer_table entries are built from torchinfo with these keys
+STATIC_FIELDS = (
+    "depth",
+    "class",
+    "parameters",
+    "parameter_bytes",
+    "input_size",
+    "output_size",
+    "output_bytes",
+)
+
+# integer fields use UNSET where the old dict template used None
+UNSET = -1
+RECORD_DTYPE = np.dtype(
+    [
+        ("completed", np.bool_),
+        ("inference_time", np.int64),
+        ("encode_time", np.int64),
+        ("encoded_bytes", np.int64),
+        ("decode_time", np.int64),
+        ("send_queue_depth", np.int64),
+        ("send_blocked_time", np.int64),
+        ("send_queue_time", np.int64),
+        ("cache_hit", np.int64),
+        ("cache_lookup_time", np.int64),
+    ]
+)
+
+
+def _optional(value: int) -> Union[int, None]:
+    return None if value == UNSET else int(value)
+
+
+def _optional_bool(value: int) -> Union[bool, None]:
+    return None if value == UNSET else bool(value)
+
+
+class RecordBlock:
+    """
+    Records for up to `capacity` inferences. Row-level values (ids, node, batch size, codec)
+    are kept alongside the per-layer structured array.
+    """
+
+    def __init__(self, layer_count: int, capacity: int) -> None:
+        self.capacity = capacity
+        self.data = np.zeros((capacity, layer_count), dtype=RECORD_DTYPE)
+        # field views, so hooks index plain 2D arrays
+        self.completed = self.data["completed"]
+        self.inference_time = self.data["inference_time"]
+        self.encode_time = self.data["encode_time"]
+        self.encoded_bytes = self.data["encoded_bytes"]
+        self.decode_time = self.data["decode_time"]
+        self.send_queue_depth = self.data["send_queue_depth"]
+        self.send_blocked_time = self.data["send_blocked_time"]
+        self.send_queue_time = self.data["send_queue_time"]
+        self.cache_hit = self.data["cache_hit"]
+        self.cache_lookup_time = self.data["cache_lookup_time"]
+        self.inference_ids: list[list[str]] = [[] for _ in range(capacity)]
+        self.node_names: list[Union[str, None]] = [None] * capacity
+        self.batch_sizes = np.ones(capacity, dtype=np.int64)
+        self.codecs: list[Union[str, None]] = [None] * capacity
+        self.timers: list[Union[str, None]] = [None] * capacity
+        self.in_flight = 0  # passes still writing to their rows
+        self.empty_row = np.zeros(layer_count, dtype=RECORD_DTYPE)
+        for field in (
+            "encode_time",
+            "encoded_bytes",
+            "decode_time",
+            "send_queue_depth",
+            "send_blocked_time",
+            "send_queue_time",
+            "cache_hit",
+            "cache_lookup_time",
+        ):
+            self.empty_row[field] = UNSET
+        self.rows = 0
+
+    def full(self) -> bool:
+        return self.rows >= self.capacity
+
+    def begin(
+        self,
+        inference_ids: list[str],
+        node_name: str,
+        batch_size: int,
+        timer: Union[str, None] = None,
+    ) -> int:
+        row = self.rows
+        self.data[row] = self.empty_row
+        self.inference_ids[row] = inference_ids
+        self.node_names[row] = node_name
+        self.batch_sizes[row] = batch_size
+        self.codecs[row] = None
+        self.timers[row] = timer
+        self.rows += 1
+        return row
+
+    def to_dict(self, layer_table: list[dict[str, Any]]) -> dict[str, dict]:
+        """
+        Builds the `{inference_id: {"inference_id": ..., "layer_information": {...}}}` structure
+        MasterDict expects, with one entry per sample and only the layers that were completed.
+        """
+        result: dict[str, dict] = {}
+        for row in range(self.rows):
+            node_name = self.node_names[row]
+            batch_size = int(self.batch_sizes[row])
+            codec = self.codecs[row]
+            timer = self.timers[row]
+            layer_ids = np.flatnonzero(self.completed[row]).tolist()
+            for sample_id in self.inference_ids[row]:
+                layer_information = {}
+                for i in layer_ids:
+                    encode_time = _optional(self.encode_time[row, i])
+                    decode_time = _optional(self.decode_time[row, i])
+                    static = layer_table[i]
+                    layer_information[i] = {
+                        "layer_id": i,
+                        "completed_by_node": node_name,
+                        "class": static["class"],
+                        "inference_time": int(self.inference_time[row, i]),
+                        "timer": timer,  # the backend that measured inference_time
+                        "parameters": static["parameters"],
+                        "parameter_bytes": static["parameter_bytes"],
+                        "cpu_cycles_used": None,
+                        "watts_used": None,
+                        "batch_size": batch_size,
+                        "codec": (
+                            codec
+                            if encode_time is not None or decode_time is not None
+                            else None
+                        ),
+                        "encode_time": encode_time,
+                        "encoded_bytes": _optional(self.encoded_bytes[row, i]),
+                        "decode_time": decode_time,
+                        # how the sending node's SendQueue held up the input, if it used one
+                        "send_queue_depth": _optional(self.send_queue_depth[row, i]),
+                        "send_blocked_time": _optional(self.send_blocked_time[row, i]),
+                        "send_queue_time": _optional(self.send_queue_time[row, i]),
+                        # whether a completion cache answered the pass, if the node used one
+                        "cache_hit": _optional_bool(self.cache_hit[row, i]),
+                        "cache_lookup_time": _optional(self.cache_lookup_time[row, i]),
+                        "depth": static["depth"],
+                        "input_size": static["input_size"],
+                        "output_size": static["output_size"],
+                        "output_bytes": static["output_bytes"],
+                    }
+                key = str(sample_id).split(".", maxsplit=1)[0]
+                if key in result:
+                    result[key]["layer_information"].update(layer_information)
+                else:
+                    result[key] = {
+                        "inference_id": sample_id,
+                        "layer_information": layer_information,
+                    }
+        return result
+
+
+class LayerRecordStore:
+    """
+    Record blocks for a model that may be running several passes at once. Each pass claims a
+    row of the `active` block and releases it when it ends. A full block is sealed and replaced
+    by a recycled (or new) one, and is handed out for flushing once the last pass writing to it
+    has released its row; it must be fully consumed (e.g. converted with `to_dict`) before it is
+    given back with `recycle`.
+    """
+
+    def __init__(self, layer_table: list[dict[str, Any]], capacity: int) -> None:
+        self.layer_table = layer_table
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.active = RecordBlock(len(layer_table), capacity)
+        self.free = [RecordBlock(len(layer_table), capacity)]
+        self.sealed: list[RecordBlock] = []
+
+    def claim(
+        self,
+        inference_ids: list[str],
+        node_name: str,
+        batch_size: int,
+        timer: Union[str, None] = None,
+    ) -> tuple[RecordBlock, int]:
+        with self.lock:
+            if self.active.full():
+                self._seal()
+            block = self.active
+            row = block.begin(inference_ids, node_name, batch_size, timer)
+            block.in_flight += 1
+            return block, row
+
+    def release(self, block: RecordBlock) -> list[RecordBlock]:
+        """Ends a pass's claim on its row. Returns the blocks that are now ready to flush."""
+        with self.lock:
+            block.in_flight -= 1
+            if block is self.active and block.full():
+                self._seal()
+            return self._take_ready()
+
+    def seal_active(self) -> list[RecordBlock]:
+        """Seals the active block if it has any rows. Returns the blocks ready to flush."""
+        with self.lock:
+            if self.active.rows:
+                self._seal()
+            return self._take_ready()
+
+    def recycle(self, block: RecordBlock) -> None:
+        with self.lock:
+            block.rows = 0
+            self.free.append(block)
+
+    def _seal(self) -> None:
+        self.sealed.append(self.active)
+        if self.free:
+            self.active = self.free.pop()
+        else:
+            self.active = RecordBlock(len(self.layer_table), self.capacity)
+        self.active.rows = 0
+
+    def _take_ready(self) -> list[RecordBlock]:
+        ready = [block for block in self.sealed if block.in_flight == 0]
+        self.sealed = [block for block in self.sealed if block.in_flight]
+        return ready
+
+    def to_dict(self, block: RecordBlock) -> dict[str, dict]:
+        return block.to_dict(self.layer_table)
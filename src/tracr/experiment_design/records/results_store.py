@@ -0,0 +1,226 @@
+"""
+Append-only SQLite storage behind MasterDict.
+
+Each flushed inference is written straight to disk, one transaction per `MasterDict.update`, so
+the observer's memory use no longer grows with the length of the experiment and everything
+flushed before a crash is still in the file. The database runs in WAL mode: the experiment
+process can read results while participants are still writing them.
+
+Layer records are stored one row per `(inference key, layer_id)`. Columns are added as new
+record fields appear, so nodes can report extra per-layer values without a schema change here;
+list-valued fields (torchinfo's input/output sizes) are stored as JSON.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+from pathlib import Path
+from typing import Any, Iterator, Union
+
+import numpy as np
+import pandas as pd
+
+
+_PLAIN_TYPES = (int, float, str, bytes, bool, type(None))
+
+
+def _to_sql(value: Any) -> Any:
+    if type(value) in _PLAIN_TYPES:
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple, dict)):
+        return json.dumps(value)
+    return value
+
+
+class ResultsStore:
+    """
+    Stores MasterDict entries (`{"inference_id": ..., "layer_information": {...}}`) keyed by the
+    bare inference id. Pass `path=None` to keep the database in memory.
+    """
+
+    def __init__(self, path: Union[str, Path, None] = None) -> None:
+        self.path = ":memory:" if path is None else str(path)
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # MasterDict serializes access with its own lock; rpyc calls arrive on many threads
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        if path is not None:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS inferences (
+                key TEXT PRIMARY KEY,
+                inference_id TEXT
+            );
+            CREATE TABLE IF NOT EXISTS layers (
+                key TEXT NOT NULL,
+                layer_id INTEGER NOT NULL,
+                PRIMARY KEY (key, layer_id)
+            );
+            CREATE TABLE IF NOT EXISTS layer_columns (
+                name TEXT PRIMARY KEY,
+                is_json INTEGER NOT NULL
+            );
+            """
+        )
+        self.conn.commit()
+        self.columns: dict[str, bool] = dict(
+            self.conn.execute("SELECT name, is_json FROM layer_columns")
+        )
+
+    def _ensure_columns(self, layer: dict[str, Any]) -> None:
+        for name, value in layer.items():
+            is_json = isinstance(value, (list, tuple, dict))
+            if name in self.columns and is_json and not self.columns[name]:
+                # the column was created from a None; it holds JSON from now on
+                self.conn.execute(
+                    "UPDATE layer_columns SET is_json = 1 WHERE name = ?", (name,)
+                )
+                self.columns[name] = True
+            if name == "layer_id" or name in self.columns:
+                continue
+            self.conn.execute(f'ALTER TABLE layers ADD COLUMN "{name}"')
+            self.conn.execute(
+                "INSERT INTO layer_columns (name, is_json) VALUES (?, ?)",
+                (name, int(is_json)),
+            )
+            self.columns[name] = is_json
+
+    def __contains__(self, key: str) -> bool:
+        return (
+            self.conn.execute(
+                "SELECT 1 FROM inferences WHERE key = ?", (key,)
+            ).fetchone()
+            is not None
+        )
+
+    def write(self, key: str, entry: dict, merge: bool = False) -> None:
+        """
+        Adds an entry. With `merge`, only layers that were completed by some node are written,
+        replacing whatever was stored for those layers before. Call `commit` to persist.
+        """
+        layers = entry["layer_information"].values()
+        if merge:
+            layers = [
+                layer for layer in layers if layer["completed_by_node"] is not None
+            ]
+        else:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO inferences (key, inference_id) VALUES (?, ?)",
+                (key, entry.get("inference_id")),
+            )
+        # layers reporting the same fields share one statement
+        statements: dict[tuple[str, ...], list[tuple]] = {}
+        for layer in layers:
+            names = tuple(name for name in layer if name != "layer_id")
+            if names not in statements:
+                self._ensure_columns(layer)
+                statements[names] = []
+            statements[names].append(
+                (key, layer["layer_id"], *[_to_sql(layer[name]) for name in names])
+            )
+        for names, rows in statements.items():
+            placeholders = ", ".join("?" * (len(names) + 2))
+            columns = ", ".join(f'"{name}"' for name in names)
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO layers (key, layer_id, {columns}) "
+                f"VALUES ({placeholders})",
+                rows,
+            )
+
+    def commit(self) -> None:
+        self.conn.commit()
+
+    def keys(self) -> list[str]:
+        return [
+            key
+            for (key,) in self.conn.execute("SELECT key FROM inferences ORDER BY rowid")
+        ]
+
+    def _layer_rows(self, where: str = "", params: tuple = ()) -> Iterator[tuple]:
+        names = list(self.columns)
+        columns = "".join(f', l."{name}"' for name in names)
+        return self.conn.execute(
+            f"SELECT i.key, i.inference_id, l.layer_id{columns} FROM inferences i "
+            f"JOIN layers l ON l.key = i.key {where} ORDER BY i.rowid, l.layer_id",
+            params,
+        )
+
+    def _layer_dict(self, row: tuple) -> dict[str, Any]:
+        layer = {"layer_id": row[2]}
+        for (name, is_json), value in zip(self.columns.items(), row[3:]):
+            layer[name] = json.loads(value) if is_json and value is not None else value
+        return layer
+
+    def get(self, key: str) -> Union[dict, None]:
+        entry = None
+        for row in self._layer_rows("WHERE i.key = ?", (key,)):
+            if entry is None:
+                entry = {"inference_id": row[1], "layer_information": {}}
+            entry["layer_information"][row[2]] = self._layer_dict(row)
+        if entry is None and key in self:
+            inference_id = self.conn.execute(
+                "SELECT inference_id FROM inferences WHERE key = ?", (key,)
+            ).fetchone()[0]
+            entry = {"inference_id": inference_id, "layer_information": {}}
+        return entry
+
+    def entries(self) -> Iterator[tuple[str, dict]]:
+        """Yields `(key, entry)` pairs in insertion order, holding one entry at a time."""
+        key, entry = None, None
+        for row in self._layer_rows():
+            if row[0] != key:
+                if entry is not None:
+                    yield key, entry
+                key = row[0]
+                entry = {"inference_id": row[1], "layer_information": {}}
+            entry["layer_information"][row[2]] = self._layer_dict(row)
+        if entry is not None:
+            yield key, entry
+
+    def layer_frame(self, key: Union[str, None] = None) -> pd.DataFrame:
+        """
+        Reads every stored layer (or only those of `key`) into one DataFrame with an
+        `inference_id` column holding the key, ordered by inference and then layer_id.
+        """
+        columns = "".join(f', l."{name}"' for name in self.columns)
+        where, params = ("WHERE l.key = ?", (key,)) if key is not None else ("", ())
+        frame = pd.read_sql_query(
+            f"SELECT l.key AS inference_id, l.layer_id{columns} FROM layers l "
+            f"JOIN inferences i ON i.key = l.key {where} ORDER BY i.rowid, l.layer_id",
+            self.conn,
+            params=params,
+        )
+        for name, is_json in self.columns.items():
+            if is_json:
+                # sizes repeat for every inference, so only decode each distinct value once
+                codes, uniques = pd.factorize(frame[name])
+                decoded = np.empty(len(uniques) + 1, dtype=object)
+                for i, value in enumerate(uniques):
+                    decoded[i] = json.loads(value)
+                frame[name] = decoded[codes]  # code -1 (NULL) picks the trailing None
+        return frame
+
+    def layer_times(
+        self, node_name: str, after: int = 0
+    ) -> tuple[int, list[int], list[float]]:
+        """
+        Mean `inference_time` per layer_id over the layers `node_name` completed since row
+        `after`. Returns the last row seen too, to pass as `after` next time.
+        """
+        if "completed_by_node" not in self.columns:
+            return after, [], []
+        rows = self.conn.execute(
+            "SELECT layer_id, AVG(inference_time), MAX(rowid) FROM layers "
+            "WHERE completed_by_node = ? AND rowid > ? GROUP BY layer_id",
+            (node_name, after),
+        ).fetchall()
+        last = max((row[2] for row in rows), default=after)
+        return last, [row[0] for row in rows], [row[1] for row in rows]
+
+    def close(self) -> None:
+        self.conn.close()
@@ -0,0 +1,66 @@
+"""
+Split-point sweeps from two baseline inferences.
+
+Measuring every split point of an L-layer network the direct way reruns the head of the network
+for each split, L^2 / 2 layer executions per input. A layer takes as long to run whether or not
+it was the first one a node ran, so the same measurements can be put together from two
+baselines: the whole network run on the local node, and the whole network run on the remote
+node. Split `s` is then the local baseline's layers `0..s-1` followed by the remote baseline's
+layers `s..L-1`, and sending the output of layer `s - 1`. That is 2L layer executions per input.
+
+The baselines are ordinary inferences whose keys follow the naming below; they double as the
+"everything local" and "everything remote" ends of the sweep. `derive_split_entries` builds the
+MasterDict entries for the splits in between, marking each layer with the sweep it came from.
+"""
+
+from __future__ import annotations
+
+import copy
+
+
+def local_key(sweep_id: str) -> str:
+    return f"{sweep_id}-local"
+
+
+def remote_key(sweep_id: str) -> str:
+    return f"{sweep_id}-remote"
+
+
+def split_key(sweep_id: str, split: int) -> str:
+    return f"{sweep_id}-split{split}"
+
+
+def sweep_ids(keys: list[str]) -> list[str]:
+    """The sweeps among `keys` whose local and remote baselines have both arrived."""
+    key_set = set(keys)
+    suffix = local_key("")
+    return [
+        key[: -len(suffix)]
+        for key in keys
+        if key.endswith(suffix) and remote_key(key[: -len(suffix)]) in key_set
+    ]
+
+
+def derive_split_entries(
+    sweep_id: str, local_entry: dict, remote_entry: dict
+) -> dict[str, dict]:
+    """
+    Builds an entry for every split strictly between the two baselines. Layer records are
+    copied from the baselines, so their timings, sizes and node names are the measured ones.
+    """
+    local_layers = local_entry["layer_information"]
+    remote_layers = remote_entry["layer_information"]
+    layer_count = max(list(local_layers) + list(remote_layers)) + 1
+    entries = {}
+    for split in range(1, layer_count):
+        key = split_key(sweep_id, split)
+        layer_information = {}
+        for layer_id in range(layer_count):
+            source = local_layers if layer_id < split else remote_layers
+            if layer_id not in source:
+                continue
+            layer = copy.copy(source[layer_id])
+            layer["sweep_id"] = sweep_id
+            layer_information[layer_id] = layer
+        entries[key] = {"inference_id": key, "layer_information": layer_information}
+    return entries
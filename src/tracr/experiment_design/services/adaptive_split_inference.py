@@ -0,0 +1,113 @@
+"""
+A client that decides where to split each inference from what it has measured so far, using the
+"online" partitioner. Rather than trying every split point like `ClientService`, it completes
+each input once, at the split currently predicted to give the fastest result, and keeps its
+estimates current from three sources:
+
+    * its own per-layer times and encoded activation sizes, as the model flushes its records
+    * the edge node's per-layer times, read from the observer's MasterDict every
+      `REFRESH_EVERY` inferences
+    * the size and duration of every task it sends to the edge node
+
+How quickly local estimates follow a change in load depends on the model's flush buffer size.
+"""
+
+import logging
+import uuid
+
+import numpy as np
+from rpyc.utils.classic import obtain
+
+import src.tracr.experiment_design.tasks.tasks as tasks
+from src.tracr.experiment_design.partitioners.online_partitioner import (
+    LinkEstimate,
+    OnlinePartitioner,
+    split_bytes_from_layer_table,
+)
+from src.tracr.experiment_design.records.record_store import RecordBlock
+from src.tracr.experiment_design.services.basic_split_inference import ClientService
+
+
+logger = logging.getLogger("tracr_logger")
+
+
+class AdaptiveClientService(ClientService):
+    """
+    Splits every input between this node and `DOWNSTREAM_PARTNER` wherever the online
+    partitioner predicts the lowest time to result.
+    """
+
+    # weight of the newest measurement in the moving averages
+    ESTIMATE_ALPHA: float = 0.2
+    # fraction of inferences split at a random point to keep every estimate fresh
+    EXPLORE: float = 0.05
+    REFRESH_EVERY: int = 10
+    # starting guesses for the link, replaced as soon as tasks have been sent
+    LINK_MB_PER_S: float = 4.0
+    LINK_RTT_NS: float = 0.0
+
+    partitioner: OnlinePartitioner
+
+    def prepare_model(self):
+        super().prepare_model()
+        self.partitioner = OnlinePartitioner(
+            split_bytes_from_layer_table(self.model.layer_table),
+            alpha=self.ESTIMATE_ALPHA,
+            explore=self.EXPLORE,
+            link=LinkEstimate(self.LINK_MB_PER_S, self.LINK_RTT_NS),
+        )
+        self.remote_rows_seen = 0
+        self.decisions = 0
+        self.model.flush_listeners.append(self._observe_local_layers)
+        self.send_listeners.append(self._observe_send)
+
+    def _observe_local_layers(self, block: RecordBlock):
+        rows = block.rows
+        self.partitioner.observe_layers(
+            block.inference_time[:rows], block.completed[:rows]
+        )
+        self.partitioner.observe_encoding(block.encoded_bytes[:rows])
+
+    def _observe_send(self, node_name: str, nbytes: int, elapsed_ns: int):
+        if node_name == self.DOWNSTREAM_PARTNER:
+            self.partitioner.observe_send(nbytes, elapsed_ns)
+
+    def _refresh_remote_layers(self):
+        observer_svc = self.get_connection("OBSERVER").root
+        assert observer_svc is not None
+        last, layer_ids, means = obtain(
+            observer_svc.get_master_dict().layer_times(
+                self.DOWNSTREAM_PARTNER, self.remote_rows_seen
+            )
+        )
+        self.remote_rows_seen = last
+        if not layer_ids:
+            return
+        times = np.zeros(self.partitioner.layer_count)
+        completed = np.zeros(self.partitioner.layer_count, dtype=bool)
+        times[layer_ids] = means
+        completed[layer_ids] = True
+        self.partitioner.observe_layers(times, completed, remote=True)
+
+    def inference_sequence_per_input(self, task: tasks.SingleInputInferenceTask):
+        assert self.model is not None
+        if self.decisions % self.REFRESH_EVERY == 0:
+            self._refresh_remote_layers()
+        self.decisions += 1
+
+        split = self.partitioner()
+        inference_id = str(uuid.uuid4())
+        if split >= self.model.layer_count:
+            logger.info("Completing full inference without help.")
+            self.model(task.input, inference_id)
+            return
+        if split == 0:
+            logger.info(f"Sending full job to {self.DOWNSTREAM_PARTNER}")
+            out = task.input
+        else:
+            logger.info(f"running split inference from layers 0 to {split}")
+            out = self.model(task.input, inference_id, start=0, end=split)
+        downstream_task = tasks.SimpleInferenceTask(
+            self.node_name, out, inference_id=inference_id, start_layer=split
+        )
+        self.enqueue_task(self.DOWNSTREAM_PARTNER, downstream_task)
@@ -6,21 +6,32 @@ import uuid
 import rpyc
 import rpyc.core.protocol
 from pandas import DataFrame
-from rpyc.utils.classic import obtain
-from rpyc.lib.compat import pickle
 
 # import torch.nn as nn
+from pathlib import Path
 from queue import PriorityQueue
 from importlib import import_module
 from rpyc.core.protocol import Connection, PingError
-from time import sleep
+from time import monotonic, perf_counter_ns, sleep
 from typing import Callable
 from rpyc.utils.factory import DiscoveryError
 
 import src.tracr.experiment_design.tasks.tasks as tasks
-from src.tracr.experiment_design.models.model_hooked import WrappedModel
+import src.tracr.experiment_design.tasks.transport as transport
+from src.tracr.experiment_design.models.model_hooked import (
+    NotDict,
+    WrappedModel,
+    batch_size_of,
+    collate_inputs,
+)
 from src.tracr.experiment_design.datasets.dataset import BaseDataset
+from src.tracr.experiment_design.datasets.streaming import DatasetStream, open_source
 from src.tracr.experiment_design.records.master_dict import MasterDict
+from src.tracr.experiment_design.services.batching import MicroBatcher
+from src.tracr.experiment_design.services.completion_cache import CompletionCache
+from src.tracr.experiment_design.services.inference_pool import InferencePool
+from src.tracr.experiment_design.services.ingest import TaskIngest
+from src.tracr.experiment_design.services.send_queue import SendQueue
 
 
 logger = logging.getLogger("tracr_logger")
@@ -58,17 +69,45 @@ class NodeService(rpyc.Service):
 
     active_connections: dict[str, Connection | None]
     node_name: str
-    status: str
     partners: list[str]
     classname: str = "NodeService"
     threadlock: threading.RLock = threading.RLock()
-    inbox: PriorityQueue[tasks.Task] = PriorityQueue()
+    inbox: PriorityQueue[tasks.Task]
+    ingest: TaskIngest
+
+    # received tasks wait in a backlog of up to INGEST_BACKLOG until one of INGEST_WORKERS
+    # threads puts them in the inbox, which holds at most INBOX_SIZE tasks (0 for no limit).
+    # Senders are held up while both are full; with ACCEPT_TIMEOUT_S set, inference tasks
+    # that wait that long are dropped instead (see services.ingest). Participants hold the
+    # tasks delegated to them before they run outside of these bounds until they start
+    INBOX_SIZE: int = 256
+    INGEST_BACKLOG: int = 64
+    INGEST_WORKERS: int = 2
+    ACCEPT_TIMEOUT_S: float | None = None
+
+    # nodes that open connections to partners which call back into them (see `watch_status`)
+    # serve those connections on a BgServingThread, as nothing else reads from them otherwise
+    SERVE_OUTGOING_CONNECTIONS: bool = False
 
     def __init__(self):
         super().__init__()
-        self.status = "initializing"
         self.node_name = self.ALIASES[0].upper().strip()
+        # called with (node_name, status) whenever the status changes
+        self.status_watchers: list[Callable[[str, str], None]] = []
+        self.status_lock = threading.Lock()
+        self.status = "initializing"
         self.active_connections = {}
+        self.serving_threads: dict[str, rpyc.BgServingThread] = {}
+        self.inbox = PriorityQueue(self.INBOX_SIZE)
+        self.ingest = TaskIngest(
+            self.inbox,
+            workers=self.INGEST_WORKERS,
+            backlog=self.INGEST_BACKLOG,
+            accept_timeout_s=self.ACCEPT_TIMEOUT_S,
+        )
+        # called with (node_name, bytes, ns) after every task this node sends; the time leaves
+        # out however long the receiver kept the task waiting for room in its backlog
+        self.send_listeners: list[Callable[[str, int, int], None]] = []
 
     def on_connect(self, conn: Connection):
         with self.threadlock:
@@ -109,6 +148,12 @@ class NodeService(rpyc.Service):
                 node_name, service=self, config=rpyc.core.protocol.DEFAULT_CONFIG  # type: ignore
             )
             self.active_connections[node_name] = conn
+            if self.SERVE_OUTGOING_CONNECTIONS:
+                # the callback ends the thread quietly once the connection is closed
+                self.serving_threads[node_name] = rpyc.BgServingThread(
+                    conn,
+                    callback=lambda: logger.debug(f"stopped serving {node_name}"),
+                )
             logger.info(f"new connection to {node_name} established and saved.")
             result = self.active_connections[node_name]
             assert result is not None
@@ -139,32 +184,50 @@ class NodeService(rpyc.Service):
 
     def send_task(self, node_name: str, task: tasks.Task):
         logger.info(f"sending {task.task_type} to {node_name}")
-        pickled_task = bytes(pickle.dumps(task))
+        header, buffers = transport.dumps(task)
         conn = self.get_connection(node_name)
         assert conn.root is not None
+        send_start = perf_counter_ns()
         try:
-            conn.root.accept_task(pickled_task)
+            _, waited = conn.root.accept_task_timed(header, buffers)
         except TimeoutError:
             conn.close()
             self.active_connections[node_name] = None
             conn = self.get_connection(node_name)
             assert conn.root is not None
-            conn.root.accept_task(pickled_task)
+            send_start = perf_counter_ns()
+            _, waited = conn.root.accept_task_timed(header, buffers)
+        if self.send_listeners:
+            elapsed = max(0, perf_counter_ns() - send_start - waited)
+            nbytes = transport.payload_size(header, buffers)
+            for listener in self.send_listeners:
+                listener(node_name, nbytes, elapsed)
 
     @rpyc.exposed
-    def accept_task(self, pickled_task: bytes):
-        logger.debug("unpickling received task")
-        task = pickle.loads(pickled_task)
-        logger.debug(f"successfully unpacked {task.task_type}")
-        accept_task_thd = threading.Thread(
-            target=self._accept_task, args=[task], daemon=True
-        )
-        accept_task_thd.start()
+    def accept_task(self, pickled_task: bytes, buffers: tuple[bytes, ...] = ()) -> bool:
+        """
+        Receives a task serialized by `transport.dumps`: `pickled_task` is the header and
+        `buffers` holds the raw data of any tensors the task carries. It is unpickled and put
+        in the inbox by the ingest workers; this only blocks while their backlog is full.
+        Returns False if the task was dropped.
+        """
+        logger.debug("received task; handing it to the ingest workers")
+        return self.ingest.submit(pickled_task, buffers)
+
+    @rpyc.exposed
+    def accept_task_timed(
+        self, pickled_task: bytes, buffers: tuple[bytes, ...] = ()
+    ) -> tuple[bool, int]:
+        """
+        Like `accept_task`, but also returns the ns this node spent on the task before
+        returning, so the sender can tell the transfer apart from waiting for room here.
+        """
+        logger.debug("received task; handing it to the ingest workers")
+        return self.ingest.submit_timed(pickled_task, buffers)
 
-    def _accept_task(self, task: tasks.Task):
-        logger.info(f"saving {task.task_type} to inbox in thread")
-        self.inbox.put(task)
-        logger.info(f"{task.task_type} saved to inbox successfully")
+    @rpyc.exposed
+    def get_ingest_stats(self) -> dict:
+        return self.ingest.stats()
 
     @rpyc.exposed
     def get_ready(self):
@@ -183,6 +246,40 @@ class NodeService(rpyc.Service):
     def _run(self):
         raise NotImplementedError
 
+    @property
+    def status(self) -> str:
+        return self._status
+
+    @status.setter
+    def status(self, status: str):
+        with self.status_lock:
+            self._status = status
+            self.status_watchers = [
+                watcher for watcher in self.status_watchers if self._notify(watcher)
+            ]
+
+    def _notify(self, watcher: Callable[[str, str], None]) -> bool:
+        try:
+            watcher(self.node_name, self._status)
+            return True
+        except EOFError:
+            logger.warning(f"dropped a status watcher of {self.node_name}; it hung up")
+            return False
+
+    @rpyc.exposed
+    def watch_status(self, callback: Callable[[str, str], None]):
+        """
+        Calls `callback(node_name, status)` with the current status, then again on every
+        change, so callers can wait for a status instead of polling `get_status`. Remote
+        callbacks are called asynchronously and in order; the caller has to serve the
+        connection (with a BgServingThread, for instance) to receive them.
+        """
+        if isinstance(callback, rpyc.BaseNetref):
+            callback = rpyc.async_(callback)
+        with self.status_lock:
+            if self._notify(callback):
+                self.status_watchers.append(callback)
+
     @rpyc.exposed
     def get_status(self) -> str:
         logger.debug(f"get_status exposed method called; returning '{self.status}'")
@@ -206,13 +303,31 @@ class ObserverService(NodeService):
 
     master_dict: MasterDict
     playbook: dict[str, list[tasks.Task]]
+    partner_status: dict[str, str]
     classname: str = "ObserverService"
 
-    def __init__(self, partners: list[str], playbook: dict[str, list[tasks.Task]]):
+    # partners push their status changes back over the observer's connections to them; they
+    # are only polled if nothing has been heard for STATUS_POLL_INTERVAL_S, in case a
+    # notification was lost. Partners must all be ready within READY_TIMEOUT_S
+    SERVE_OUTGOING_CONNECTIONS: bool = True
+    STATUS_POLL_INTERVAL_S: float = 15.0
+    READY_TIMEOUT_S: float = 160.0
+
+    def __init__(
+        self,
+        partners: list[str],
+        playbook: dict[str, list[tasks.Task]],
+        results_path: str | Path | None = None,
+        source_node: str | None = None,
+    ):
         super().__init__()
         self.partners = partners
-        self.master_dict = MasterDict()
+        # results are written through to this file as participants flush them; inputs start
+        # out on `source_node`, so an inference it offloads entirely still counts a hop
+        self.master_dict = MasterDict(results_path, source_node=source_node)
         self.playbook = playbook
+        self.partner_status = {}
+        self.partner_status_changed = threading.Condition()
         atexit.register(self.close_participants)
         logger.info("Finished initializing ObserverService object.")
 
@@ -227,31 +342,53 @@ class ObserverService(NodeService):
         for partner in self.partners:
             node = self.get_connection(partner).root
             assert node is not None
+            node.watch_status(self.on_partner_status)
             node.get_ready()
 
-        success = False
-        n_attempts = 10
-        while n_attempts > 0:
-            if all([(self.get_connection(p).root.get_status() == "ready") for p in self.partners]):  # type: ignore
-                success = True
-                logger.info("All participants are ready!")
-                break
-            n_attempts -= 1
-            sleep(16)
-
-        if not success:
-            straglers = [
-                p
-                for p in self.partners
-                if self.get_connection(p).root.get_status() != "ready"  # type: ignore
-            ]
+        straglers = self.wait_for_partners("ready", self.READY_TIMEOUT_S)
+        if straglers:
             raise AwaitParticipantException(
                 f"Observer had to wait too long for nodes {straglers}"
             )
+        logger.info("All participants are ready!")
 
         self.delegate()
         self.status = "ready"
 
+    def on_partner_status(self, node_name: str, status: str):
+        """Called by partners (see `NodeService.watch_status`) whenever their status changes."""
+        logger.debug(f"{node_name} is now '{status}'")
+        with self.partner_status_changed:
+            self.partner_status[node_name] = status
+            self.partner_status_changed.notify_all()
+
+    def _partners_not(self, status: str) -> list[str]:
+        return [p for p in self.partners if self.partner_status.get(p) != status]
+
+    def wait_for_partners(self, status: str, timeout: float | None = None) -> list[str]:
+        """
+        Blocks until every partner has reported `status`, or until `timeout` seconds have
+        passed. Returns the partners that haven't.
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        while True:
+            interval = self.STATUS_POLL_INTERVAL_S
+            if deadline is not None:
+                interval = max(0.0, min(interval, deadline - monotonic()))
+            with self.partner_status_changed:
+                self.partner_status_changed.wait_for(
+                    lambda: not self._partners_not(status), interval
+                )
+                waiting = self._partners_not(status)
+            if not waiting:
+                return []
+            # nothing heard for a while: ask directly, in case a notification was lost
+            for p in waiting:
+                self.on_partner_status(p, self.get_connection(p).root.get_status())  # type: ignore
+            if deadline is not None and monotonic() >= deadline:
+                with self.partner_status_changed:
+                    return self._partners_not(status)
+
     @rpyc.exposed
     def get_master_dict(self, as_dataframe: bool = False) -> MasterDict | DataFrame:
         result = (
@@ -270,7 +407,23 @@ class ObserverService(NodeService):
         dataset = getattr(module, dataset_instance)
         return dataset
 
-    def _run(self, check_node_status_interval: int = 15):
+    @rpyc.exposed
+    def get_dataset_length(self, dataset_module: str, dataset_instance: str) -> int:
+        return len(self.get_dataset_reference(dataset_module, dataset_instance))
+
+    @rpyc.exposed
+    def get_dataset_chunk(
+        self, dataset_module: str, dataset_instance: str, start: int, stop: int
+    ) -> tuple[bytes, tuple[bytes, ...]]:
+        """
+        Returns elements `start` to `stop` of a dataset in one call, serialized by
+        `transport.dumps` so their tensors travel as raw buffers.
+        """
+        dataset = self.get_dataset_reference(dataset_module, dataset_instance)
+        stop = min(stop, len(dataset))
+        return transport.dumps([dataset[idx] for idx in range(start, stop)])
+
+    def _run(self):
         assert self.status == "ready"
         for p in self.partners:
             pnode = self.get_connection(p)
@@ -278,15 +431,16 @@ class ObserverService(NodeService):
             pnode.root.run()
         self.status = "waiting"
 
-        while True:
-            if all([(self.get_connection(p).root.get_status() == "finished") for p in self.partners]):  # type: ignore
-                logger.info("All nodes have finished!")
-                break
-            sleep(check_node_status_interval)
+        self.wait_for_partners("finished")
+        logger.info("All nodes have finished!")
 
         self.on_finish()
 
     def on_finish(self):
+        # every participant has flushed by now, so each sweep has both of its baselines
+        derived = self.master_dict.expand_split_sweeps()
+        if derived:
+            logger.info(f"derived {derived} split points from split sweep baselines")
         self.status = "finished"
 
     def close_participants(self):
@@ -313,7 +467,42 @@ class ParticipantService(NodeService):
 
     ALIASES = ["PARTICIPANT"]
 
+    # queued SimpleInferenceTasks resuming at the same layer are completed together in batches
+    # of up to MAX_BATCH_SIZE, waiting at most MAX_BATCH_WAIT_S for a batch to fill up
+    MAX_BATCH_SIZE: int = 1
+    MAX_BATCH_WAIT_S: float = 0.005
+
+    # infer_dataset keeps this many chunks of the dataset in flight ahead of the model
+    DATASET_CHUNK_SIZE: int = 8
+    DATASET_PREFETCH_CHUNKS: int = 4
+    DATASET_WORKERS: int = 2
+
+    # tasks passed on with `enqueue_task` go through a background SendQueue of this size, so
+    # the node can start on its next input while the last one is in transit; 0 sends inline
+    SEND_QUEUE_SIZE: int = 0
+
+    # completing passes whose model, layers and input match one of the last
+    # COMPLETION_CACHE_SIZE passes reuse its output instead of running the model; 0 disables it
+    COMPLETION_CACHE_SIZE: int = 0
+
+    # inference tasks run on this many worker threads, all sharing the node's model (see
+    # services.inference_pool); 1 runs them on the run loop itself. TORCH_THREADS sets
+    # PyTorch's intra-op thread count, which is process-wide and so shared by all the workers;
+    # 0 keeps PyTorch's default
+    INFERENCE_WORKERS: int = 1
+    TORCH_THREADS: int = 0
+    # the tasks handed to the inference workers; anything else runs on the run loop
+    WORKER_TASKS: tuple[type, ...] = (
+        tasks.SimpleInferenceTask,
+        tasks.PipelineInferenceTask,
+        tasks.SingleInputInferenceTask,
+    )
+
     model: WrappedModel
+    workers: InferencePool | None = None
+    batcher: MicroBatcher
+    send_queue: SendQueue | None
+    completion_cache: CompletionCache | None
     task_map: dict[type, Callable]
     done_event: threading.Event | None
     high_priority_lock: threading.Condition = threading.Condition()
@@ -327,10 +516,26 @@ class ParticipantService(NodeService):
         # self.ModelCls = ModelCls
         self.task_map = {
             tasks.SimpleInferenceTask: self.simple_inference,
+            tasks.PipelineInferenceTask: self.simple_inference,
             tasks.SingleInputInferenceTask: self.inference_sequence_per_input,
             tasks.InferOverDatasetTask: self.infer_dataset,
             tasks.FinishSignalTask: self.on_finish,
         }
+        self.batcher = MicroBatcher(
+            self.inbox, self.MAX_BATCH_SIZE, self.MAX_BATCH_WAIT_S
+        )
+        self.send_queue = (
+            SendQueue(self.send_task, self.SEND_QUEUE_SIZE)
+            if self.SEND_QUEUE_SIZE > 0
+            else None
+        )
+        self.completion_cache = (
+            CompletionCache(self.COMPLETION_CACHE_SIZE)
+            if self.COMPLETION_CACHE_SIZE > 0
+            else None
+        )
+        # the observer delegates the whole playbook before `run`, so nothing drains the inbox yet
+        self.ingest.hold()
 
     @rpyc.exposed
     def prepare_model(self):
@@ -347,18 +552,45 @@ class ParticipantService(NodeService):
         #         node_name=self.node_name
         #     )
 
+    def start_workers(self):
+        """Starts the inference workers if the node is configured for more than one."""
+        if self.INFERENCE_WORKERS <= 1:
+            return
+        # passes keep their state in per-thread contexts, so every worker runs self.model
+        self.workers = InferencePool(
+            self.INFERENCE_WORKERS, torch_threads=self.TORCH_THREADS
+        )
+
     def _run(self):
         assert self.status == "ready"
         self.status = "running"
+        self.ingest.release()
         if self.inbox is not None:
             while self.status == "running":
-                current_task = self.inbox.get()
-                self.process(current_task)
+                current_task = self.batcher.next_task()
+                batch = self.batcher.collect(current_task)
+                if len(batch) > 1:
+                    self.dispatch(self.batched_simple_inference, batch)
+                elif type(current_task) in self.WORKER_TASKS:
+                    self.dispatch(self.process, current_task)
+                else:
+                    # anything else (the finish signal in particular) waits for the workers
+                    if self.workers is not None:
+                        self.workers.join()
+                    self.process(current_task)
+
+    def dispatch(self, fn: Callable, *args):
+        """Runs `fn` on the next free inference worker, or right here if there are none."""
+        if self.workers is None:
+            fn(*args)
+        else:
+            self.workers.submit(fn, *args)
 
     def _get_ready(self):
         logger.info("Getting ready.")
         self.handshake()
         self.prepare_model()
+        self.start_workers()
         self.status = "ready"
 
     @rpyc.exposed
@@ -386,12 +618,34 @@ class ParticipantService(NodeService):
         corresponding_method = self.task_map[task_class]
         corresponding_method(task)
 
+    def enqueue_task(self, node_name: str, task: tasks.Task):
+        """
+        Like `send_task`, but returns as soon as the task is queued if the node has a send
+        queue. Tasks queued here are sent in order, so a finish signal queued after a node's
+        last inference still arrives after it.
+        """
+        if self.send_queue is None:
+            self.send_task(node_name, task)
+        else:
+            self.send_queue.put(node_name, task)
+
     def on_finish(self, task):
         assert self.inbox.empty()
+        if self.send_queue is not None:
+            self.send_queue.join()
+        if self.completion_cache is not None:
+            logger.info(f"completion cache: {self.completion_cache.stats()}")
+        logger.info(f"task ingest: {self.ingest.stats()}")
         self.model.update_master_dict()
         self.status = "finished"
 
-    def simple_inference(self, task: tasks.SimpleInferenceTask):
+    def simple_inference(
+        self, task: tasks.SimpleInferenceTask | tasks.PipelineInferenceTask
+    ):
+        """
+        Completes the layers the task assigns to this node. A PipelineInferenceTask is run the
+        same way; its start and end layers are those of its current stage.
+        """
         assert self.model is not None
         inference_id = (
             task.inference_id if task.inference_id is not None else str(uuid.uuid4())
@@ -399,13 +653,159 @@ class ParticipantService(NodeService):
         logger.info(
             f"Running simple inference on layers {str(task.start_layer)} through {str(task.end_layer)}"
         )
+        cache_key = None
+        if self.completion_cache is not None:
+            lookup_start = perf_counter_ns()
+            cache_key = self._completion_key(task)
+            if self._complete_from_cache(task, inference_id, cache_key, lookup_start):
+                return
+        self.model.note_send_stats(task.send_stats)
         out = self.model(
             task.input,
             inference_id=inference_id,
             start=task.start_layer,
             end=task.end_layer,
         )
+        if cache_key is not None:
+            self.completion_cache.put(cache_key, out)  # type: ignore
+        self.forward_downstream(task, out, inference_id)
+
+    def _completion_key(
+        self, task: tasks.SimpleInferenceTask | tasks.PipelineInferenceTask
+    ) -> tuple:
+        assert self.completion_cache is not None
+        return self.completion_cache.key(
+            self.model.model_name, task.start_layer, task.end_layer, task.input
+        )
 
+    def _complete_from_cache(
+        self,
+        task: tasks.SimpleInferenceTask | tasks.PipelineInferenceTask,
+        inference_id: str | list[str],
+        key: tuple,
+        lookup_start: int,
+    ) -> bool:
+        """
+        Records and forwards the cached output for `key`, if there is one. A miss is noted for
+        the pass that will compute the output instead.
+        """
+        assert self.completion_cache is not None
+        hit, out = self.completion_cache.get(key)
+        lookup_time = perf_counter_ns() - lookup_start
+        if not hit:
+            self.model.note_cache_lookup(False, lookup_time)
+            return False
+        logger.info(f"completion cache hit for {inference_id}")
+        self._forward_cached(task, inference_id, out, lookup_time)
+        return True
+
+    def _forward_cached(
+        self,
+        task: tasks.SimpleInferenceTask | tasks.PipelineInferenceTask,
+        inference_id: str | list[str],
+        out,
+        lookup_time: int,
+    ):
+        """Records a task as completed without a pass of its own and forwards `out`."""
+        batch_size = (
+            len(inference_id)
+            if isinstance(inference_id, list)
+            else batch_size_of(task.input)
+        )
+        self.model.record_cached_pass(
+            inference_id,
+            task.start_layer,
+            task.end_layer,
+            batch_size,
+            lookup_time,
+            task.send_stats,
+        )
+        self.forward_downstream(task, out, inference_id)
+
+    def batched_simple_inference(
+        self, batch: list[tasks.SimpleInferenceTask] | list[tasks.PipelineInferenceTask]
+    ):
+        """
+        Completes several compatible SimpleInferenceTasks (as grouped by `self.batcher`) in a
+        single forward pass, then hands each one its share of the result.
+        """
+        assert self.model is not None
+        first = batch[0]
+        logger.info(
+            f"Running batched inference of {len(batch)} tasks on layers "
+            f"{str(first.start_layer)} through {str(first.end_layer)}"
+        )
+        task_ids, all_ids, sizes = [], [], []
+        inputs = []
+        cache_keys = []
+        repeats = []
+        computed = {}
+        if self.completion_cache is not None:
+            # answer repeated tasks from the cache and batch up the rest, computing tasks that
+            # repeat one earlier in the same batch only once
+            misses = []
+            for task in batch:
+                if task.inference_id is None:
+                    task.inference_id = str(uuid.uuid4())
+                lookup_start = perf_counter_ns()
+                key = self._completion_key(task)
+                if key in cache_keys:
+                    repeats.append((task, key))
+                elif not self._complete_from_cache(
+                    task, task.inference_id, key, lookup_start
+                ):
+                    misses.append(task)
+                    cache_keys.append(key)
+            if not misses:
+                return
+            batch, first = misses, misses[0]
+        for task in batch:
+            self.model.note_send_stats(task.send_stats)
+            x = task.input
+            if isinstance(x, NotDict):
+                # codecs are undone per task since encoded tensors can't be concatenated
+                x = self.model.decode_input(x)
+            inputs.append(x)
+            sizes.append(batch_size_of(x))
+            ids = (
+                task.inference_id
+                if task.inference_id is not None
+                else str(uuid.uuid4())
+            )
+            task_ids.append(ids)
+            all_ids.extend(ids if isinstance(ids, list) else [ids])
+
+        out = self.model(
+            collate_inputs(inputs),
+            inference_id=all_ids,
+            start=first.start_layer,
+            end=first.end_layer,
+            split_sizes=sizes,
+        )
+        for i, (task, ids, task_out) in enumerate(zip(batch, task_ids, out)):
+            if cache_keys:
+                self.completion_cache.put(cache_keys[i], task_out)  # type: ignore
+                computed[cache_keys[i]] = task_out
+            self.forward_downstream(task, task_out, ids)
+        # served from this batch's own outputs, which the cache may already have evicted
+        for task, key in repeats:
+            self.completion_cache.note_hit()  # type: ignore
+            self._forward_cached(task, task.inference_id, computed[key], 0)  # type: ignore
+
+    def forward_downstream(
+        self,
+        task: tasks.SimpleInferenceTask | tasks.PipelineInferenceTask,
+        out,
+        inference_id: str | list[str],
+    ):
+        """
+        Sends the result of a partial inference on to the node that will continue it, if any.
+        """
+        if isinstance(task, tasks.PipelineInferenceTask):
+            if task.downstream_node is not None:
+                next_task = task.next_stage(self.node_name, out, inference_id)
+                self.enqueue_task(task.downstream_node, next_task)
+            return
         if task.downstream_node is not None and isinstance(task.end_layer, int):
             downstream_task = tasks.SimpleInferenceTask(
                 self.node_name,
@@ -413,7 +813,7 @@ class ParticipantService(NodeService):
                 inference_id=inference_id,
                 start_layer=task.end_layer,
             )
-            self.send_task(task.downstream_node, downstream_task)
+            self.enqueue_task(task.downstream_node, downstream_task)
 
     def inference_sequence_per_input(self, task: tasks.SingleInputInferenceTask):
         """
@@ -428,12 +828,18 @@ class ParticipantService(NodeService):
     def infer_dataset(self, task: tasks.InferOverDatasetTask):
         """
         Run the self.inference_sequence_per_input method for each element in the dataset.
+        Elements are prefetched in the background (see datasets.streaming), from a local copy
+        of the dataset if this node has one.
         """
         dataset_module, dataset_instance = task.dataset_module, task.dataset_instance
         observer_svc = self.get_connection("OBSERVER").root
         assert observer_svc is not None
-        dataset = observer_svc.get_dataset_reference(dataset_module, dataset_instance)
-        for idx in range(len(dataset)):
-            input, _ = obtain(dataset[idx])
+        stream = DatasetStream(
+            open_source(observer_svc, dataset_module, dataset_instance),
+            chunk_size=self.DATASET_CHUNK_SIZE,
+            prefetch=self.DATASET_PREFETCH_CHUNKS,
+            workers=self.DATASET_WORKERS,
+        )
+        for input, _ in stream:
             subtask = tasks.SingleInputInferenceTask(input, from_node="SELF")
-            self.inference_sequence_per_input(subtask)
+            self.dispatch(self.inference_sequence_per_input, subtask)
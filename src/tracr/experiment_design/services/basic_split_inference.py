@@ -12,6 +12,7 @@ import uuid
 
 from src.tracr.experiment_design.services.base import ParticipantService
 import src.tracr.experiment_design.tasks.tasks as tasks
+from src.tracr.experiment_design.records import split_sweep
 
 
 logger = logging.getLogger("tracr_logger")
@@ -40,10 +41,20 @@ class ClientService(ParticipantService):
     DOWNSTREAM_PARTNER = "EDGE1"
     ALIASES: list[str] = ["CLIENT1", "PARTICIPANT"]
 
+    # the head of the next inference runs while the last one's intermediary data is sent
+    SEND_QUEUE_SIZE: int = 4
+
+    # "rerun" runs every split point for real; "cached" runs the network once here and once on
+    # the edge, and the observer derives the split points in between (see records.split_sweep)
+    SWEEP_MODE: str = "rerun"
+
     partners: list[str] = ["OBSERVER", "EDGE1"]
 
     def inference_sequence_per_input(self, task: tasks.SingleInputInferenceTask):
         assert self.model is not None
+        if self.SWEEP_MODE == "cached":
+            self.cached_split_sweep(task)
+            return
         input = task.input
         splittable_layer_count = self.model.splittable_layer_count
 
@@ -63,7 +74,7 @@ class ClientService(ParticipantService):
                 downstream_task = tasks.SimpleInferenceTask(
                     self.node_name, input, inference_id=inference_id, start_layer=0
                 )
-                self.send_task(self.DOWNSTREAM_PARTNER, downstream_task)
+                self.enqueue_task(self.DOWNSTREAM_PARTNER, downstream_task)
                 current_split_layer += 1
                 continue
 
@@ -73,12 +84,29 @@ class ClientService(ParticipantService):
                 downstream_task = tasks.SimpleInferenceTask(
                     self.node_name, out, inference_id=inference_id, start_layer=end
                 )
-                self.send_task(self.DOWNSTREAM_PARTNER, downstream_task)
+                self.enqueue_task(self.DOWNSTREAM_PARTNER, downstream_task)
                 current_split_layer += 1
 
+    def cached_split_sweep(self, task: tasks.SingleInputInferenceTask):
+        """
+        Runs the sweep's two baselines for this input: the whole network here, and the whole
+        network on the edge. Every split point in between is put together from their records.
+        """
+        sweep_id = str(uuid.uuid4())
+        logger.info("Completing full inference without help.")
+        self.model(task.input, split_sweep.local_key(sweep_id))
+        logger.info(f"Sending full job to {self.DOWNSTREAM_PARTNER}")
+        downstream_task = tasks.SimpleInferenceTask(
+            self.node_name,
+            task.input,
+            inference_id=split_sweep.remote_key(sweep_id),
+            start_layer=0,
+        )
+        self.enqueue_task(self.DOWNSTREAM_PARTNER, downstream_task)
+
     def on_finish(self, _):
         downstream_finish_signal = tasks.FinishSignalTask(self.node_name)
-        self.send_task(self.DOWNSTREAM_PARTNER, downstream_finish_signal)
+        self.enqueue_task(self.DOWNSTREAM_PARTNER, downstream_finish_signal)
         super().on_finish(_)
 
 
@@ -88,8 +116,14 @@ class EdgeService(ParticipantService):
     of the `SimpleInferenceTask` class, which is already defined in the ParticipantService class.
     The edge node has no "decisions" to make; the client gives it all the parameters necessary to
     perform its inference. All we need to do is overwrite the list of partners it will handshake
-    with during setup.
+    with during setup, and (optionally) let it batch up tasks that arrive close together.
     """
 
     ALIASES: list[str] = ["EDGE1", "PARTICIPANT"]
     partners: list[str] = ["OBSERVER", "CLIENT1"]
+
+    # raise MAX_BATCH_SIZE to let partial inferences from many clients that resume at the same
+    # layer share a forward pass; every inference in a batch is then recorded with the whole
+    # batch's layer times (see the `batch_size` column), so it's off unless asked for
+    MAX_BATCH_SIZE: int = 1
+    MAX_BATCH_WAIT_S: float = 0.005
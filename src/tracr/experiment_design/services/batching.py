@@ -0,0 +1,118 @@
+"""
+Micro-batching for participant inboxes. When several clients hand an edge node partial
+inferences that resume at the same layer, running them one at a time leaves most of the node's
+cores idle. The `MicroBatcher` sits between the inbox and the node's run loop: whenever it hands
+out a `SimpleInferenceTask`, it first waits a short, bounded amount of time for compatible tasks
+to arrive so they can be completed together in one batched forward pass.
+"""
+
+from __future__ import annotations
+
+import heapq
+import logging
+from queue import Empty, PriorityQueue
+from time import monotonic
+
+import src.tracr.experiment_design.tasks.tasks as tasks
+from src.tracr.experiment_design.models.model_hooked import batch_size_of
+
+
+logger = logging.getLogger("tracr_logger")
+
+
+class MicroBatcher:
+    """
+    Pulls tasks off an inbox and coalesces queued `SimpleInferenceTask`s (or pipeline stages)
+    that share a `start_layer` (and `end_layer`/`downstream_node`) into batches of at most
+    `max_batch_size`.
+    Collecting a batch never waits longer than `max_wait_s` past the arrival of its first task.
+
+    Tasks pulled off the inbox that don't fit the batch being collected are held in a local
+    heap rather than put back, so the run loop never blocks on its own inbox; they are handed
+    out again in priority order.
+    """
+
+    def __init__(
+        self, inbox: PriorityQueue, max_batch_size: int = 1, max_wait_s: float = 0.0
+    ):
+        self.inbox = inbox
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_s = max_wait_s
+        self.deferred: list[tasks.Task] = []
+
+    @staticmethod
+    def batchable(task: tasks.Task) -> bool:
+        """
+        Only single-sample inferences (or batches that already carry one id per sample) can be
+        merged without losing track of which result belongs to which inference.
+        """
+        if type(task) not in (tasks.SimpleInferenceTask, tasks.PipelineInferenceTask):
+            return False
+        size = batch_size_of(task.input)
+        if isinstance(task.inference_id, list):
+            return len(task.inference_id) == size
+        return size == 1
+
+    @staticmethod
+    def compatible(task: tasks.Task, first: tasks.SimpleInferenceTask) -> bool:
+        return (
+            MicroBatcher.batchable(task)
+            and type(task) is type(first)
+            and task.start_layer == first.start_layer  # type: ignore
+            and task.end_layer == first.end_layer  # type: ignore
+            and task.downstream_node == first.downstream_node  # type: ignore
+        )
+
+    def next_task(self) -> tasks.Task:
+        """
+        Returns the next task in priority order, considering both the inbox and deferred tasks.
+        """
+        if not self.deferred:
+            return self.inbox.get()
+        while True:
+            try:
+                heapq.heappush(self.deferred, self.inbox.get_nowait())
+            except Empty:
+                break
+        return heapq.heappop(self.deferred)
+
+    def collect(self, first: tasks.Task) -> list[tasks.Task]:
+        """
+        Builds a batch around `first`, which must already have been taken off the inbox.
+        """
+        batch = [first]
+        if self.max_batch_size == 1 or not self.batchable(first):
+            return batch
+
+        # tasks deferred earlier may fit this batch
+        for task in list(self.deferred):
+            if len(batch) == self.max_batch_size:
+                break
+            if self.compatible(task, first):  # type: ignore
+                self.deferred.remove(task)
+                batch.append(task)
+        heapq.heapify(self.deferred)
+
+        deadline = monotonic() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - monotonic()
+            try:
+                if remaining > 0:
+                    task = self.inbox.get(timeout=remaining)
+                else:
+                    # past the deadline, only take what is already waiting
+                    task = self.inbox.get_nowait()
+            except Empty:
+                break
+            if self.compatible(task, first):  # type: ignore
+                batch.append(task)
+            else:
+                heapq.heappush(self.deferred, task)
+                if remaining <= 0:
+                    break
+
+        if len(batch) > 1:
+            logger.info(
+                f"coalesced {len(batch)} tasks starting at layer {first.start_layer}"  # type: ignore
+            )
+        return batch
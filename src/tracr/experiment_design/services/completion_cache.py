@@ -0,0 +1,118 @@
+"""
+Caches the results of completing passes on a participant.
+
+An edge node serving several clients that look at the same scene, or the same dataset replayed
+once per split point, is asked to complete identical partial inferences over and over. A
+`CompletionCache` remembers the output of the most recent passes, keyed by the model, the layers
+run and a digest of the incoming activations, so a repeated task is answered without running the
+model. Whether each pass was a hit is recorded with the layer records (`cache_hit`,
+`cache_lookup_time`), which shows how much redundancy a workload really has.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable
+
+import torch
+
+from src.tracr.experiment_design.codecs.codec import EncodedTensor
+from src.tracr.experiment_design.models.model_hooked import NotDict
+
+
+def _update_digest(digest: Any, x: Any) -> None:
+    if isinstance(x, torch.Tensor):
+        x = x.detach()
+        digest.update(f"T{x.dtype}{tuple(x.shape)};".encode())
+        digest.update(
+            memoryview(x.cpu().contiguous().reshape(-1).view(torch.uint8).numpy())
+        )
+    elif isinstance(x, NotDict):
+        digest.update(b"N")
+        _update_digest(digest, x())
+    elif isinstance(x, EncodedTensor):
+        digest.update(b"E")
+        _update_digest(digest, x.payload)
+        _update_digest(digest, x.stages)
+    elif isinstance(x, dict):
+        digest.update(f"D{len(x)};".encode())
+        for key in sorted(x, key=repr):
+            digest.update(f"{key!r}:".encode())
+            _update_digest(digest, x[key])
+    elif isinstance(x, (list, tuple)):
+        digest.update(f"L{len(x)};".encode())
+        for item in x:
+            _update_digest(digest, item)
+    else:
+        digest.update(f"{type(x).__name__}:{x!r};".encode())
+
+
+def activation_digest(x: Any) -> str:
+    """Hashes a model input (tensor, banked NotDict or encoded activations) by value."""
+    digest = hashlib.blake2b(digest_size=20)
+    _update_digest(digest, x)
+    return digest.hexdigest()
+
+
+def _compact(x: Any) -> Any:
+    """Copies tensors that are views into a larger batch, so a cached share doesn't keep the
+    whole batch's output alive."""
+    if isinstance(x, torch.Tensor):
+        return x.clone() if x.untyped_storage().nbytes() > x.nbytes else x
+    if isinstance(x, NotDict):
+        return NotDict(_compact(x()))
+    if isinstance(x, dict):
+        return {key: _compact(value) for key, value in x.items()}
+    if isinstance(x, (list, tuple)):
+        return type(x)(_compact(item) for item in x)
+    return x
+
+
+class CompletionCache:
+    """A thread-safe LRU of up to `maxsize` pass outputs with hit and miss counters."""
+
+    def __init__(self, maxsize: int = 64) -> None:
+        self.maxsize = maxsize
+        self.entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(model_name: str, start_layer: int, end_layer: Any, x: Any) -> tuple:
+        return (model_name, start_layer, str(end_layer), activation_digest(x))
+
+    def get(self, key: Hashable) -> tuple[bool, Any]:
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return True, self.entries[key]
+            self.misses += 1
+            return False, None
+
+    def note_hit(self) -> None:
+        """Counts a repeat answered from an output computed in the same batch."""
+        with self.lock:
+            self.hits += 1
+
+    def put(self, key: Hashable, value: Any) -> None:
+        value = _compact(value)
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict[str, int]:
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
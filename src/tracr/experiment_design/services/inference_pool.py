@@ -0,0 +1,74 @@
+"""
+Running several inferences at once on one participant.
+
+A participant's run loop completes one task at a time, so on a node with 4-8 cores a single
+inference has all of them to itself, and small layers leave most of those cores waiting on each
+other. An `InferencePool` runs tasks on a fixed number of worker threads instead. They all run
+the node's one `WrappedModel`, which keeps the state of each pass in a context of the thread
+running it, so each extra worker costs only the activations of its pass rather than another
+copy of the network.
+
+PyTorch's intra-op thread count is a setting of the whole process, not of a thread, so there is
+no way to give each worker threads of its own. Given `torch_threads`, the pool sets it for every
+pass on the node, inside the pool or not; otherwise PyTorch's default is left alone. Fewer
+threads than cores usually suits several concurrent passes better than one per core.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from queue import Queue
+from typing import Any, Callable
+
+import torch
+
+
+logger = logging.getLogger("tracr_logger")
+
+
+class InferencePool:
+    """
+    Runs submitted calls on `workers` daemon threads. At most `queue_size` calls wait for a
+    free worker; `submit` blocks beyond that.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        torch_threads: int = 0,
+        queue_size: int = 0,
+    ) -> None:
+        self.workers = max(1, workers)
+        if torch_threads > 0:
+            torch.set_num_threads(torch_threads)
+        self.queue: Queue[tuple[Callable, tuple]] = Queue(
+            queue_size or 2 * self.workers
+        )
+        self.threads = [
+            threading.Thread(target=self._work, name=f"inference_{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+        logger.info(
+            f"started {self.workers} inference workers sharing "
+            f"{torch.get_num_threads()} torch threads"
+        )
+
+    def submit(self, fn: Callable, *args: Any) -> None:
+        self.queue.put((fn, args))
+
+    def _work(self) -> None:
+        while True:
+            fn, args = self.queue.get()
+            try:
+                fn(*args)
+            except Exception:
+                logger.exception(f"inference worker failed running {fn.__name__}")
+            finally:
+                self.queue.task_done()
+
+    def join(self) -> None:
+        """Waits until every call submitted so far has finished."""
+        self.queue.join()
@@ -0,0 +1,214 @@
+"""
+Receiving tasks on a node. `accept_task` runs on the thread rpyc serves the sender's connection
+with, and used to start a new thread for every task just to put it in the inbox, so a flood of
+partial inferences meant thousands of short-lived threads.
+
+A `TaskIngest` hands received tasks to a fixed pool of worker threads through a bounded backlog
+instead. Workers unpickle tasks in parallel but put them into the inbox in the order they were
+received. The inbox is bounded too, so when a node falls behind, its workers wait for room, the
+backlog fills up and `accept_task` blocks, which holds up the sender (and, through its
+SendQueue, the sender's producer) rather than letting tasks pile up in memory. If the node is
+given an accept timeout, inference tasks that still find the backlog full after waiting that
+long are dropped and counted instead; control tasks such as the finish signal are never dropped.
+
+A participant is sent its whole playbook before it starts draining its inbox, which would block
+the observer for good once the playbook outgrew the inbox and backlog together. Until `release`
+is called, tasks submitted after `hold` are kept aside without limit, then fed into the backlog
+in order as the node works through them.
+
+`stats()` reports:
+
+    inbox_depth, backlog_depth   tasks currently waiting in each, and the deepest the inbox got
+    held                         tasks kept aside by `hold` and not yet in the backlog
+    accepted                     tasks put into the inbox
+    dropped, failed              tasks dropped on a timeout, or that couldn't be unpickled
+    enqueue_latency_*            time from `accept_task` receiving a task to it entering the inbox
+"""
+
+from __future__ import annotations
+
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from queue import Full, PriorityQueue, Queue
+from typing import Union
+
+import src.tracr.experiment_design.tasks.tasks as tasks
+import src.tracr.experiment_design.tasks.transport as transport
+
+
+logger = logging.getLogger("tracr_logger")
+
+# inference tasks can be dropped on an accept timeout; anything else waits for room
+DROPPABLE_TASKS = (
+    tasks.SimpleInferenceTask,
+    tasks.SingleInputInferenceTask,
+    tasks.PipelineInferenceTask,
+)
+
+
+class TaskIngest:
+    """
+    Moves serialized tasks from `submit` into `inbox` on `workers` daemon threads, with at most
+    `backlog` tasks waiting between them.
+    """
+
+    def __init__(
+        self,
+        inbox: PriorityQueue,
+        workers: int = 2,
+        backlog: int = 64,
+        accept_timeout_s: Union[float, None] = None,
+    ) -> None:
+        self.inbox = inbox
+        self.accept_timeout_s = accept_timeout_s
+        self.backlog: Queue[tuple[bytes, tuple, int]] = Queue(max(1, backlog))
+        # tickets follow the backlog's order, and the inbox is filled in ticket order
+        self.tickets = itertools.count()
+        self.next_ticket = 0
+        self.get_lock = threading.Lock()
+        self.turn = threading.Condition()
+        self.lock = threading.Lock()
+        self.accepted = 0
+        self.dropped = 0
+        self.failed = 0
+        self.max_inbox_depth = 0
+        self.latency_ns = 0
+        self.max_latency_ns = 0
+        self.held: Union[deque[tuple[bytes, tuple, int]], None] = None
+        self.feeder: Union[threading.Thread, None] = None
+        self.threads = [
+            threading.Thread(target=self._work, name=f"ingest_{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, header: bytes, buffers: tuple = ()) -> bool:
+        """
+        Queues a task serialized by `transport.dumps`, blocking while the backlog is full.
+        Returns False if the task was dropped.
+        """
+        return self.submit_timed(header, buffers)[0]
+
+    def submit_timed(self, header: bytes, buffers: tuple = ()) -> tuple[bool, int]:
+        """
+        Like `submit`, but also returns how long it took in ns, which is mostly time spent
+        waiting for room in the backlog.
+        """
+        received_at = time.perf_counter_ns()
+        accepted = self._submit(header, buffers, received_at)
+        return accepted, time.perf_counter_ns() - received_at
+
+    def _submit(self, header: bytes, buffers: tuple, received_at: int) -> bool:
+        with self.lock:
+            if self.held is not None:
+                self.held.append((header, buffers, received_at))
+                return True
+        try:
+            self.backlog.put(
+                (header, buffers, received_at), timeout=self.accept_timeout_s
+            )
+            return True
+        except Full:
+            task = transport.loads(header, buffers)
+            if not isinstance(task, DROPPABLE_TASKS):
+                self.backlog.put((task, (), received_at))
+                return True
+            logger.warning(
+                f"dropped {task.task_type} after {self.accept_timeout_s}s with a full backlog"
+            )
+            with self.lock:
+                self.dropped += 1
+            return False
+
+    def hold(self) -> None:
+        """Keeps tasks submitted from now on out of the backlog, however many there are,
+        until `release` is called."""
+        with self.lock:
+            if self.held is None:
+                self.held = deque()
+
+    def release(self) -> None:
+        """
+        Feeds the held tasks into the backlog in order on a thread of its own, waiting for room
+        rather than dropping any. Tasks submitted in the meantime are held behind them.
+        """
+        self.feeder = threading.Thread(
+            target=self._feed, name="ingest_feed", daemon=True
+        )
+        self.feeder.start()
+
+    def _feed(self) -> None:
+        while True:
+            with self.lock:
+                if not self.held:
+                    self.held = None
+                    return
+                item = self.held.popleft()
+            self.backlog.put(item)
+
+    def _work(self) -> None:
+        while True:
+            with self.get_lock:
+                header, buffers, received_at = self.backlog.get()
+                ticket = next(self.tickets)
+            try:
+                task = (
+                    header
+                    if isinstance(header, tasks.Task)
+                    else transport.loads(header, buffers)
+                )
+            except Exception:
+                logger.exception("failed to unpickle a received task")
+                with self.lock:
+                    self.failed += 1
+                self._skip(ticket)
+                self.backlog.task_done()
+                continue
+            with self.turn:
+                self.turn.wait_for(lambda: self.next_ticket == ticket)
+                # blocks while the inbox is full, holding up later tickets too
+                self.inbox.put(task)
+                self.next_ticket += 1
+                self.turn.notify_all()
+            latency = time.perf_counter_ns() - received_at
+            with self.lock:
+                self.accepted += 1
+                self.latency_ns += latency
+                self.max_latency_ns = max(self.max_latency_ns, latency)
+                self.max_inbox_depth = max(self.max_inbox_depth, self.inbox.qsize())
+            logger.debug(f"{task.task_type} saved to inbox in {latency / 1e6:.2f} ms")
+            self.backlog.task_done()
+
+    def _skip(self, ticket: int) -> None:
+        """Gives up a ticket's turn once the tickets before it have been put in the inbox."""
+        with self.turn:
+            self.turn.wait_for(lambda: self.next_ticket == ticket)
+            self.next_ticket += 1
+            self.turn.notify_all()
+
+    def join(self) -> None:
+        """Waits until every task submitted so far is in the inbox (or dropped). Held tasks
+        only count once they have been released."""
+        if self.feeder is not None:
+            self.feeder.join()
+        self.backlog.join()
+
+    def stats(self) -> dict[str, Union[int, float]]:
+        with self.lock:
+            return {
+                "inbox_depth": self.inbox.qsize(),
+                "max_inbox_depth": self.max_inbox_depth,
+                "backlog_depth": self.backlog.qsize(),
+                "held": len(self.held) if self.held is not None else 0,
+                "accepted": self.accepted,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "enqueue_latency_mean_ns": (
+                    self.latency_ns / self.accepted if self.accepted else 0.0
+                ),
+                "enqueue_latency_max_ns": self.max_latency_ns,
+            }
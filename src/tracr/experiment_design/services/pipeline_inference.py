@@ -0,0 +1,98 @@
+"""
+The executors defined here split every inference into a pipeline of stages run by different nodes:
+a client (perhaps a camera) runs the first few layers, an edge server the middle of the network
+and a cloud instance the rest. Each stage is described by a `(node, start_layer, end_layer)` hop
+of the route carried by a `PipelineInferenceTask`, so the number of stages and where they split
+is just a matter of changing `PipelineClientService.ROUTE`.
+
+A node hands its stage's output on as soon as it is done, and `accept_task` returns before the
+receiving node starts work. Every stage therefore works on the next input while the stages after
+it are still finishing the previous ones, and the throughput of the pipeline is set by its slowest
+stage rather than the sum of all of them.
+"""
+
+import logging
+
+import numpy as np
+
+from src.tracr.experiment_design.services.base import ParticipantService
+import src.tracr.experiment_design.tasks.tasks as tasks
+
+
+logger = logging.getLogger("tracr_logger")
+
+
+class PipelineStageService(ParticipantService):
+    """
+    Runs whichever stage of a route it is handed, which the base class already knows how to do.
+    All that's left is shutting the pipeline down in order: once a stage has finished its own
+    tasks, it passes the finish signal on to every node it forwarded work to.
+    """
+
+    downstream_nodes: set[str]
+
+    def __init__(self):
+        super().__init__()
+        self.downstream_nodes = set()
+
+    def forward_downstream(self, task, out, inference_id):
+        if task.downstream_node is not None:
+            self.downstream_nodes.add(task.downstream_node)
+        super().forward_downstream(task, out, inference_id)
+
+    def on_finish(self, _):
+        for node in sorted(self.downstream_nodes):
+            self.enqueue_task(node, tasks.FinishSignalTask(self.node_name))
+        super().on_finish(_)
+
+
+class PipelineClientService(PipelineStageService):
+    """
+    Starts a pipelined inference for every input it receives, running the first stage of `ROUTE`
+    itself (if the route starts here) and handing the rest on.
+    """
+
+    ALIASES: list[str] = ["CLIENT1", "PARTICIPANT"]
+
+    SEND_QUEUE_SIZE: int = 4
+
+    # (node, start_layer, end_layer) for each stage; np.inf runs the rest of the network
+    ROUTE: list[tuple[str, int, int | float]] = [
+        ("CLIENT1", 0, 4),
+        ("EDGE1", 4, 11),
+        ("CLOUD1", 11, np.inf),
+    ]
+
+    partners: list[str] = ["OBSERVER", "EDGE1", "CLOUD1"]
+
+    def inference_sequence_per_input(self, task: tasks.SingleInputInferenceTask):
+        pipeline_task = tasks.PipelineInferenceTask(
+            self.node_name, task.input, self.ROUTE, inference_id=task.inference_id
+        )
+        if pipeline_task.node == self.node_name:
+            self.simple_inference(pipeline_task)
+        else:
+            logger.info(f"Sending full job to {pipeline_task.node}")
+            self.downstream_nodes.add(pipeline_task.node)
+            self.enqueue_task(pipeline_task.node, pipeline_task)
+
+
+class PipelineEdgeService(PipelineStageService):
+    """The middle of the pipeline; it batches stages arriving from several clients."""
+
+    ALIASES: list[str] = ["EDGE1", "PARTICIPANT"]
+    partners: list[str] = ["OBSERVER", "CLIENT1", "CLOUD1"]
+
+    MAX_BATCH_SIZE: int = 8
+    MAX_BATCH_WAIT_S: float = 0.005
+    SEND_QUEUE_SIZE: int = 4
+
+
+class PipelineCloudService(PipelineStageService):
+    """The last stage of the pipeline."""
+
+    ALIASES: list[str] = ["CLOUD1", "PARTICIPANT"]
+    partners: list[str] = ["OBSERVER", "EDGE1"]
+
+    MAX_BATCH_SIZE: int = 8
+    MAX_BATCH_WAIT_S: float = 0.005
@@ -0,0 +1,88 @@
+"""
+Background sending for participant nodes. `send_task` blocks until the receiving node has
+accepted the task, which for a split inference means until the intermediary data has crossed the
+network. A node that calls it directly sits idle for the whole transfer before it can start on
+its next input.
+
+A `SendQueue` hands outgoing tasks to a background thread instead, so computing the next
+inference overlaps with transmitting the last one. The queue is bounded: once `maxsize` tasks are
+waiting or being sent, `put` blocks until the sender catches up, which keeps a fast producer on a
+slow link from piling up intermediary tensors in memory. Every task records what it went through
+on its way out in `task.send_stats`, `(queue depth, blocked ns, queued ns)`:
+
+    queue depth   tasks still waiting or being sent when it was queued
+    blocked ns    how long the producer was held up by a full queue (backpressure)
+    queued ns     how long the task waited between being queued and starting to send
+
+The receiving node writes these into its record for the layer it resumes at.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from queue import Queue
+from typing import Callable
+
+import src.tracr.experiment_design.tasks.tasks as tasks
+
+
+logger = logging.getLogger("tracr_logger")
+
+
+class SendQueue:
+    """
+    Sends tasks with `send_fn(node_name, task)` from a daemon thread, in the order they were
+    queued. At most `maxsize` tasks are waiting or being sent at once. `join` waits until
+    everything queued so far has been sent.
+    """
+
+    def __init__(
+        self, send_fn: Callable[[str, tasks.Task], None], maxsize: int = 4
+    ) -> None:
+        self.send_fn = send_fn
+        self.maxsize = max(1, maxsize)
+        # the semaphore bounds the queue, so the producer knows how long it was held up
+        # before the task is visible to the sender
+        self.slots = threading.BoundedSemaphore(self.maxsize)
+        self.queue: Queue[tuple[str, tasks.Task, int]] = Queue()
+        self.sent = 0
+        self.max_depth = 0
+        self.blocked_ns = 0
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def put(self, node_name: str, task: tasks.Task) -> None:
+        depth = self.queue.unfinished_tasks
+        put_start = time.perf_counter_ns()
+        self.slots.acquire()
+        queued_at = time.perf_counter_ns()
+        blocked = queued_at - put_start
+        task.send_stats = (depth, blocked, 0)
+        self.max_depth = max(self.max_depth, depth)
+        self.blocked_ns += blocked
+        if blocked > 1_000_000:
+            logger.debug(f"send queue full; blocked for {blocked / 1e6:.1f} ms")
+        self.queue.put((node_name, task, queued_at))
+
+    def _serve(self) -> None:
+        while True:
+            node_name, task, queued_at = self.queue.get()
+            try:
+                depth, blocked, _ = task.send_stats  # type: ignore
+                task.send_stats = (depth, blocked, time.perf_counter_ns() - queued_at)
+                self.send_fn(node_name, task)
+                self.sent += 1
+            except Exception:
+                logger.exception(f"failed to send {task.task_type} to {node_name}")
+            finally:
+                self.slots.release()
+                self.queue.task_done()
+
+    def join(self) -> None:
+        self.queue.join()
+        logger.info(
+            f"send queue drained: {self.sent} tasks sent, max depth {self.max_depth}, "
+            f"{self.blocked_ns / 1e6:.1f} ms blocked on a full queue"
+        )
@@ -40,9 +40,13 @@ class Task:
     from_node: str
     task_type: str
     priority: int = 5  # from 1 to 10 (or 11 for FinishSignalTask)
+    # (queue depth, blocked ns, queued ns) if the task went out through a SendQueue
+    send_stats: Union[tuple[int, int, int], None] = None
 
-    def __init__(self, from_node: str, priority: int = 5):
-        self.priority = priority
+    def __init__(self, from_node: str, priority: Union[int, None] = None):
+        # leave the class's own priority in place unless one is given
+        if priority is not None:
+            self.priority = priority
         self.from_node = from_node
         self.task_type = self.__class__.__name__
 
@@ -67,11 +71,13 @@ class SimpleInferenceTask(Task):
 
     The node has no say in how the inference is partitioned, the `inference_id`, or where to send
     the intermediary data (if applicable); this type of task tells the node exactly what to do.
+
+    The input may be a batch; in that case `inference_id` can be a list with one id per sample.
     """
 
     priority: int = 5
     input: Any
-    inference_id: Union[str, None] = None
+    inference_id: Union[str, list[str], None] = None
     start_layer: int = 0
     end_layer: Union[int, float] = np.inf
     downstream_node: Union[str, None] = None
@@ -80,7 +86,7 @@ class SimpleInferenceTask(Task):
         self,
         from_node: str,
         input: Any,
-        inference_id: Union[str, None] = None,
+        inference_id: Union[str, list[str], None] = None,
         start_layer: int = 0,
         end_layer: Union[int, float] = np.inf,
         downstream_node: Union[str, None] = None,
@@ -95,6 +101,89 @@ class SimpleInferenceTask(Task):
             self.inference_id = str(uuid.uuid4())
 
 
+class PipelineInferenceTask(Task):
+    """
+    Sending this task to a node's inbox is like saying:
+
+    'Here is an input and the route it takes through the network - complete your stage of the
+    route, then hand the result to the node running the next one.'
+
+    The `route` is an ordered list of `(node, start_layer, end_layer)` stages that together cover
+    the whole network, e.g. `[("CLIENT1", 0, 4), ("EDGE1", 4, 11), ("CLOUD1", 11, np.inf)]`, and
+    `stage` is the index of the stage this task is for. Each node only ever works on its own
+    stage, so every node in the route can start on the next input as soon as it has handed the
+    current one on.
+
+    The input may be a batch; in that case `inference_id` can be a list with one id per sample.
+    """
+
+    priority: int = 5
+    input: Any
+    inference_id: Union[str, list[str], None] = None
+    route: list[tuple[str, int, Union[int, float]]]
+    stage: int = 0
+
+    def __init__(
+        self,
+        from_node: str,
+        input: Any,
+        route: list[tuple[str, int, Union[int, float]]],
+        stage: int = 0,
+        inference_id: Union[str, list[str], None] = None,
+    ):
+        super().__init__(from_node)
+        validate_route(route)
+        self.input = input
+        self.route = [tuple(hop) for hop in route]  # type: ignore
+        self.stage = stage
+        self.inference_id = inference_id
+        if self.start_layer == 0 and self.inference_id is None:
+            self.inference_id = str(uuid.uuid4())
+
+    @property
+    def node(self) -> str:
+        return self.route[self.stage][0]
+
+    @property
+    def start_layer(self) -> int:
+        return self.route[self.stage][1]
+
+    @property
+    def end_layer(self) -> Union[int, float]:
+        return self.route[self.stage][2]
+
+    @property
+    def downstream_node(self) -> Union[str, None]:
+        if self.stage + 1 < len(self.route):
+            return self.route[self.stage + 1][0]
+        return None
+
+    def next_stage(
+        self, from_node: str, out: Any, inference_id: Union[str, list[str]]
+    ) -> "PipelineInferenceTask":
+        """The task carrying `out` to the node running the following stage."""
+        return PipelineInferenceTask(
+            from_node, out, self.route, stage=self.stage + 1, inference_id=inference_id
+        )
+
+
+def validate_route(route: list[tuple[str, int, Union[int, float]]]) -> None:
+    """
+    Raises a ValueError unless the stages of `route` start at layer 0 and each one picks up
+    exactly where the one before it stopped.
+    """
+    if not route:
+        raise ValueError("a route needs at least one stage")
+    expected_start = 0
+    for node, start, end in route:
+        if start != expected_start or not end > start:
+            raise ValueError(
+                f"stage ({node}, {start}, {end}) of route {route} does not continue "
+                f"from layer {expected_start}"
+            )
+        expected_start = end
+
+
 class SingleInputInferenceTask(Task):
     """
     Sending this task to a node's inbox is like saying:
@@ -0,0 +1,90 @@
+"""
+Wire format used to move tasks between nodes.
+
+A plain `pickle.dumps(task)` serializes every tensor the task carries (e.g. the `NotDict`-wrapped
+`banked_input` of a split inference) by writing its storage into the pickle stream, which copies
+each activation several times before it ever reaches the socket. Instead, tasks are pickled with
+protocol 5 and every CPU tensor is handed to the pickler as an out-of-band buffer. What actually
+gets sent is a small header (the pickle stream, which only holds the task's structure and tensor
+metadata) followed by the raw tensor buffers, one per tensor.
+
+rpyc's brine only knows how to send `bytes`, so each buffer is materialized exactly once on the
+way out and made writable exactly once on the way in. Every rebuilt tensor is a view over the
+buffer it arrived in; nothing is re-serialized or re-copied in between.
+"""
+
+from __future__ import annotations
+
+import io
+import pickle
+from typing import Any, Sequence
+
+import numpy as np
+import torch
+
+
+PROTOCOL = 5
+
+
+def _rebuild_tensor(array: np.ndarray, dtype: str) -> torch.Tensor:
+    """
+    Wraps the array built from an out-of-band buffer as a tensor without copying it.
+    """
+    tensor = torch.from_numpy(array)
+    if dtype == "torch.bfloat16":
+        # numpy has no bfloat16, so these travel as int16 and are reinterpreted here
+        tensor = tensor.view(torch.bfloat16)
+    return tensor
+
+
+class _TensorPickler(pickle.Pickler):
+    """
+    Pickler that reduces plain CPU tensors to numpy views so their data is emitted as
+    `pickle.PickleBuffer`s instead of being written into the pickle stream.
+    """
+
+    def reducer_override(self, obj):
+        if type(obj) is not torch.Tensor or obj.is_sparse or obj.is_quantized:
+            return NotImplemented
+        tensor = obj.detach()
+        if tensor.device.type != "cpu":
+            tensor = tensor.cpu()
+        tensor = tensor.contiguous()
+        dtype = str(tensor.dtype)
+        if tensor.dtype == torch.bfloat16:
+            tensor = tensor.view(torch.int16)
+        try:
+            array = tensor.numpy()
+        except TypeError:
+            # dtypes numpy can't represent fall back to torch's own reduction
+            return NotImplemented
+        return _rebuild_tensor, (array, dtype)
+
+
+def dumps(obj: Any) -> tuple[bytes, tuple[bytes, ...]]:
+    """
+    Serializes `obj` into a `(header, buffers)` pair suitable for sending through rpyc.
+    """
+    raw_buffers: list[pickle.PickleBuffer] = []
+    stream = io.BytesIO()
+    _TensorPickler(stream, protocol=PROTOCOL, buffer_callback=raw_buffers.append).dump(
+        obj
+    )
+    buffers = tuple(bytes(buf.raw()) for buf in raw_buffers)
+    return stream.getvalue(), buffers
+
+
+def loads(header: bytes, buffers: Sequence[bytes] = ()) -> Any:
+    """
+    Rebuilds an object serialized with `dumps`. Tensors share memory with the received buffers,
+    which are made writable first since layers like `ReLU(inplace=True)` modify their inputs.
+    """
+    writable = [bytearray(buf) if isinstance(buf, bytes) else buf for buf in buffers]
+    return pickle.loads(header, buffers=writable)
+
+
+def payload_size(header: bytes, buffers: Sequence[bytes] = ()) -> int:
+    """
+    Returns the total number of bytes that will go over the wire for a `(header, buffers)` pair.
+    """
+    return len(header) + sum(len(buf) for buf in buffers)
@@ -0,0 +1,34 @@
+import sys
+from pathlib import Path
+
+import pytest
+import torch
+from torchvision import models
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import src.tracr.experiment_design.models.model_hooked as model_hooked  # noqa: E402
+
+
+MODEL_CONFIG = """
+participant_types:
+  client:
+    model:
+      model_name: alexnet
+      device: cpu
+      mode: eval
+      input_size: [3, 224, 224]
+      class: default
+"""
+
+
+@pytest.fixture
+def alexnet_config(tmp_path, monkeypatch):
+    """A model config for an untrained AlexNet, so nothing is downloaded."""
+    monkeypatch.setattr(
+        model_hooked, "model_selector", lambda name: models.alexnet(weights=None)
+    )
+    torch.manual_seed(0)
+    config_path = tmp_path / "model.yaml"
+    config_path.write_text(MODEL_CONFIG)
+    return str(config_path)
@@ -0,0 +1,63 @@
+from queue import PriorityQueue
+
+import torch
+
+from src.tracr.experiment_design.codecs.chain import CodecChain, decode_activations
+from src.tracr.experiment_design.models.model_hooked import WrappedModel
+from src.tracr.experiment_design.records.master_dict import MasterDict
+from src.tracr.experiment_design.services.basic_split_inference import EdgeService
+from src.tracr.experiment_design.services.batching import MicroBatcher
+from src.tracr.experiment_design.tasks import tasks
+
+
+class BatchingEdge(EdgeService):
+    MAX_BATCH_SIZE = 8
+    MAX_BATCH_WAIT_S = 0.05
+
+
+def test_each_task_of_a_batched_early_exit_is_encoded_on_its_own(alexnet_config):
+    master_dict = MasterDict()
+    edge = BatchingEdge()
+    edge.inbox = PriorityQueue()
+    edge.batcher = MicroBatcher(edge.inbox, edge.MAX_BATCH_SIZE, edge.MAX_BATCH_WAIT_S)
+    edge.model = WrappedModel(
+        config_path=alexnet_config, master_dict=master_dict, node_name="EDGE1"
+    )
+    edge.model.node_name = "EDGE1"
+    edge.model.codec_chain = CodecChain.from_spec("fp16")
+    edge.status = "ready"
+    forwarded = {}
+    edge.forward_downstream = lambda task, out, inference_id: forwarded.update(
+        {inference_id: out}
+    )
+
+    inputs = [torch.rand(1, 3, 224, 224) for _ in range(3)]
+    for n, x in enumerate(inputs):
+        edge.inbox.put(
+            tasks.SimpleInferenceTask("CLIENT1", x, inference_id=f"inf{n}", end_layer=8)
+        )
+    edge.inbox.put(tasks.FinishSignalTask())
+    edge._run()
+
+    edge.model.codec_chain = None
+    assert sorted(forwarded) == ["inf0", "inf1", "inf2"]
+    for n, x in enumerate(inputs):
+        decoded, spec = decode_activations(forwarded[f"inf{n}"]())
+        expected = edge.model(x, end=8, log=False)()
+        assert spec == "fp16"
+        assert decoded.keys() == expected.keys()
+        for layer, value in decoded.items():
+            assert value.shape[0] == 1
+            assert value.shape == expected[layer].shape
+            assert torch.allclose(value.float(), expected[layer], atol=1e-2)
+
+    edge.model.update_master_dict()
+    df = master_dict.to_dataframe()
+    assert (df.batch_size == 3).all()
+    # the batch's row adds up what encoding each share cost
+    exits = df[df.layer_id == 7]
+    assert (exits.codec == "fp16").all()
+    shares = [
+        sum(value.nbytes for value in out().values()) for out in forwarded.values()
+    ]
+    assert (exits.encoded_bytes == sum(shares)).all()
@@ -0,0 +1,27 @@
+import torch
+
+from src.tracr.experiment_design.codecs.chain import CodecChain, decode_activations
+from src.tracr.experiment_design.codecs.codec import EncodedTensor
+
+
+def test_tensors_banked_in_tuples_are_encoded_and_counted():
+    chain = CodecChain.from_spec("fp16")
+    activations = {
+        2: torch.rand(1, 8, 4, 4),
+        5: (torch.rand(1, 16, 2, 2),),
+        7: [torch.rand(1, 4), torch.arange(3)],
+    }
+    encoded, nbytes = chain.encode_activations(activations)
+
+    assert isinstance(encoded[5][0], EncodedTensor)
+    assert isinstance(encoded[7][0], EncodedTensor)
+    assert torch.equal(encoded[7][1], activations[7][1])
+    # half precision floats, plus the int64 tensor as is
+    float_elements = 8 * 4 * 4 + 16 * 2 * 2 + 4
+    assert nbytes == float_elements * 2 + 3 * 8
+
+    decoded, spec = decode_activations(encoded)
+    assert spec == "fp16"
+    assert isinstance(decoded[5], tuple) and isinstance(decoded[7], list)
+    assert torch.allclose(decoded[5][0], activations[5][0], atol=1e-3)
+    assert torch.allclose(decoded[7][0], activations[7][0], atol=1e-3)
@@ -0,0 +1,55 @@
+from queue import PriorityQueue
+
+import torch
+
+from src.tracr.experiment_design.models.model_hooked import WrappedModel
+from src.tracr.experiment_design.records.master_dict import MasterDict
+from src.tracr.experiment_design.services.basic_split_inference import EdgeService
+from src.tracr.experiment_design.services.batching import MicroBatcher
+from src.tracr.experiment_design.tasks import tasks
+
+
+class CachingEdge(EdgeService):
+    MAX_BATCH_SIZE = 8
+    MAX_BATCH_WAIT_S = 0.05
+    # smaller than the number of distinct inputs in one batch
+    COMPLETION_CACHE_SIZE = 2
+
+
+def test_repeats_survive_eviction_within_a_batch(alexnet_config):
+    master_dict = MasterDict()
+    edge = CachingEdge()
+    edge.inbox = PriorityQueue()
+    edge.batcher = MicroBatcher(edge.inbox, edge.MAX_BATCH_SIZE, edge.MAX_BATCH_WAIT_S)
+    edge.model = WrappedModel(
+        config_path=alexnet_config, master_dict=master_dict, node_name="EDGE1"
+    )
+    edge.model.node_name = "EDGE1"
+    edge.status = "ready"
+    forwarded = {}
+    edge.forward_downstream = lambda task, out, inference_id: forwarded.update(
+        {inference_id: out}
+    )
+
+    client = WrappedModel(config_path=alexnet_config, master_dict=None)
+    inputs = [torch.rand(1, 3, 224, 224) for _ in range(3)]
+    order = [0, 1, 2, 0, 1, 2]
+    for n, i in enumerate(order):
+        banked = client(inputs[i], end=5, log=False)
+        edge.inbox.put(
+            tasks.SimpleInferenceTask(
+                "CLIENT1", banked, inference_id=f"inf{n}", start_layer=5
+            )
+        )
+    edge.inbox.put(tasks.FinishSignalTask())
+    edge._run()
+
+    assert sorted(forwarded) == [f"inf{n}" for n in range(len(order))]
+    for n, i in enumerate(order):
+        assert torch.allclose(forwarded[f"inf{n}"], forwarded[f"inf{order.index(i)}"])
+    df = master_dict.to_dataframe()
+    assert df.inference_id.nunique() == len(order)
+    assert df.groupby("inference_id").cache_hit.max().sum() == 3
+    assert edge.completion_cache.stats()["hits"] == 3
+    # no lookup is left noted for a pass that never ran
+    assert edge.model.context().pending_cache is None
@@ -0,0 +1,79 @@
+import threading
+
+import pytest
+import torch
+
+from src.tracr.experiment_design.models.model_hooked import NotDict, WrappedModel
+from src.tracr.experiment_design.records.master_dict import MasterDict
+
+
+# (start, end) of each pass; passes that don't start at 0 get banked activations
+SPLITS = [(0, None), (0, 5), (3, 8), (0, 2), (5, None), (2, 6)]
+THREADS = 4
+PASSES = 24
+
+
+def same(a, b) -> bool:
+    if isinstance(a, NotDict):
+        a, b = a(), b()
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(same(a[k], b[k]) for k in a)
+    if isinstance(a, (list, tuple)):
+        return len(a) == len(b) and all(same(x, y) for x, y in zip(a, b))
+    return torch.allclose(a, b, atol=1e-5)
+
+
+def run_pass(model: WrappedModel, inputs: dict, n: int):
+    start, end = SPLITS[n % len(SPLITS)]
+    end = model.layer_count if end is None else end
+    x = inputs[n]
+    if start > 0:
+        x = model(x, start=0, end=start, log=False)
+    return model(x, inference_id=f"inf{n}", start=start, end=end)
+
+
+def records(master_dict: MasterDict):
+    df = master_dict.to_dataframe()
+    columns = ["inference_id", "layer_id", "completed_by_node", "batch_size"]
+    return sorted(map(tuple, df[columns].itertuples(index=False)))
+
+
+@pytest.mark.parametrize("hooks", ["full", "fast"])
+@pytest.mark.parametrize("replay", [False, True])
+def test_concurrent_passes_match_sequential_ones(alexnet_config, hooks, replay):
+    model = WrappedModel(
+        config_path=alexnet_config, master_dict=MasterDict(), flush_buffer_size=5
+    )
+    model.node_name = "EDGE1"
+    # fast hooks are added and removed for each pass, also while others are running
+    model.hooks = hooks
+    if replay:
+        model.split_planner = None
+    inputs = {n: torch.rand(1, 3, 224, 224) for n in range(PASSES)}
+
+    expected = {n: run_pass(model, inputs, n) for n in range(PASSES)}
+    model.update_master_dict()
+    expected_records = records(model.master_dict)
+
+    model.master_dict = MasterDict()
+    results = {}
+    barrier = threading.Barrier(THREADS)
+
+    def work(first: int):
+        barrier.wait()
+        for n in range(first, PASSES, THREADS):
+            results[n] = run_pass(model, inputs, n)
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(60)
+    model.update_master_dict()
+
+    assert all(same(results[n], expected[n]) for n in range(PASSES))
+    assert records(model.master_dict) == expected_records
+    df = model.master_dict.to_dataframe()
+    assert (df.inference_time >= 0).all()
+    assert model.passes_running == 0
+    assert not model.records.sealed
@@ -0,0 +1,175 @@
+import threading
+import time
+from queue import Queue
+from types import SimpleNamespace
+
+import torch
+
+from src.tracr.experiment_design.models.model_hooked import WrappedModel
+from src.tracr.experiment_design.services.basic_split_inference import EdgeService
+from src.tracr.experiment_design.services.ingest import TaskIngest
+from src.tracr.experiment_design.tasks import tasks, transport
+
+
+def task_args(n: int) -> tuple:
+    return "CLIENT1", torch.full((1, 4), float(n)), f"inf{n}"
+
+
+def serialized(n: int) -> tuple:
+    return transport.dumps(tasks.SimpleInferenceTask(*task_args(n)))
+
+
+def drain(inbox: Queue, count: int, timeout: float = 5.0) -> list:
+    return [inbox.get(timeout=timeout) for _ in range(count)]
+
+
+def wait_until(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_tasks_reach_the_inbox_in_the_order_received():
+    # a plain FIFO inbox, since the PriorityQueue doesn't keep ties in order
+    inbox = Queue()
+    ingest = TaskIngest(inbox, workers=4, backlog=8)
+    for n in range(100):
+        ingest.submit(*serialized(n))
+    ingest.join()
+
+    received = drain(inbox, 100)
+    assert [task.inference_id for task in received] == [f"inf{n}" for n in range(100)]
+    assert torch.equal(received[42].input, torch.full((1, 4), 42.0))
+    assert ingest.stats()["accepted"] == 100
+
+
+def test_a_full_inbox_holds_up_the_sender():
+    inbox = Queue(2)
+    ingest = TaskIngest(inbox, workers=2, backlog=2)
+    submitted = []
+
+    def send():
+        for n in range(20):
+            ingest.submit(*serialized(n))
+            submitted.append(n)
+
+    sender = threading.Thread(target=send, daemon=True)
+    sender.start()
+    # two tasks in the inbox, two held by the workers and two in the backlog
+    assert wait_until(lambda: len(submitted) >= 6)
+    time.sleep(0.2)
+    assert sender.is_alive() and len(submitted) == 6
+    assert inbox.qsize() == 2
+
+    received = drain(inbox, 20)
+    sender.join(5)
+    assert [task.inference_id for task in received] == [f"inf{n}" for n in range(20)]
+    stats = ingest.stats()
+    assert stats["accepted"] == 20 and stats["dropped"] == 0
+    assert stats["max_inbox_depth"] == 2
+
+
+def test_inference_tasks_are_dropped_after_the_accept_timeout():
+    inbox = Queue(1)
+    ingest = TaskIngest(inbox, workers=1, backlog=1, accept_timeout_s=0.05)
+    results = [ingest.submit(*serialized(n)) for n in range(6)]
+    # one in the inbox, one held by the worker, one in the backlog
+    assert results[:3] == [True, True, True]
+    assert not any(results[3:])
+    assert ingest.stats()["dropped"] == 3
+
+    # control tasks wait for room instead
+    finish = threading.Thread(
+        target=ingest.submit, args=transport.dumps(tasks.FinishSignalTask())
+    )
+    finish.start()
+    time.sleep(0.2)
+    assert finish.is_alive()
+    received = drain(inbox, 4)
+    finish.join(5)
+    assert [type(task) for task in received][-1] is tasks.FinishSignalTask
+    assert [task.inference_id for task in received[:3]] == ["inf0", "inf1", "inf2"]
+    stats = ingest.stats()
+    assert stats["accepted"] == 4 and stats["dropped"] == 3
+
+
+def test_held_tasks_are_not_bounded_by_the_backlog():
+    inbox = Queue(2)
+    ingest = TaskIngest(inbox, workers=2, backlog=2, accept_timeout_s=0.05)
+    ingest.hold()
+    # far more than the inbox, workers and backlog take, and none of them dropped
+    assert all(ingest.submit(*serialized(n)) for n in range(50))
+    assert inbox.qsize() == 0 and ingest.stats()["held"] == 50
+
+    ingest.release()
+    ingest.submit(*serialized(50))
+    received = drain(inbox, 51)
+    ingest.join()
+    assert [task.inference_id for task in received] == [f"inf{n}" for n in range(51)]
+    stats = ingest.stats()
+    assert stats["accepted"] == 51 and stats["dropped"] == 0 and stats["held"] == 0
+
+
+class SmallInboxEdge(EdgeService):
+    INBOX_SIZE = 4
+    INGEST_BACKLOG = 2
+
+
+def test_a_playbook_larger_than_the_inbox_is_delegated_before_the_run(alexnet_config):
+    edge = SmallInboxEdge()
+    edge.model = WrappedModel(config_path=alexnet_config, master_dict=None)
+    edge.model.node_name = "EDGE1"
+    edge.status = "ready"
+    forwarded = []
+    edge.forward_downstream = lambda task, out, inference_id: forwarded.append(
+        inference_id
+    )
+
+    playbook = [
+        tasks.SimpleInferenceTask(
+            "OBSERVER", torch.rand(1, 3, 32, 32), inference_id=f"inf{n}", end_layer=1
+        )
+        for n in range(40)
+    ] + [tasks.FinishSignalTask()]
+
+    def delegate():
+        for task in playbook:
+            edge.accept_task(*transport.dumps(task))
+
+    observer = threading.Thread(target=delegate, daemon=True)
+    observer.start()
+    observer.join(5)
+    assert not observer.is_alive()
+
+    runner = threading.Thread(target=edge._run, daemon=True)
+    runner.start()
+    assert wait_until(lambda: edge.status == "finished", timeout=30)
+    assert sorted(forwarded) == sorted(f"inf{n}" for n in range(40))
+
+
+def test_sends_are_timed_without_the_receivers_backpressure():
+    receiver = EdgeService()
+    receiver.ingest = TaskIngest(Queue(1), workers=1, backlog=1)
+    sender = EdgeService()
+    sender.node_name = "CLIENT1"
+    sender.get_connection = lambda node_name: SimpleNamespace(root=receiver)
+    samples = []
+    sender.send_listeners.append(lambda node, nbytes, ns: samples.append(ns))
+
+    def send():
+        # one in the inbox, one held by the worker, one in the backlog, one held up
+        for n in range(4):
+            sender.send_task("EDGE1", tasks.SimpleInferenceTask(*task_args(n)))
+
+    thread = threading.Thread(target=send, daemon=True)
+    started = time.perf_counter_ns()
+    thread.start()
+    assert wait_until(lambda: len(samples) == 3)
+    time.sleep(0.3)
+    drain(receiver.ingest.inbox, 4)
+    thread.join(5)
+    assert time.perf_counter_ns() - started > 3e8
+    assert len(samples) == 4 and max(samples) < 1e8
@@ -0,0 +1,23 @@
+import warnings
+
+from src.tracr.experiment_design.partitioners.linreg_partitioner import (
+    RegressionPartitioner,
+)
+
+
+def test_update_regression_falls_back_on_files_without_data(tmp_path):
+    (tmp_path / "Conv2d.csv").write_text("")
+    (tmp_path / "ReLU.csv").write_text("bytes, ns\n")
+    (tmp_path / "Linear.csv").write_text("nan, 10\n")
+    (tmp_path / "MaxPool2d.csv").write_text("10, 100\n20, 200\n30, 300\n")
+    partitioner = RegressionPartitioner(num_breakpoints=1)
+    partitioner._dir = str(tmp_path)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # numpy warns about the empty file
+        partitioner.update_regression()
+
+    table = partitioner.regression
+    for layer_class in ("Conv2d", "ReLU", "Linear"):
+        assert table.predict(table.lookup([layer_class]), [100.0])[0] == 0
+    assert table.predict(table.lookup(["MaxPool2d"]), [40.0])[0] == 400
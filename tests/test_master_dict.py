@@ -0,0 +1,18 @@
+import torch
+
+from src.tracr.experiment_design.models.model_hooked import WrappedModel
+from src.tracr.experiment_design.records.master_dict import MasterDict
+
+
+def test_full_offload_counts_the_hop_from_the_source(alexnet_config):
+    master_dict = MasterDict(source_node="CLIENT1")
+    edge = WrappedModel(config_path=alexnet_config, master_dict=master_dict)
+    edge.node_name = "EDGE1"
+    edge(torch.rand(1, 3, 224, 224), inference_id="offloaded")
+    edge.update_master_dict()
+
+    summary = master_dict.to_dataframe().iloc[0]
+    assert summary["split_layer"] == 0
+    assert summary["hop_count"] == 1
+    assert summary["hop_bytes"] == 3 * 224 * 224 * 4
+    assert summary["transmission_latency_ns"] > 0
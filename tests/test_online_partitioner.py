@@ -0,0 +1,30 @@
+import numpy as np
+
+from src.tracr.experiment_design.partitioners.online_partitioner import (
+    LinkEstimate,
+    OnlinePartitioner,
+)
+
+
+def test_transfer_predictions_use_the_measured_compression():
+    # the input, then the outputs of three layers, then nothing
+    split_bytes = np.array([4000.0, 8000.0, 2000.0, 1000.0, 0.0])
+    link = LinkEstimate()
+    partitioner = OnlinePartitioner(split_bytes, explore=0, link=link)
+    assert np.array_equal(partitioner.wire_bytes(), split_bytes)
+
+    # a codec sent split 1 at a quarter of its size; nothing was encoded at the other splits
+    unset = -1
+    partitioner.observe_encoding(
+        np.array([[2000, unset, unset], [unset, unset, unset]])
+    )
+    wire = partitioner.wire_bytes()
+    assert wire[0] == 4000.0  # the network input is never encoded
+    assert np.allclose(wire[1:], split_bytes[1:] / 4)
+
+    for _ in range(5):
+        partitioner.observe_send(2000, 2_000_000)
+        partitioner.observe_send(500, 500_000)
+    predicted = link.predict_ns(wire)
+    assert np.isclose(predicted[1], 2_000_000, rtol=1e-6)
+    assert predicted[-1] == 0
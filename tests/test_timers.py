@@ -0,0 +1,39 @@
+from pathlib import Path
+
+import pytest
+import torch
+
+from src.tracr.experiment_design.models.model_hooked import WrappedModel
+from src.tracr.experiment_design.records.master_dict import MasterDict
+
+
+def with_timer_backend(config_path: str, backend: str) -> str:
+    path = Path(config_path)
+    path.write_text(path.read_text() + f"      timer_backend: {backend}\n")
+    return config_path
+
+
+@pytest.mark.parametrize("backend", ["host", "sync"])
+def test_layers_are_timed_with_the_configured_backend(alexnet_config, backend):
+    model = WrappedModel(
+        config_path=with_timer_backend(alexnet_config, backend),
+        master_dict=MasterDict(),
+    )
+    model.node_name = "EDGE1"
+    assert model.layer_timer._TYPE == backend
+    # the clock used outside the layers, which the config key no longer shadows
+    assert isinstance(model.timer(), int)
+
+    model(torch.rand(1, 3, 224, 224), inference_id="inf0", end=5)
+    model.update_master_dict()
+    df = model.master_dict.to_dataframe()
+    assert (df.timer == backend).all()
+    assert (df.inference_time > 0).all()
+
+
+@pytest.mark.skipif(torch.cuda.is_available(), reason="needs a machine without CUDA")
+def test_cuda_events_fall_back_to_the_sync_timer(alexnet_config):
+    model = WrappedModel(
+        config_path=with_timer_backend(alexnet_config, "cuda_event"), master_dict=None
+    )
+    assert model.layer_timer._TYPE == "sync"